@@ -0,0 +1,97 @@
+"""benchmarks of the searches and retrievals of NexusConnector and NexusHelper"""
+import pytest
+from fake_nexus import BUCKET, TOKEN
+
+from bluepyentity.nexus.connector import NexusConnector
+from bluepyentity.nexus.core import NexusHelper
+from bluepyentity.session import use_cassette
+
+# Number of hops of the link traversal benchmark.
+HOPS = 10
+
+
+def bench_search(benchmark, forge, nexus):
+    connector = NexusConnector(forge)
+
+    resources = benchmark(connector.search, "Entity", {}, limit=nexus.resources)
+
+    assert len(resources) == nexus.resources
+
+
+def bench_get_resources_by_ids(benchmark, forge, nexus):
+    connector = NexusConnector(forge)
+    ids = [nexus.resource_id(i) for i in range(nexus.resources)]
+
+    resources = benchmark(connector.get_resources_by_ids, ids)
+
+    assert len(resources) == nexus.resources
+
+
+def bench_get_entities(benchmark, helper, nexus):
+    entities = benchmark(helper.get_entities, "Entity", limit=nexus.resources)
+
+    assert len(entities) == nexus.resources
+
+
+def bench_get_entities__replay(benchmark, helper, nexus, tmp_path):
+    path = tmp_path / "cassette.json"
+    with use_cassette(path, mode="record"):
+        helper.get_entities("Entity", limit=nexus.resources)
+
+    with use_cassette(path, mode="replay"):
+        entities = benchmark(helper.get_entities, "Entity", limit=nexus.resources)
+
+    assert len(entities) == nexus.resources
+
+
+def bench_link_traversal(benchmark, helper, nexus):
+    def _traverse():
+        entity = helper.get_entity_by_id(nexus.resource_id(0))
+        for _ in range(HOPS):
+            entity = entity.derivation
+        return entity.name
+
+    assert benchmark(_traverse) == f"resource {HOPS % nexus.resources}"
+
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def bench_lazy_traversal(benchmark, nexus, prefetch):
+    def _setup():
+        # a new in-memory cache for each round
+        helper = NexusHelper(BUCKET, token=TOKEN, refresh_token=False)
+        return (helper.get_entities("Entity", limit=nexus.resources, fetch="lazy"), helper), {}
+
+    def _traverse(entities, helper):
+        if prefetch:
+            helper.prefetch(entities, "derivation")
+        return [entity.derivation.name for entity in entities]
+
+    names = benchmark.pedantic(_traverse, setup=_setup, rounds=5)
+
+    assert len(names) == nexus.resources
+
+
+@pytest.mark.parametrize("graph", [False, True])
+def bench_get_entities_by_query(benchmark, helper, nexus, graph):
+    pattern = "?id a <http://www.w3.org/ns/prov#Entity>"
+    if graph:
+        query = f"CONSTRUCT {{?id ?p ?o}} WHERE {{{pattern} ; ?p ?o}}"
+        kwargs = {}
+    else:
+        query = f"SELECT ?id WHERE {{{pattern}}}"
+        kwargs = {"limit": nexus.resources}
+
+    entities = benchmark(helper.get_entities_by_query, query, graph=graph, **kwargs)
+
+    assert sorted(entity.name for entity in entities) == sorted(
+        f"resource {i}" for i in range(nexus.resources)
+    )
+
+
+@pytest.mark.parametrize("backend", ["sparql", "elastic"])
+def bench_get_entities__backend(benchmark, helper, nexus, backend):
+    entities = benchmark(
+        helper.get_entities, "Entity", fetch="none", backend=backend, limit=nexus.resources
+    )
+
+    assert len(entities) == nexus.resources
@@ -0,0 +1,36 @@
+"""benchmarks of the downloads of the distributions"""
+import itertools
+
+import pytest
+
+from bluepyentity.download import download, download_many
+
+# Number of resources downloaded by the batch benchmark.
+BATCH_SIZE = 8
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def bench_download(benchmark, forge, nexus, tmp_path, jobs):
+    counter = itertools.count()
+
+    def _setup():
+        # a new output directory, the files already downloaded being skipped
+        return (forge, nexus.resource_id(0), tmp_path / str(next(counter))), {"jobs": jobs}
+
+    paths = benchmark.pedantic(download, setup=_setup, rounds=5)
+
+    assert len(paths) == nexus.files
+    benchmark.extra_info["bytes"] = nexus.files * nexus.file_size
+
+
+def bench_download_many(benchmark, forge, nexus, tmp_path):
+    counter = itertools.count()
+    ids = [nexus.resource_id(i) for i in range(BATCH_SIZE)]
+
+    def _setup():
+        return (forge, ids, tmp_path / str(next(counter))), {"jobs": 4}
+
+    results = benchmark.pedantic(download_many, setup=_setup, rounds=3)
+
+    assert len(results) == BATCH_SIZE
+    benchmark.extra_info["bytes"] = BATCH_SIZE * nexus.files * nexus.file_size
@@ -0,0 +1,41 @@
+"""benchmarks of the creation of the forges and of the startup of the CLI"""
+import os
+import subprocess
+import sys
+
+import pytest
+from fake_nexus import BUCKET, TOKEN
+
+from bluepyentity import environments
+
+# Maximum time in seconds to start the interpreter and import the modules of `token get`.
+TOKEN_GET_BUDGET = float(os.environ.get("BLUEPYENTITY_BENCH_TOKEN_GET_BUDGET", 1.0))
+
+
+def bench_create_forge(benchmark):
+    benchmark.pedantic(
+        environments.create_forge, args=("prod", TOKEN, BUCKET), kwargs={"cached": False}, rounds=5
+    )
+
+
+@pytest.mark.parametrize("args", [["--help"], ["token", "--help"], ["info", "--help"]])
+def bench_cli_startup(benchmark, args):
+    code = f"from bluepyentity.app.main import main; main({args!r})"
+
+    def _run():
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+    benchmark.pedantic(_run, rounds=5)
+
+
+def bench_token_get_imports(benchmark):
+    code = (
+        "from bluepyentity.app.main import main; "
+        "main.get_command(None, 'token').get_command(None, 'get')"
+    )
+
+    def _run():
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+    benchmark.pedantic(_run, rounds=5)
+    assert benchmark.stats.stats.min < TOKEN_GET_BUDGET
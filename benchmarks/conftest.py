@@ -0,0 +1,60 @@
+# SPDX-License-Identifier: Apache-2.0
+"""fixtures running the benchmarks against a local fake Nexus"""
+import os
+
+import pytest
+from fake_nexus import BUCKET, TOKEN, FakeNexus
+
+from bluepyentity import environments, session
+from bluepyentity.nexus import core
+
+# Parameters of the fake Nexus, overridden with the environment variables.
+FAKE_NEXUS_PARAMS = {
+    "resources": ("BLUEPYENTITY_BENCH_RESOURCES", int, 100),
+    "files": ("BLUEPYENTITY_BENCH_FILES", int, 4),
+    "file_size": ("BLUEPYENTITY_BENCH_FILE_SIZE", int, 1024 * 1024),
+    "payload_size": ("BLUEPYENTITY_BENCH_PAYLOAD_SIZE", int, 1024),
+    "latency": ("BLUEPYENTITY_BENCH_LATENCY", float, 0.005),
+    "error_rate": ("BLUEPYENTITY_BENCH_ERROR_RATE", float, 0.0),
+}
+
+
+@pytest.fixture(scope="session")
+def nexus():
+    params = {
+        name: type_(os.environ.get(var, default))
+        for name, (var, type_, default) in FAKE_NEXUS_PARAMS.items()
+    }
+    with FakeNexus(**params) as server:
+        yield server
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fake_environment(nexus, tmp_path_factory):
+    """point the environment configurations to the fake Nexus"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(environments, "get_environment_config", nexus.config)
+        mp.setattr(core, "get_environment_config", nexus.config)
+        mp.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+        mp.setenv("BLUEPYENTITY_NO_SERVE", "1")
+        mp.delenv("BLUEPYENTITY_CONTENT_STORE", raising=False)
+        # the errors of the fake Nexus are retried without waiting, until they succeed
+        mp.setenv("BLUEPYENTITY_HTTP_BACKOFF_FACTOR", "0")
+        mp.setenv("BLUEPYENTITY_HTTP_RETRIES", "10")
+        mp.setenv("BLUEPYENTITY_CIRCUIT_FAILURES", "0")
+        session.set_session(None)
+        yield
+        session.set_session(None)
+        environments.clear_forges()
+
+
+@pytest.fixture
+def forge():
+    return environments.create_forge("prod", TOKEN, BUCKET)
+
+
+@pytest.fixture
+def helper():
+    helper = core.NexusHelper(BUCKET, token=TOKEN, refresh_token=False, memory_cache_size=0)
+    yield helper
+    helper.close()
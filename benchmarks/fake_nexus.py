@@ -0,0 +1,395 @@
+# SPDX-License-Identifier: Apache-2.0
+"""local stand-in of the Nexus API, serving a generated dataset to a real forge"""
+import copy
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote_plus, unquote, urlsplit
+
+from pyld import jsonld
+
+from bluepyentity.environments import get_environment_config
+
+NAMESPACE = "https://bluebrain.github.io/nexus/vocabulary/"
+MODEL_CONTEXT = "https://bbp.neuroshapes.org"
+STORE_CONTEXT = "https://bluebrainnexus.io/contexts/metadata.json"
+DATA_NAMESPACE = "https://bbp.epfl.ch/data/fake/"
+# Bucket and token used by the benchmarks, any value is accepted by the server.
+BUCKET = "bbp/atlas"
+TOKEN = "fake-token"
+METADATA_KEYS = [
+    "_constrainedBy",
+    "_createdAt",
+    "_createdBy",
+    "_deprecated",
+    "_incoming",
+    "_outgoing",
+    "_project",
+    "_rev",
+    "_schemaProject",
+    "_self",
+    "_updatedAt",
+    "_updatedBy",
+]
+CONTEXTS = {
+    STORE_CONTEXT: {
+        "nxv": NAMESPACE,
+        **{key: f"nxv:{key[1:]}" for key in METADATA_KEYS},
+    },
+    MODEL_CONTEXT: {
+        "@vocab": "https://neuroshapes.org/",
+        "schema": "http://schema.org/",
+        "name": "schema:name",
+        "DataDownload": "schema:DataDownload",
+        "distribution": {"@id": "schema:distribution", "@container": "@set"},
+        "contentUrl": {"@id": "schema:contentUrl", "@type": "@id"},
+        "contentSize": "schema:contentSize",
+        "encodingFormat": "schema:encodingFormat",
+        "unitCode": "schema:unitCode",
+        "value": "schema:value",
+        "digest": "https://neuroshapes.org/digest",
+        "algorithm": "https://neuroshapes.org/algorithm",
+    },
+}
+MAPPING = "{\n  id: x.id\n}\n"
+
+
+class FakeNexus(ThreadingHTTPServer):
+    """Nexus API serving `resources` generated resources, each linked to the next one.
+
+    Args:
+        resources (int): Number of resources of the dataset.
+        files (int): Number of distributions of each resource.
+        file_size (int): Size in bytes of each distribution.
+        payload_size (int): Size in bytes of the padding of each resource payload.
+        latency (float): Time in seconds added to each response.
+        error_rate (float): Fraction of the requests answered with 503 and Retry-After.
+        seed (int): Seed of the random errors.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        resources=100,
+        files=4,
+        file_size=1024 * 1024,
+        payload_size=1024,
+        latency=0.0,
+        error_rate=0.0,
+        seed=0,
+    ):
+        # pylint: disable=too-many-arguments
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.resources = resources
+        self.files = files
+        self.file_size = file_size
+        self.payload_size = payload_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.content = bytes(range(256)) * (file_size // 256) + bytes(file_size % 256)
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base url of the server."""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    @property
+    def endpoint(self):
+        """Endpoint of the Nexus API."""
+        return f"{self.url}/v1"
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def config(self, environment="prod"):
+        """Return the `environment` configuration with the urls pointing to the server."""
+        config = copy.deepcopy(get_environment_config(environment))
+        config["Store"]["endpoint"] = self.endpoint
+        config["Store"]["file_resource_mapping"] = f"{self.url}/mappings/file.hjson"
+        for resolvers in config.get("Resolvers", {}).values():
+            for resolver in resolvers:
+                resolver["result_resource_mapping"] = f"{self.url}/mappings/resolver.hjson"
+        return config
+
+    def resource_id(self, index):
+        """Return the id of the `index`-th resource."""
+        return f"{DATA_NAMESPACE}{index}"
+
+    def resource(self, index, org="bbp", project="atlas"):
+        """Return the payload of the `index`-th resource."""
+        id_ = self.resource_id(index)
+        return {
+            "@context": MODEL_CONTEXT,
+            "@id": id_,
+            "@type": "Entity",
+            "name": f"resource {index}",
+            "description": "x" * self.payload_size,
+            "derivation": {"@id": self.resource_id((index + 1) % self.resources)},
+            "distribution": [self.distribution(index, i, org, project) for i in range(self.files)],
+            "_self": f"{self.endpoint}/resources/{org}/{project}/_/{quote_plus(id_)}",
+            "_project": f"{self.endpoint}/projects/{org}/{project}",
+            "_rev": 1,
+            "_deprecated": False,
+            "_constrainedBy": "https://bluebrain.github.io/nexus/schemas/unconstrained.json",
+            "_createdAt": "2024-01-01T00:00:00Z",
+            "_createdBy": f"{self.endpoint}/realms/bbp/users/bench",
+            "_updatedAt": "2024-01-01T00:00:00Z",
+            "_updatedBy": f"{self.endpoint}/realms/bbp/users/bench",
+        }
+
+    def distribution(self, index, file_index, org, project):
+        """Return the `file_index`-th distribution of the `index`-th resource."""
+        file_id = f"{DATA_NAMESPACE}files/{index}-{file_index}"
+        return {
+            "@type": "DataDownload",
+            "name": f"file-{index}-{file_index}.bin",
+            "contentUrl": f"{self.endpoint}/files/{org}/{project}/{quote_plus(file_id)}",
+            "contentSize": {"unitCode": "bytes", "value": self.file_size},
+            "digest": {"algorithm": "SHA-256", "value": self.digest},
+            "encodingFormat": "application/octet-stream",
+        }
+
+    def triples(self, index, org="bbp", project="atlas"):
+        """Return the N-Triples of the `index`-th resource, with its metadata."""
+        resource = self.resource(index, org, project)
+        resource["@context"] = [MODEL_CONTEXT, STORE_CONTEXT]
+        triples = jsonld.to_rdf(
+            resource, {"format": "application/n-quads", "documentLoader": _load_context}
+        )
+        # the blank nodes of the resources are distinct
+        return triples.replace("_:b", f"_:r{index}b")
+
+    def index(self, id_):
+        """Return the index of the resource `id_`, or None if it doesn't exist."""
+        if not id_.startswith(DATA_NAMESPACE):
+            return None
+        try:
+            index = int(id_[len(DATA_NAMESPACE) :])
+        except ValueError:
+            return None
+        return index if 0 <= index < self.resources else None
+
+    def handle_error(self, request, client_address):
+        # the clients closing their connections are not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def should_fail(self):
+        """Count a request, and return True if it must fail."""
+        with self._lock:
+            self.requests += 1
+            return self.error_rate and self._random.random() < self.error_rate
+
+
+def _load_context(url, _options=None):
+    """pyld document loader of the contexts served by the fake Nexus"""
+    return {"contextUrl": None, "documentUrl": url, "document": {"@context": CONTEXTS[url]}}
+
+
+def _get_range(query, count):
+    """Return the range of the results selected by the LIMIT and OFFSET of the query."""
+    limit = re.search(r"LIMIT\s+(\d+)", query, re.IGNORECASE)
+    offset = re.search(r"OFFSET\s+(\d+)", query, re.IGNORECASE)
+    start = int(offset.group(1)) if offset else 0
+    stop = start + int(limit.group(1)) if limit else count
+    return range(start, min(stop, count))
+
+
+def _get_values(document, field):
+    """Return the values of the dotted field of the document, a keyword sub-field being the field"""
+    values = [document]
+    for key in field.split("."):
+        if key == "keyword":
+            continue
+        values = [v for value in values for v in (value if isinstance(value, list) else [value])]
+        values = [value[key] for value in values if isinstance(value, dict) and key in value]
+    return [v for value in values for v in (value if isinstance(value, list) else [value])]
+
+
+def _matches(document, clause):
+    """Return True if the document matches the term or terms query."""
+    ((kind, term),) = clause.items()
+    ((field, expected),) = term.items()
+    expected = expected if kind == "terms" else [expected]
+    return any(value in expected for value in _get_values(document, field))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """route the requests of the Nexus API"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """answer the GET requests"""
+        self._handle()
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """answer the POST requests"""
+        self._handle()
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.should_fail():
+            payload = {"@type": "ServiceUnavailable", "reason": "injected error"}
+            self._send(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                json.dumps(payload).encode("utf-8"),
+                headers={"Retry-After": "0"},
+            )
+            return
+
+        path = urlsplit(self.path).path
+        parts = path.strip("/").split("/")
+        for route, handler in _ROUTES:
+            if re.fullmatch(route, path):
+                handler(self, [unquote(p) for p in parts], body)
+                return
+        self._send_json({"@type": "NotFound", "reason": f"{path} not found"}, HTTPStatus.NOT_FOUND)
+
+    def _send(self, status, data, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, payload, status=HTTPStatus.OK):
+        self._send(status, json.dumps(payload).encode("utf-8"))
+
+    def project(self, parts, _):
+        """/v1/projects/{org}/{project}"""
+        self._send_json({"base": DATA_NAMESPACE, "vocab": NAMESPACE, "apiMappings": []})
+
+    def resolve(self, parts, _):
+        """/v1/resolvers/{org}/{project}/_/{id} and /v1/resources/{org}/{project}/_/{id}[/source]"""
+        org, project, id_ = parts[2], parts[3], parts[5]
+        if id_ in CONTEXTS:
+            self._send_json({"@id": id_, "@context": CONTEXTS[id_]})
+            return
+        index = self.server.index(id_)
+        if index is None:
+            self._send_json(
+                {"@type": "NotFound", "reason": f"{id_} not found"}, HTTPStatus.NOT_FOUND
+            )
+            return
+        payload = self.server.resource(index, org, project)
+        if parts[-1] == "source":
+            payload = {k: v for k, v in payload.items() if k not in METADATA_KEYS}
+        self._send_json(payload)
+
+    def sparql(self, parts, body):
+        """/v1/views/{org}/{project}/{view}/sparql, answering the searches with all resources"""
+        query = body.decode("utf-8")
+        if re.search(r"\b(CONSTRUCT|DESCRIBE)\b", query, re.IGNORECASE):
+            triples = "".join(
+                self.server.triples(i, parts[2], parts[3])
+                for i in _get_range(query, self.server.resources)
+            )
+            self._send(HTTPStatus.OK, triples.encode("utf-8"), content_type="application/n-triples")
+            return
+        if "sh:NodeShape" in query:
+            bindings = []
+        else:
+            bindings = [
+                {
+                    "id": {"type": "uri", "value": self.server.resource_id(i)},
+                    "_project": {
+                        "type": "uri",
+                        "value": f"{self.server.endpoint}/projects/{parts[2]}/{parts[3]}",
+                    },
+                    "_rev": {
+                        "type": "literal",
+                        "value": "1",
+                        "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+                    },
+                }
+                for i in _get_range(query, self.server.resources)
+            ]
+        self._send_json({"head": {"vars": ["id"]}, "results": {"bindings": bindings}})
+
+    def elastic(self, parts, body):
+        """/v1/views/{org}/{project}/{view}/_search, answering the term queries"""
+        query = json.loads(body)
+        hits = []
+        for index in range(self.server.resources):
+            document = self.server.resource(index, parts[2], parts[3])
+            if all(_matches(document, clause) for clause in query["query"]["bool"]["filter"]):
+                sort = [document[next(iter(key))] for key in query["sort"]]
+                hits.append({"_id": document["@id"], "_source": document, "sort": sort})
+        hits.sort(key=lambda hit: hit["sort"])
+        if "search_after" in query:
+            hits = [hit for hit in hits if hit["sort"] > query["search_after"]]
+        start = query.get("from", 0)
+        hits = hits[start : start + query.get("size", 10)]
+        source = query.get("_source", {})
+        for hit in hits:
+            hit["_source"] = {
+                key: value
+                for key, value in hit["_source"].items()
+                if key in source.get("includes", [key]) and key not in source.get("excludes", [])
+            }
+        self._send_json({"hits": {"hits": hits}})
+
+    def file(self, parts, _):
+        """/v1/files/{org}/{project}/{id}"""
+        content = self.server.content
+        range_ = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if range_:
+            offset = int(range_.group(1))
+            self._send(
+                HTTPStatus.PARTIAL_CONTENT,
+                content[offset:],
+                content_type="application/octet-stream",
+                headers={"Content-Range": f"bytes {offset}-{len(content) - 1}/{len(content)}"},
+            )
+        else:
+            self._send(HTTPStatus.OK, content, content_type="application/octet-stream")
+
+    def mapping(self, parts, _):
+        """/mappings/{name}"""
+        self._send(HTTPStatus.OK, MAPPING.encode("utf-8"), content_type="text/plain")
+
+
+_ROUTES = [
+    (r"/v1/projects/[^/]+/[^/]+", _Handler.project),
+    (r"/v1/(resolvers|resources)/[^/]+/[^/]+/_/[^/]+(/source)?", _Handler.resolve),
+    (r"/v1/views/[^/]+/[^/]+/[^/]+/sparql", _Handler.sparql),
+    (r"/v1/views/[^/]+/[^/]+/[^/]+/_search", _Handler.elastic),
+    (r"/v1/files/[^/]+/[^/]+/[^/]+", _Handler.file),
+    (r"/mappings/[^/]+", _Handler.mapping),
+]
@@ -2,4 +2,13 @@
 
 """bluepyentity."""
 
-from bluepyentity import download
+import importlib
+
+# submodules imported on first access, since they import kgforge which is slow to import
+_LAZY_SUBMODULES = {"download"}
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
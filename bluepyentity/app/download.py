@@ -2,15 +2,17 @@
 
 """download cli entry point"""
 
+import time
+
 import click
-from rich import console, pretty
+from rich import console, pretty, progress
 
 import bluepyentity
 import bluepyentity.environments
 
 
 @click.command()
-@click.argument("id_")
+@click.argument("id_", required=False)
 @click.option(
     "--output",
     default=".",
@@ -23,9 +25,37 @@ import bluepyentity.environments
     default=False,
     help="Try creating symbolic links if the storage type allows it.",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of files downloaded concurrently",
+)
+@click.option(
+    "--max-bandwidth",
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Maximum number of bytes downloaded per second by all the jobs",
+)
+@click.option(
+    "--from-file",
+    type=click.File("r"),
+    help="File with the ids to download, one per line, or '-' to read them from stdin",
+)
+@click.option(
+    "--report",
+    type=click.File("w"),
+    default="-",
+    help="File where a JSON line is written for each id downloaded with --from-file",
+)
 @click.pass_context
-def download(ctx, id_, output, create_links_if_possible):
+def download(ctx, id_, output, create_links_if_possible, jobs, max_bandwidth, from_file, report):
     """Download `id` from NEXUS"""
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    if (id_ is None) == (from_file is None):
+        raise click.UsageError("Either ID_ or --from-file must be given")
+
     user = ctx.meta["user"]
     env = ctx.meta["env"]
     bucket = ctx.meta["bucket"]
@@ -34,9 +64,94 @@ def download(ctx, id_, output, create_links_if_possible):
 
     forge = bluepyentity.environments.create_forge(env, token, bucket=bucket)
 
-    ret = bluepyentity.download.download(
-        forge, id_, output_dir=output, create_links_if_possible=create_links_if_possible
-    )
+    if from_file is not None:
+        _download_many(
+            forge,
+            from_file,
+            report,
+            output,
+            create_links_if_possible=create_links_if_possible,
+            jobs=jobs,
+            max_bandwidth=max_bandwidth,
+        )
+    else:
+        _download_one(
+            forge, id_, output, create_links_if_possible, jobs=jobs, max_bandwidth=max_bandwidth
+        )
 
+
+def _download_one(forge, id_, output, create_links_if_possible, *, jobs, max_bandwidth=None):
+    """download `id_` and print the downloaded files"""
     cons = console.Console()
+    start = time.monotonic()
+    ret = _download_with_progress(
+        cons,
+        forge,
+        id_,
+        output_dir=output,
+        create_links_if_possible=create_links_if_possible,
+        jobs=jobs,
+        max_bandwidth=max_bandwidth,
+    )
+
     pretty.pprint(ret, console=cons)
+
+    summary = bluepyentity.download.summarize(ret, time.monotonic() - start)
+    cons.print(
+        f"Downloaded {summary['files']} files, {summary['bytes']} bytes "
+        f"in {summary['seconds']:.2f} s ({summary['throughput'] / 1e6:.2f} MB/s)"
+    )
+
+
+def _download_with_progress(cons, forge, id_, **kwargs):
+    """download `id_` displaying a progress bar"""
+    with progress.Progress(console=cons, transient=True) as progress_bar:
+        task = progress_bar.add_task("Downloading", total=None)
+
+        def _progress(path, done, total):
+            progress_bar.update(task, description=path.name, completed=done, total=total)
+
+        return bluepyentity.download.download(forge, id_, progress=_progress, **kwargs)
+
+
+def _read_ids(lines):
+    """return the ids listed in `lines`, ignoring the empty lines and the comments"""
+    ids = (line.strip() for line in lines)
+    return [id_ for id_ in ids if id_ and not id_.startswith("#")]
+
+
+def _download_many(
+    forge, from_file, report, output, *, create_links_if_possible, jobs, max_bandwidth=None
+):
+    """download the ids listed in `from_file`, writing the report to `report`"""
+    # pylint: disable=too-many-locals
+    ids = _read_ids(from_file)
+    # the report can be written to stdout, keep the messages on stderr
+    cons = console.Console(stderr=True)
+    start = time.monotonic()
+    with progress.Progress(console=cons, transient=True) as progress_bar:
+        task = progress_bar.add_task("Downloading", total=len(ids))
+
+        def _progress(id_, done, total):
+            progress_bar.update(task, description=id_, completed=done, total=total)
+
+        ret = bluepyentity.download.download_many(
+            forge,
+            ids,
+            output_dir=output,
+            create_links_if_possible=create_links_if_possible,
+            jobs=jobs,
+            report=report,
+            progress=_progress,
+            max_bandwidth=max_bandwidth,
+        )
+
+    paths = {str(path): path for files in ret.values() for path in files.values()}
+    summary = bluepyentity.download.summarize(paths, time.monotonic() - start)
+    cons.print(
+        f"Downloaded {len(ret)}/{len(ids)} ids, {summary['files']} files, "
+        f"{summary['bytes']} bytes in {summary['seconds']:.2f} s "
+        f"({summary['throughput'] / 1e6:.2f} MB/s)"
+    )
+    if len(ret) != len(ids):
+        raise click.exceptions.Exit(1)
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""environment CLI entry point"""
+
+import click
+from rich import pretty
+
+import bluepyentity.environments
+from bluepyentity.exceptions import BluepyEntityError
+
+
+@click.group()
+def app():
+    """Environment Management"""
+
+
+@app.command()
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    required=True,
+    help="Directory of the vendored files, e.g. bluepyentity/data/mappings in a checkout",
+)
+def sync(output_dir):
+    """download the mapping files of the environments, so that forges are created offline"""
+    try:
+        paths = bluepyentity.environments.sync_mappings(vendored_dir=output_dir)
+    except BluepyEntityError as e:
+        raise click.ClickException(str(e)) from e
+    pretty.pprint({url: str(path) for url, path in paths.items()})
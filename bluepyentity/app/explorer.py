@@ -62,9 +62,9 @@ class Nexus(Screen):
         ("q", "quit", "Quit"),
     ]
 
-    def __init__(self, forge, id_):
+    def __init__(self, connector, id_):
         """ibid"""
-        self.forge = forge
+        self.connector = connector
         self.id_ = id_
 
         # True if in "follow" command
@@ -80,7 +80,7 @@ class Nexus(Screen):
         # The size of the hints depending on the number of links
         self._size_combination = 0
 
-        self.data = self.forge.retrieve(id_, cross_bucket=True)
+        self.data = self.connector.get_resource_by_id(id_)
 
         self._init_state()
 
@@ -245,7 +245,7 @@ class Nexus(Screen):
             self._follow_cmd = not self._follow_cmd
             url = urls[0]
             self.hide_hints()
-            self.app.push_screen(Nexus(self.forge, url))
+            self.app.push_screen(Nexus(self.connector, url))
 
     async def action_follow(self) -> None:
         """Follow link"""
@@ -279,9 +279,9 @@ class Explorer(App):
         ("q", "quit", "Quit"),
     ]
 
-    def __init__(self, forge, id_):
+    def __init__(self, connector, id_):
         """ibid"""
-        self.forge = forge
+        self.connector = connector
         self.id_ = id_
         super().__init__()
 
@@ -291,7 +291,7 @@ class Explorer(App):
 
     def on_mount(self) -> None:
         """Initialization of the widget."""
-        self.push_screen(Nexus(self.forge, self.id_))
+        self.push_screen(Nexus(self.connector, self.id_))
 
     async def action_quit(self) -> None:
         """Quit the app"""
@@ -303,5 +303,5 @@ class Explorer(App):
 @click.pass_context
 def explorer_app(ctx, id_):
     """Link exploration TUI"""
-    forge = utils.forge_from_ctx(ctx)
-    Explorer(forge, id_=id_).run()
+    connector = utils.connector_from_ctx(ctx)
+    Explorer(connector, id_=id_).run()
@@ -11,6 +11,9 @@ from rich.rule import Rule
 
 import bluepyentity
 from bluepyentity import utils
+from bluepyentity.app.utils import memory_cache_for
+from bluepyentity.nexus.cache import ResourceCache, get_cache_path
+from bluepyentity.nexus.connector import NexusConnector
 
 
 def _extra_print(cons, store_metadata):
@@ -59,17 +62,23 @@ def app(ctx, id_, metadata, raw_resource):
     user = ctx.meta["user"]
     env = ctx.meta["env"]
     bucket = ctx.meta["bucket"]
-    info(user, env, bucket, id_, metadata, raw_resource)
+    cache_dir = ctx.meta.get("cache_dir")
+    info(user, env, bucket, id_, metadata, raw_resource, cache_dir=cache_dir)
 
 
-def info(user, env, bucket, id_, metadata, raw_resource):
+def info(user, env, bucket, id_, metadata, raw_resource, cache_dir=None):
     """get info on `id` without a click context."""
+    # pylint: disable=too-many-positional-arguments
     cons = console.Console()
     token = bluepyentity.token.get_token(env=env, username=user)
-    forge = bluepyentity.environments.create_forge(env, token, bucket)
+    connector = NexusConnector(
+        bluepyentity.environments.create_forge(env, token, bucket),
+        cache=ResourceCache(get_cache_path(env, cache_dir)) if cache_dir else None,
+        memory_cache=memory_cache_for(env, bucket),
+    )
 
     # XXX version?
-    resource = forge.retrieve(id_, cross_bucket=True)
+    resource = connector.get_resource_by_id(id_)
     if resource is None:
         cons.print(f"[red]Unable to find a resource with id: {id_}")
         sys.exit(-1)
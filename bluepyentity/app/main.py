@@ -3,39 +3,187 @@
 """main CLI entry point"""
 
 import getpass
+import importlib
 import logging
+import os
+import sys
 
 import click
 
-from bluepyentity.app import download, explorer, info, project, token
 from bluepyentity.version import VERSION
 
 USER = getpass.getuser()
 
+# subcommands, as (module, attribute, short help), the module being imported only when the
+# subcommand is invoked
+COMMANDS = {
+    "download": ("bluepyentity.app.download", "download", "Download `id` from NEXUS"),
+    "env": ("bluepyentity.app.environment", "app", "Environment Management"),
+    "explorer": ("bluepyentity.app.explorer", "explorer_app", "Link exploration TUI"),
+    "info": ("bluepyentity.app.info", "app", "get info on `id` from NEXUS"),
+    "project": ("bluepyentity.app.project", "app", "Project Management"),
+    "serve": ("bluepyentity.app.serve", "serve", "Run the daemon keeping warm forges"),
+    "token": ("bluepyentity.app.token", "app", "Token Management"),
+}
 
-@click.group(
-    commands={
-        "download": download.download,
-        "info": info.app,
-        "token": token.app,
-        "project": project.app,
-        "explorer": explorer.explorer_app,
-    }
-)
+
+class LazyGroup(click.Group):
+    """click group importing the module of a subcommand only when it's invoked"""
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        """init with the lazy subcommands, as in `COMMANDS`"""
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        """list the names of the subcommands, including the lazy ones"""
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        """return the subcommand `cmd_name`, importing its module if it's lazy"""
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, attr, _ = self.lazy_commands[cmd_name]
+            self.add_command(getattr(importlib.import_module(module_name), attr), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def main(self, args=None, prog_name=None, forward=True, **kwargs):
+        """run the command, in the daemon started with `bluepyentity serve` if it's running"""
+        # pylint: disable=arguments-differ
+        args = sys.argv[1:] if args is None else list(args)
+        if forward and self._is_forwarded(args):
+            # pylint: disable=import-outside-toplevel
+            from bluepyentity.app import serve
+
+            code = serve.forward(args)
+            if code is not None:
+                sys.exit(code)
+        return super().main(args, prog_name=prog_name, **kwargs)
+
+    def _is_forwarded(self, args):
+        """return True if the subcommand of `args` can be run by the daemon"""
+        # pylint: disable=import-outside-toplevel
+        from bluepyentity.app.serve import ENV_NO_SERVE, FORWARDED_COMMANDS
+
+        if os.environ.get(ENV_NO_SERVE):
+            return False
+        subcommand = self._get_subcommand(args)
+        return subcommand in FORWARDED_COMMANDS and "-" not in args
+
+    def _get_subcommand(self, args):
+        """return the name of the subcommand in `args`, skipping the options of the group"""
+        takes_value = {
+            opt
+            for param in self.params
+            if isinstance(param, click.Option) and not param.is_flag and not param.count
+            for opt in param.opts
+        }
+        args = iter(args)
+        for arg in args:
+            if arg in takes_value:
+                next(args, None)
+            elif not arg.startswith("-"):
+                return arg
+        return None
+
+    def format_commands(self, ctx, formatter):
+        """list the subcommands with their short help, without importing them"""
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            if cmd_name in self.commands:
+                cmd = self.commands[cmd_name]
+                if cmd.hidden:
+                    continue
+                rows.append((cmd_name, cmd.get_short_help_str()))
+            else:
+                rows.append((cmd_name, self.lazy_commands[cmd_name][2]))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+def _setup_logging(ctx, verbose):
+    """log to the current stderr at the `verbose` level until the end of the command
+
+    The handler is removed when the command ends, since the daemon started with
+    `bluepyentity serve` runs the commands of its clients in the same process, each one with its
+    own stderr and verbosity.
+    """
+    level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(verbose, 2)]
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setLevel(level)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)-8s %(message)s", "%Y-%m-%d %H:%M:%S")
+    )
+    root = logging.getLogger()
+    root_level = root.level
+    root.addHandler(handler)
+    root.setLevel(min(level, root_level))
+
+    def _teardown():
+        root.removeHandler(handler)
+        root.setLevel(root_level)
+
+    ctx.call_on_close(_teardown)
+
+
+@click.group(cls=LazyGroup, lazy_commands=COMMANDS)
 @click.version_option(version=VERSION)
 @click.option("-v", "--verbose", count=True, help="Multiple increases logging level")
 @click.option("--bucket", type=str, default="bbp/atlas")
 @click.option("--env", type=str, default="prod", help="Name of the enviroment to use")
 @click.option("--user", type=str, default=USER, help="User to login as")
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    envvar="BLUEPYENTITY_CACHE_DIR",
+    help="Directory of the persistent cache of the retrieved resources",
+)
+@click.option(
+    "--profile",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write the timings of the command to this file, as a Chrome trace",
+)
 @click.pass_context
-def main(ctx, verbose, env, user, bucket):
+def main(ctx, verbose, env, user, bucket, cache_dir, profile):
     """The CLI object."""
-    logging.basicConfig(
-        level=(logging.WARNING, logging.INFO, logging.DEBUG)[min(verbose, 2)],
-        format="%(asctime)s %(levelname)-8s %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    _setup_logging(ctx, verbose)
 
     ctx.meta["user"] = user
     ctx.meta["env"] = env
     ctx.meta["bucket"] = bucket
+    ctx.meta["cache_dir"] = cache_dir
+
+    _use_shared_session(ctx)
+
+    if profile:
+        _start_profile(ctx, profile)
+
+
+def _use_shared_session(ctx):
+    """send the requests of kgforge and nexussdk with the shared session during the command"""
+    # pylint: disable=import-outside-toplevel
+    from bluepyentity.session import use_shared_session
+
+    ctx.with_resource(use_shared_session())
+
+
+def _start_profile(ctx, path):
+    """record the spans of the command, and write them to `path` when it exits"""
+    # pylint: disable=import-outside-toplevel
+    from bluepyentity import instrumentation
+
+    recorder = instrumentation.Recorder(trace=True)
+    previous = instrumentation.set_recorder(recorder)
+
+    def _write_profile():
+        instrumentation.set_recorder(previous)
+        recorder.write_trace(path)
+        click.echo(f"Wrote the profile to {path}", err=True)
+
+    ctx.call_on_close(_write_profile)
+    # closed before writing the profile
+    ctx.with_resource(recorder.span("cli.command", command=ctx.invoked_subcommand))
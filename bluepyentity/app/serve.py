@@ -0,0 +1,246 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""serve CLI entry point, and forwarding of the CLI commands to the running daemon"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import traceback
+from pathlib import Path
+
+import click
+
+from bluepyentity.utils import get_cache_dir
+
+L = logging.getLogger(__name__)
+
+# Path of the socket of the daemon, defaults to `serve.sock` in the user cache directory.
+ENV_SOCKET = "BLUEPYENTITY_SOCKET"
+# If set, the commands are always run in-process.
+ENV_NO_SERVE = "BLUEPYENTITY_NO_SERVE"
+# Commands run by the daemon, the other ones are interactive or don't use a forge.
+FORWARDED_COMMANDS = {"download", "info", "project"}
+# Prefix of the environment variables of the client applied while running a command.
+FORWARDED_ENV_PREFIX = "BLUEPYENTITY_"
+# Environment variables selecting the identity of the user, the commands of a client whose values
+# differ from the ones of the daemon are run in-process, since the daemon keeps the tokens and
+# the forges of the user who started it.
+IDENTITY_ENV = ("NEXUS_TOKEN", "KRB5CCNAME")
+# Time in seconds to wait for the daemon to accept a command.
+CONNECT_TIMEOUT = 1
+
+
+def get_socket_path():
+    """return the path of the socket of the daemon"""
+    return Path(os.environ.get(ENV_SOCKET) or get_cache_dir() / "serve.sock")
+
+
+def forward(args, socket_path=None, stdout=None, stderr=None):
+    """run the command `args` in the daemon, printing its output
+
+    Args:
+        args (list): the arguments of the CLI.
+        socket_path (str): path of the socket of the daemon, defaults to `get_socket_path`.
+        stdout: stream where the output of the command is written, defaults to sys.stdout.
+        stderr: stream where the errors of the command are written, defaults to sys.stderr.
+
+    Returns:
+        int: the exit code of the command, or None if the daemon isn't running or if it runs
+        with another identity (see `IDENTITY_ENV`)
+    """
+    socket_path = socket_path or get_socket_path()
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(str(socket_path))
+    except OSError as e:
+        L.debug("Daemon not available on %s: %s", socket_path, e)
+        sock.close()
+        return None
+
+    request = {
+        "args": list(args),
+        "cwd": os.getcwd(),
+        "env": {k: v for k, v in os.environ.items() if k.startswith(FORWARDED_ENV_PREFIX)},
+        "identity": _get_identity(),
+        "terminal": stdout.isatty(),
+        "columns": _get_columns(stdout),
+    }
+    with sock:
+        sock.settimeout(None)
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "exit" in message:
+                    return message["exit"]
+                out = stdout if message["stream"] == "stdout" else stderr
+                out.write(message["data"])
+                out.flush()
+
+    raise click.ClickException(f"Connection to the daemon on {socket_path} was lost")
+
+
+def _get_identity():
+    """return the values of the `IDENTITY_ENV` variables"""
+    return {name: os.environ.get(name) for name in IDENTITY_ENV}
+
+
+def _get_columns(stream):
+    try:
+        return os.get_terminal_size(stream.fileno()).columns
+    except (OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+class _MessageStream(io.TextIOBase):
+    """text stream sending what is written to the client"""
+
+    def __init__(self, wfile, name, terminal):
+        super().__init__()
+        self._wfile = wfile
+        self._name = name
+        self._terminal = terminal
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._terminal
+
+    def write(self, s):
+        message = {"stream": self._name, "data": s}
+        self._wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self._wfile.flush()
+        return len(s)
+
+
+@contextlib.contextmanager
+def _client_environment(request):
+    """apply the working directory and the environment of the client"""
+    env = dict(request["env"])
+    if request["columns"]:
+        env["COLUMNS"] = str(request["columns"])
+    if request["terminal"]:
+        env["FORCE_COLOR"] = "1"
+
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    try:
+        os.chdir(request["cwd"])
+        for k in environ:
+            if k.startswith(FORWARDED_ENV_PREFIX):
+                del os.environ[k]
+        os.environ.update(env)
+        yield
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """run a command sent by the client, in the process of the daemon"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # connection checking if the daemon is running
+            return
+        request = json.loads(line)
+        if request.get("identity") != _get_identity():
+            # the client runs the command itself, with its own token
+            L.info("Not running %s, sent with another identity", request["args"])
+            self.wfile.write(json.dumps({"exit": None}).encode("utf-8") + b"\n")
+            return
+        L.info("Running %s", request["args"])
+        stdout = _MessageStream(self.wfile, "stdout", request["terminal"])
+        stderr = _MessageStream(self.wfile, "stderr", request["terminal"])
+        code = 0
+        with _client_environment(request), contextlib.redirect_stdout(
+            stdout
+        ), contextlib.redirect_stderr(stderr):
+            try:
+                self.server.command.main(request["args"], prog_name="bluepyentity", forward=False)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except Exception:  # pylint: disable=broad-except
+                L.exception("Command %s failed", request["args"])
+                traceback.print_exc()
+                code = 1
+        self.wfile.write(json.dumps({"exit": code}).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.UnixStreamServer):
+    """serve the commands one at a time, since they change the working directory"""
+
+    idle = False
+
+    def __init__(self, socket_path, command):
+        super().__init__(socket_path, _Handler)
+        # the main group of the CLI, running the commands
+        self.command = command
+
+    def handle_timeout(self):
+        self.idle = True
+
+
+def _remove_stale_socket(socket_path):
+    """remove the socket of a daemon that isn't running anymore"""
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+            return
+    raise click.ClickException(f"A daemon is already running on {socket_path}")
+
+
+@click.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=f"Path of the socket, defaults to ${ENV_SOCKET} or serve.sock in the cache directory",
+)
+@click.option(
+    "--idle-timeout",
+    type=float,
+    default=None,
+    help="Stop after this number of seconds without any command",
+)
+@click.pass_context
+def serve(ctx, socket_path, idle_timeout):
+    """keep warm forges, and run the commands forwarded by the CLI"""
+    socket_path = Path(socket_path) if socket_path else get_socket_path()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    _remove_stale_socket(socket_path)
+
+    # the daemon runs the commands with the tokens of the user, only the user can connect
+    umask = os.umask(0o177)
+    try:
+        server = _Server(str(socket_path), ctx.find_root().command)
+    finally:
+        os.umask(umask)
+
+    server.timeout = idle_timeout
+    click.echo(f"Serving on {socket_path}", err=True)
+    try:
+        with server:
+            while not server.idle:
+                server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket_path.unlink(missing_ok=True)
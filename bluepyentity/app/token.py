@@ -11,7 +11,7 @@ import bluepyentity.token
 
 @click.group()
 def app():
-    """Token Mangement"""
+    """Token Management"""
 
 
 @app.command()
@@ -2,6 +2,15 @@
 """cli/app related utils"""
 import bluepyentity.environments
 import bluepyentity.utils
+from bluepyentity.nexus.cache import LRUResourceCache, ResourceCache, get_cache_path
+from bluepyentity.nexus.connector import NexusConnector
+
+# in-memory caches of the retrieved resources, kept by the process for the commands run by the
+# daemon started with `bluepyentity serve`
+_MEMORY_CACHES = {}
+# Time to live in seconds of the resources retrieved without a revision in the in-memory caches,
+# so that the daemon doesn't return outdated resources.
+MEMORY_CACHE_TTL = 300
 
 
 def forge_from_ctx(ctx, store_overrides=None):
@@ -20,6 +29,28 @@ def forge_from_ctx(ctx, store_overrides=None):
     return forge
 
 
+def cache_from_ctx(ctx):
+    """create the resource cache from a click context, or None if it's not enabled"""
+    cache_dir = ctx.meta.get("cache_dir")
+    if cache_dir is None:
+        return None
+    return ResourceCache(get_cache_path(ctx.meta["env"], cache_dir))
+
+
+def memory_cache_for(env, bucket):
+    """return the in-memory cache of the resources retrieved in `env` from `bucket`"""
+    return _MEMORY_CACHES.setdefault((env, bucket), LRUResourceCache(ttl=MEMORY_CACHE_TTL))
+
+
+def connector_from_ctx(ctx, store_overrides=None):
+    """create a NexusConnector from a click context"""
+    return NexusConnector(
+        forge_from_ctx(ctx, store_overrides=store_overrides),
+        cache=cache_from_ctx(ctx),
+        memory_cache=memory_cache_for(ctx.meta["env"], ctx.meta["bucket"]),
+    )
+
+
 def rich_resource(resource, strip_under_prefix=True):
     """add __rich_repr__ to a kgforge Resource"""
     data = vars(resource)
@@ -0,0 +1,275 @@
+# SPDX-License-Identifier: Apache-2.0
+"""record the responses of Nexus in a cassette file, and replay them offline"""
+import atexit
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from bluepyentity.exceptions import BluepyEntityError
+
+L = logging.getLogger(__name__)
+
+# Path of the cassette used by the shared session, no cassette if unset.
+ENV_CASSETTE = "BLUEPYENTITY_CASSETTE"
+# Mode of the cassette, one of MODES, defaults to "once".
+ENV_CASSETTE_MODE = "BLUEPYENTITY_CASSETTE_MODE"
+
+# record: send the requests and record their responses, replacing the recorded ones.
+# replay: replay the recorded responses without sending any request, failing on the others.
+# once: replay if the cassette exists, record otherwise.
+MODES = ("record", "replay", "once")
+VERSION = 1
+
+# Headers of the requests changing their response, the other ones (e.g. the token) are ignored.
+MATCHED_HEADERS = ("Accept", "Range")
+# Headers of the responses not recorded, the content being recorded decoded.
+IGNORED_HEADERS = (
+    "connection",
+    "content-encoding",
+    "content-length",
+    "keep-alive",
+    "set-cookie",
+    "transfer-encoding",
+)
+# Hosts of the authentication, whose requests are never recorded since they carry the tokens.
+AUTH_HOSTS = ("bbpauth.epfl.ch",)
+# Parameters of the urls carrying tokens, removed from the recorded urls.
+SECRET_PARAMS = ("access_token", "id_token", "code", "session_state")
+
+
+class CassetteError(BluepyEntityError):
+    """Raised when a request can't be replayed from a cassette."""
+
+
+def _digest(body):
+    """Return the digest of the body of a request, the streamed bodies being ignored."""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    elif not isinstance(body, bytes):
+        body = b""
+    return hashlib.sha256(body).hexdigest()
+
+
+def _matched_headers(headers):
+    """Return the headers of a request matched with the recorded ones."""
+    headers = CaseInsensitiveDict(headers)
+    return {name: headers[name] for name in MATCHED_HEADERS if name in headers}
+
+
+def _scrub_url(url):
+    """Return the url without its fragment and its SECRET_PARAMS, where the tokens are sent."""
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query = urlencode(
+        [
+            (name, value)
+            for name, value in parse_qsl(query, keep_blank_values=True)
+            if name not in SECRET_PARAMS
+        ]
+    )
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _request_key(method, url, headers, body_sha256):
+    """Return the key matching a request with its recorded response."""
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return json.dumps(
+        [
+            method.upper(),
+            urlunsplit((scheme, netloc, path, query, "")),
+            _matched_headers(headers),
+            body_sha256,
+        ]
+    )
+
+
+class Cassette:
+    """Responses of the requests sent to Nexus, recorded in a JSON file.
+
+    The requests are matched with their method, their url, a few of their headers and the digest
+    of their body. The tokens are never recorded: the requests to the AUTH_HOSTS are not
+    recorded, and the fragments and the SECRET_PARAMS of the urls are removed.
+    """
+
+    def __init__(self, path, mode="once"):
+        """Instantiate a new Cassette, loading the recorded responses if the file exists.
+
+        Args:
+            path (str): Path of the cassette file.
+            mode (str): One of ``MODES``.
+        """
+        if mode not in MODES:
+            raise BluepyEntityError(f"Unknown cassette mode {mode!r}, expected one of {MODES}")
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._interactions = {}
+        self._modified = False
+        if mode == "once":
+            mode = "replay" if self.path.exists() else "record"
+        self.mode = mode
+        if mode == "replay":
+            self.load()
+
+    @classmethod
+    def from_environment(cls):
+        """Return the cassette configured with the environment variables, or None."""
+        path = os.environ.get(ENV_CASSETTE)
+        if not path:
+            return None
+        return cls(path, mode=os.environ.get(ENV_CASSETTE_MODE) or "once")
+
+    @property
+    def recording(self):
+        """True if the requests are sent and recorded."""
+        return self.mode == "record"
+
+    def __len__(self):
+        """Return the number of recorded responses."""
+        return len(self._interactions)
+
+    def load(self):
+        """Load the recorded responses from the file."""
+        try:
+            with open(self.path, encoding="utf-8") as fd:
+                content = json.load(fd)
+        except FileNotFoundError as e:
+            raise CassetteError(f"The cassette {self.path} doesn't exist") from e
+        if content.get("version") != VERSION:
+            raise CassetteError(f"Unsupported version of the cassette {self.path}")
+        with self._lock:
+            self._interactions = {
+                _request_key(**interaction["request"]): interaction
+                for interaction in content["interactions"]
+            }
+        L.debug("Loaded %d responses from %s", len(self._interactions), self.path)
+
+    def save(self):
+        """Write the recorded responses to the file, if new ones were recorded."""
+        with self._lock:
+            if not self._modified:
+                return
+            interactions = list(self._interactions.values())
+            self._modified = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fd:
+            json.dump({"version": VERSION, "interactions": interactions}, fd, indent=1)
+        os.replace(tmp_path, self.path)
+        L.info("Recorded %d responses in %s", len(interactions), self.path)
+
+    def record(self, request, response):
+        """Record the response of the request, reading its whole content.
+
+        The requests to the AUTH_HOSTS are not recorded.
+        """
+        if urlsplit(request.url).hostname in AUTH_HOSTS:
+            return
+        content = response.content
+        try:
+            body = {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            body = {"base64": base64.b64encode(content).decode("ascii")}
+        interaction = {
+            "request": {
+                "method": request.method,
+                "url": _scrub_url(request.url),
+                "headers": _matched_headers(request.headers),
+                "body_sha256": _digest(request.body),
+            },
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": {
+                    name: _scrub_url(value) if name.lower() == "location" else value
+                    for name, value in response.headers.items()
+                    if name.lower() not in IGNORED_HEADERS
+                },
+                **body,
+            },
+        }
+        key = _request_key(**interaction["request"])
+        with self._lock:
+            self._interactions[key] = interaction
+            self._modified = True
+
+    def play(self, request):
+        """Return the recorded response of the request.
+
+        Raises:
+            CassetteError: If the response of the request was not recorded.
+        """
+        key = _request_key(request.method, request.url, request.headers, _digest(request.body))
+        with self._lock:
+            interaction = self._interactions.get(key)
+        if interaction is None:
+            raise CassetteError(
+                f"No response recorded in {self.path} for {request.method} {request.url}"
+            )
+
+        recorded = interaction["response"]
+        if "base64" in recorded:
+            content = base64.b64decode(recorded["base64"])
+        else:
+            content = recorded["text"].encode("utf-8")
+
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded.get("reason")
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.headers["Content-Length"] = str(len(content))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(content)
+        return response
+
+
+class CassetteAdapter(BaseAdapter):
+    """Adapter recording the responses of `adapter` in a cassette, or replaying them."""
+
+    def __init__(self, cassette, adapter):
+        """Instantiate a new CassetteAdapter.
+
+        Args:
+            cassette (Cassette): The cassette.
+            adapter (requests.adapters.BaseAdapter): The adapter sending the recorded requests.
+        """
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Send and record the request, or replay its recorded response."""
+        if not self.cassette.recording:
+            return self.cassette.play(request)
+        response = self.adapter.send(request, *args, **kwargs)
+        self.cassette.record(request, response)
+        return response
+
+    def close(self):
+        """Close the adapter sending the recorded requests."""
+        self.adapter.close()
+
+
+def get_cassette():
+    """Return the cassette of the shared session configured with the environment, or None.
+
+    The responses recorded by the process are written when it exits.
+    """
+    cassette = Cassette.from_environment()
+    if cassette is not None:
+        L.info("Using the cassette %s in %s mode", cassette.path, cassette.mode)
+        if cassette.recording:
+            atexit.register(cassette.save)
+    return cassette
@@ -0,0 +1,230 @@
+# SPDX-License-Identifier: Apache-2.0
+"""content-addressed store of downloaded files, shared between working directories"""
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import shutil
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from bluepyentity.exceptions import BluepyEntityError
+
+L = logging.getLogger(__name__)
+
+# Directory of the store, disabled if not set.
+ENV_CONTENT_STORE = "BLUEPYENTITY_CONTENT_STORE"
+# Maximum size in bytes of the store, unbounded if not set.
+ENV_CONTENT_STORE_MAX_SIZE = "BLUEPYENTITY_CONTENT_STORE_MAX_SIZE"
+# How the files are materialised from the store, one of LINK_MODES.
+ENV_CONTENT_STORE_LINK = "BLUEPYENTITY_CONTENT_STORE_LINK"
+
+# Materialisation methods tried in order with the "auto" mode.
+LINK_MODES = ("reflink", "hardlink", "symlink", "copy")
+# ioctl request cloning a file on Linux filesystems supporting it (btrfs, xfs...).
+_FICLONE = 0x40049409
+
+
+def get_content_store() -> Optional["ContentStore"]:
+    """Return the store configured with the environment variables, or None if not configured."""
+    root = os.environ.get(ENV_CONTENT_STORE)
+    if not root:
+        return None
+    max_size = os.environ.get(ENV_CONTENT_STORE_MAX_SIZE)
+    return ContentStore(
+        root,
+        max_size=int(max_size) if max_size else None,
+        link_mode=os.environ.get(ENV_CONTENT_STORE_LINK, "auto"),
+    )
+
+
+def _tmp_path(path):
+    """Return a temporary path next to `path`, unique to the process and the thread.
+
+    The same content can be added or materialised concurrently by the workers of a download.
+    """
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _reflink(source_path, target_path):
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.unlink(target_path)
+            raise
+
+
+def _hardlink(source_path, target_path):
+    os.link(source_path, target_path)
+
+
+def _symlink(source_path, target_path):
+    os.symlink(source_path, target_path)
+
+
+def _copy(source_path, target_path):
+    shutil.copyfile(source_path, target_path)
+
+
+_LINK_FUNCTIONS = {
+    "reflink": _reflink,
+    "hardlink": _hardlink,
+    "symlink": _symlink,
+    "copy": _copy,
+}
+
+
+class ContentStore:
+    """Directory of files addressed by their checksum.
+
+    Files are stored read-only under ``<root>/<algorithm>/<2 first chars>/<digest>`` and
+    materialised in the output directories with links, so that the same content is downloaded
+    only once per node. When the store exceeds its maximum size, the least recently used files
+    are removed; the symbolic links to them are then broken and downloaded again when needed.
+    """
+
+    def __init__(self, root: Path | str, max_size: Optional[int] = None, link_mode: str = "auto"):
+        """Instantiate a new ContentStore.
+
+        Args:
+            root: Directory of the store, created if it doesn't exist.
+            max_size: Maximum size of the store in bytes, or None for no limit.
+            link_mode: How the files are materialised: "auto" tries in order "reflink",
+                "hardlink", "symlink" and "copy", or any of them to use only that one.
+        """
+        if link_mode != "auto" and link_mode not in LINK_MODES:
+            raise BluepyEntityError(
+                f"Invalid link mode {link_mode!r}, supported: {['auto', *LINK_MODES]}"
+            )
+        self._root = Path(root).resolve()
+        self._max_size = max_size
+        self._link_modes = LINK_MODES if link_mode == "auto" else (link_mode,)
+        self._root.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def root(self) -> Path:
+        """Directory of the store."""
+        return self._root
+
+    def path_for(self, algorithm: str, digest: str) -> Path:
+        """Return the path of the content in the store, whether it exists or not."""
+        digest = digest.lower()
+        return self._root / algorithm / digest[:2] / digest
+
+    def get(self, algorithm: str, digest: str) -> Optional[Path]:
+        """Return the path of the content in the store, or None if it's not stored."""
+        path = self.path_for(algorithm, digest)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        try:
+            # only the access time is updated, the modification time is shared with the hardlinks
+            os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+        except PermissionError:
+            # explicit times can only be set by the owner of a file of a store shared by users
+            L.debug("Unable to update the access time of %s", path)
+        return path
+
+    def add(self, path: Path | str, algorithm: str, digest: str) -> Path:
+        """Add a verified file to the store.
+
+        Args:
+            path: The file to add, left unchanged.
+            algorithm: Name of the hashlib algorithm of the digest.
+            digest: Checksum of the file.
+
+        Returns:
+            The path of the content in the store.
+        """
+        stored_path = self.path_for(algorithm, digest)
+        if stored_path.exists():
+            return stored_path
+
+        stored_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _tmp_path(stored_path)
+        # not a hardlink, that would share the inode and make the added file read-only
+        try:
+            _reflink(path, tmp_path)
+        except OSError:
+            _copy(path, tmp_path)
+        # the content is shared by hardlinks, prevent modifying it by mistake
+        mode = tmp_path.stat().st_mode
+        tmp_path.chmod(mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+        os.replace(tmp_path, stored_path)
+        L.debug("Stored %s as %s", path, stored_path)
+        return stored_path
+
+    def materialize(self, stored_path: Path, target_path: Path | str) -> Path:
+        """Create the target path from the stored content.
+
+        Args:
+            stored_path: The path of the content in the store.
+            target_path: The path to create, replaced if it exists.
+
+        Returns:
+            The target path.
+        """
+        target_path = Path(target_path)
+        tmp_path = _tmp_path(target_path)
+
+        for link_mode in self._link_modes:
+            if tmp_path.exists() or tmp_path.is_symlink():
+                tmp_path.unlink()
+            try:
+                _LINK_FUNCTIONS[link_mode](stored_path, tmp_path)
+            except OSError as error:
+                # for example, hardlinks across filesystems or reflinks on unsupported ones
+                L.debug("Unable to %s %s: %s", link_mode, stored_path, error)
+                continue
+            os.replace(tmp_path, target_path)
+            L.debug("Materialised %s -> %s with %s", stored_path, target_path, link_mode)
+            return target_path
+
+        raise BluepyEntityError(f"Unable to materialise {stored_path} as {target_path}")
+
+    def size(self) -> int:
+        """Return the total size of the stored files in bytes."""
+        return sum(path.stat().st_size for path in self._iter_files())
+
+    def _iter_files(self):
+        return (path for path in self._root.glob("*/*/*") if not path.name.endswith(".tmp"))
+
+    def collect_garbage(self, max_size: Optional[int] = None) -> int:
+        """Remove the least recently used files until the store fits in the maximum size.
+
+        Args:
+            max_size: Maximum size of the store in bytes, defaults to the one of the store.
+
+        Returns:
+            The number of bytes removed.
+        """
+        max_size = self._max_size if max_size is None else max_size
+        if max_size is None:
+            return 0
+
+        files = []
+        for path in self._iter_files():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            files.append((st.st_atime_ns, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, path in sorted(files):
+            if total - removed <= max_size:
+                break
+            path.unlink(missing_ok=True)
+            removed += size
+            L.debug("Removed %s from the content store", path)
+
+        return removed
@@ -2,21 +2,59 @@
 """download files or create lines based on entities in the knowledge graph"""
 from __future__ import annotations
 
+import hashlib
+import http
+import json
 import logging
+import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Iterable, Optional, TextIO
 
+import requests
 from kgforge.core import Resource
 from more_itertools import always_iterable
 
+from bluepyentity.content_store import ContentStore, get_content_store
 from bluepyentity.exceptions import BluepyEntityError
+from bluepyentity.instrumentation import span
+from bluepyentity.ratelimit import RateLimiter
+from bluepyentity.retry import RetryPolicy
+from bluepyentity.session import get_session, use_shared_session
 
 L = logging.getLogger(__name__)
 
+# Name of the file recording the downloaded distributions in the output directory.
+MANIFEST_NAME = ".bluepyentity-manifest.json"
+# Suffix of the files being downloaded, kept to resume interrupted downloads.
+PARTIAL_SUFFIX = ".part"
+# Size in bytes of the chunks read from the responses and written to the files.
+CHUNK_SIZE = 1024 * 1024
+# Overrides the chunk size, to bound the memory used by each concurrent download.
+ENV_CHUNK_SIZE = "BLUEPYENTITY_DOWNLOAD_CHUNK_SIZE"
+# Timeout in seconds of the download requests.
+TIMEOUT = 60
+# Errors interrupting a download, which is resumed from the partial file.
+RESUMED_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
 
 def download(
-    forge, resource_id: str, output_dir: Path | str = ".", create_links_if_possible: bool = False
+    forge,
+    resource_id: str,
+    output_dir: Path | str = ".",
+    create_links_if_possible: bool = False,
+    *,
+    jobs: int = 1,
+    progress: Optional[Callable[[Path, int, int], None]] = None,
+    content_store: Optional[ContentStore] = None,
+    max_bandwidth: Optional[float] = None,
 ) -> Dict[str, Path]:
     """Download files based on entities in the knowledge graph.
 
@@ -25,23 +63,282 @@ def download(
         resource_id: The id of the resource to download.
         output_dir: Path to output directory. Default is '.'.
         create_link_if_possible: If True symbolic links will be created instead of copies.
+        jobs: Maximum number of distributions downloaded concurrently. Default is 1.
+        progress: Optional callable called with the path of each downloaded file, the number of
+            downloaded files and the total number of files.
+        content_store: Store of the downloaded files shared between output directories.
+            Default is the one configured by the environment variables, if any
+            (see :py:func:`~bluepyentity.content_store.get_content_store`).
+        max_bandwidth: Maximum number of bytes per second downloaded by all the workers,
+            unlimited if None.
 
     Returns:
         Dictionary the keys of which are the filenames and the values the file paths.
     """
     output_dir = Path(output_dir).resolve()
-    resource = forge.retrieve(resource_id, cross_bucket=True)
+    with use_shared_session():
+        resource = forge.retrieve(resource_id, cross_bucket=True)
 
     if hasattr(resource, "distribution"):
-        return _download_distributions(forge, resource, output_dir, create_links_if_possible)
+        start = time.monotonic()
+        content_store = content_store or get_content_store()
+        paths = _download_distributions(
+            forge,
+            resource,
+            output_dir,
+            create_links_if_possible,
+            jobs=jobs,
+            progress=progress,
+            content_store=content_store,
+            bandwidth_limiter=_get_bandwidth_limiter(max_bandwidth),
+        )
+        if content_store is not None:
+            content_store.collect_garbage()
+        _log_summary(paths, time.monotonic() - start)
+        return paths
 
     raise BluepyEntityError(f"Resource {resource_id} does not have distributions to download.")
 
 
+def _get_bandwidth_limiter(max_bandwidth):
+    """Return the token bucket of the bytes downloaded by the workers, or None if unlimited."""
+    if not max_bandwidth:
+        return None
+    # a chunk can be received at once after an idle period
+    return RateLimiter(max_bandwidth, burst=max(max_bandwidth, get_chunk_size()))
+
+
+def summarize(paths: Dict[str, Path], elapsed: float) -> Dict[str, float]:
+    """Summarize downloaded files.
+
+    Args:
+        paths: Dictionary of the downloaded file paths, as returned by `download`.
+        elapsed: Duration of the download in seconds.
+
+    Returns:
+        Dictionary with the number of files, the number of bytes, the duration in seconds and
+        the throughput in bytes per second.
+    """
+    nbytes = sum(path.stat().st_size for path in paths.values() if path.exists())
+    return {
+        "files": len(paths),
+        "bytes": nbytes,
+        "seconds": elapsed,
+        "throughput": nbytes / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def _log_summary(paths, elapsed):
+    summary = summarize(paths, elapsed)
+    L.info(
+        "Downloaded %d files, %d bytes in %.2f s (%.2f MB/s)",
+        summary["files"],
+        summary["bytes"],
+        summary["seconds"],
+        summary["throughput"] / 1e6,
+    )
+
+
+def download_many(
+    forge,
+    resource_ids: Iterable[str],
+    output_dir: Path | str = ".",
+    create_links_if_possible: bool = False,
+    *,
+    jobs: int = 1,
+    report: Optional[TextIO] = None,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+    content_store: Optional[ContentStore] = None,
+    max_bandwidth: Optional[float] = None,
+) -> Dict[str, Dict[str, Path]]:
+    """Download the files of several entities in the knowledge graph.
+
+    The resources are retrieved concurrently, and all their distributions are downloaded
+    through a shared pool of workers. A failure does not abort the other downloads.
+
+    Args:
+        forge: KnowledgeGraphForge instance.
+        resource_ids: The ids of the resources to download.
+        output_dir: Path to output directory. Default is '.'.
+        create_link_if_possible: If True symbolic links will be created instead of copies.
+        jobs: Maximum number of resources retrieved and of files downloaded concurrently.
+        report: Optional text stream where a JSON line is written for each resource, with
+            the keys "id", "status" ("ok" or "error"), "files" and "error".
+        progress: Optional callback called with the resource id, the number of processed
+            resources and the total number of resources, each time a resource is processed.
+        content_store: Store of the downloaded files, see `download`.
+        max_bandwidth: Maximum number of bytes per second downloaded, see `download`.
+
+    Returns:
+        Dictionary the keys of which are the ids of the successfully downloaded resources and
+        the values the dictionaries returned by `download`.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    output_dir = Path(output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    resource_ids = list(dict.fromkeys(resource_ids))
+    content_store = content_store or get_content_store()
+    manifest = _Manifest(output_dir)
+    bandwidth_limiter = _get_bandwidth_limiter(max_bandwidth)
+    start = time.monotonic()
+
+    def _download(target):
+        _download_distribution_file(
+            forge,
+            *target,
+            create_links_if_possible,
+            manifest=manifest,
+            content_store=content_store,
+            bandwidth_limiter=bandwidth_limiter,
+        )
+
+    with ThreadPoolExecutor(max_workers=jobs) as retrieve_pool, ThreadPoolExecutor(
+        max_workers=jobs
+    ) as download_pool:
+        downloads = _submit_downloads(
+            {
+                id_: retrieve_pool.submit(_get_resource_targets, forge, id_, output_dir)
+                for id_ in resource_ids
+            },
+            download_pool,
+            _download,
+        )
+        results = _collect_results(downloads, report, progress)
+
+    manifest.save()
+    if content_store is not None:
+        content_store.collect_garbage()
+    _log_summary(
+        {str(path): path for paths in results.values() for path in paths.values()},
+        time.monotonic() - start,
+    )
+    return results
+
+
+def _get_resource_targets(forge, resource_id, output_dir):
+    """Retrieve a resource and return its download targets, see `_get_download_targets`."""
+    with use_shared_session():
+        resource = forge.retrieve(resource_id, cross_bucket=True)
+    if resource is None:
+        raise BluepyEntityError(f"Resource {resource_id} could not be retrieved.")
+    if not hasattr(resource, "distribution"):
+        raise BluepyEntityError(f"Resource {resource_id} does not have distributions to download.")
+    return _get_download_targets(resource, output_dir)
+
+
+def _submit_downloads(retrievals, download_pool, download_file):
+    """Submit the downloads of the retrieved resources as soon as they are available.
+
+    Returns:
+        Dictionary mapping each resource id to the dictionary ``{name: (path, future)}``, or to
+        the exception raised while retrieving it.
+    """
+    downloads = {}
+    owners = {}
+    for resource_id, future in retrievals.items():
+        try:
+            targets = future.result()
+            _check_name_collisions(resource_id, targets, owners)
+        except Exception as error:  # pylint: disable=broad-except
+            downloads[resource_id] = error
+            continue
+        downloads[resource_id] = {
+            name: (target[1], download_pool.submit(download_file, target))
+            for name, target in targets.items()
+        }
+    return downloads
+
+
+def _check_name_collisions(resource_id, targets, owners):
+    """Raise an error if a filename is already used by the distribution of another resource.
+
+    The filenames are registered as owned by the resource only if none of them collides.
+    """
+    for name in targets:
+        owner = owners.get(name, resource_id)
+        if owner != resource_id:
+            raise BluepyEntityError(f"File {name} is also a distribution of {owner}.")
+    owners.update(dict.fromkeys(targets, resource_id))
+
+
+def _collect_results(downloads, report=None, progress=None):
+    """Wait for the downloads of the resources in order, and report them."""
+    results = {}
+    for done, (resource_id, resource_downloads) in enumerate(downloads.items(), 1):
+        entry = _collect_downloads(resource_id, resource_downloads)
+        if entry["status"] == "ok":
+            results[resource_id] = {name: Path(path) for name, path in entry["files"].items()}
+        else:
+            L.warning("Unable to download %s: %s", resource_id, entry["error"])
+        if report is not None:
+            report.write(json.dumps(entry) + "\n")
+            report.flush()
+        if progress is not None:
+            progress(resource_id, done, len(downloads))
+    return results
+
+
+def _collect_downloads(resource_id, downloads):
+    """Wait for the downloads of a resource and return its report entry."""
+    entry = {"id": resource_id, "status": "ok", "files": {}, "error": None}
+    if isinstance(downloads, Exception):
+        entry.update(status="error", error=str(downloads))
+        return entry
+
+    for name, (target_path, future) in downloads.items():
+        try:
+            future.result()
+        except Exception as error:  # pylint: disable=broad-except
+            entry.update(status="error", error=f"{name}: {error}")
+        else:
+            entry["files"][name] = str(target_path)
+    return entry
+
+
 def _download_distributions(
-    forge, resource, output_dir, create_links_if_possible
+    forge,
+    resource,
+    output_dir,
+    create_links_if_possible,
+    *,
+    jobs=1,
+    progress=None,
+    content_store=None,
+    bandwidth_limiter=None,
 ) -> Dict[str, Path]:
-    paths: Dict[str, Path] = {}
+    # pylint: disable=too-many-locals
+    targets = _get_download_targets(resource, output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _Manifest(output_dir)
+
+    def _download(target):
+        distribution, target_path = target
+        _download_distribution_file(
+            forge,
+            distribution,
+            target_path,
+            create_links_if_possible,
+            manifest=manifest,
+            content_store=content_store,
+            bandwidth_limiter=bandwidth_limiter,
+        )
+        return target_path
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets)))) as executor:
+        futures = [executor.submit(_download, target) for target in targets.values()]
+        for done, future in enumerate(as_completed(futures), start=1):
+            target_path = future.result()
+            L.debug("Downloaded %s (%d/%d)", target_path.name, done, len(targets))
+            if progress is not None:
+                progress(target_path, done, len(targets))
+    manifest.save()
+
+    return {name: target_path for name, (_, target_path) in targets.items()}
+
+
+def _get_download_targets(resource, output_dir):
+    """Return a dictionary mapping the filenames to the (distribution, target path) tuples."""
+    targets = {}
 
     valid_distributions = (
         distribution
@@ -57,18 +354,14 @@ def _download_distributions(
 
         target_name = distribution.name
 
-        if target_name in paths:
+        if target_name in targets:
             raise BluepyEntityError(
                 "Multiple distributions found with the same filename and extension."
             )
 
-        target_path = output_dir / target_name
-
-        _download_distribution_file(forge, distribution, target_path, create_links_if_possible)
+        targets[target_name] = (distribution, output_dir / target_name)
 
-        paths[target_name] = target_path
-
-    return paths
+    return targets
 
 
 def _is_downloadable(distribution):
@@ -112,18 +405,346 @@ def _get_filesystem_location(distribution):
     return None
 
 
-def _download_distribution_file(forge, distribution, target_path, create_links_if_possible):
+def download_distribution(
+    forge,
+    distribution,
+    output_dir: Path | str,
+    create_links_if_possible: bool = False,
+    *,
+    content_store: Optional[ContentStore] = None,
+    max_bandwidth: Optional[float] = None,
+) -> Path:
+    """Download a single distribution, unless it has already been downloaded.
+
+    Args:
+        forge: KnowledgeGraphForge instance.
+        distribution: The DataDownload resource to download.
+        output_dir: Path to output directory.
+        create_link_if_possible: If True symbolic links will be created instead of copies.
+        content_store: Store of the downloaded files, see `download`.
+        max_bandwidth: Maximum number of bytes per second downloaded, see `download`.
+
+    Returns:
+        The path of the downloaded file.
+    """
+    output_dir = Path(output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _Manifest(output_dir)
+    target_path = output_dir / distribution.name
+
+    content_store = content_store or get_content_store()
+
+    _download_distribution_file(
+        forge,
+        distribution,
+        target_path,
+        create_links_if_possible,
+        manifest=manifest,
+        content_store=content_store,
+        bandwidth_limiter=_get_bandwidth_limiter(max_bandwidth),
+    )
+    manifest.save()
+    if content_store is not None:
+        content_store.collect_garbage()
+
+    return target_path
+
+
+class _Manifest:
+    """Record of the distributions downloaded in a directory."""
+
+    def __init__(self, output_dir: Path):
+        self._path = Path(output_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if self._path.exists():
+            try:
+                self._entries = json.loads(self._path.read_text(encoding="utf-8"))
+            except ValueError:
+                L.warning("Ignoring the invalid download manifest %s", self._path)
+
+    def get(self, name):
+        """Return the entry recorded for the filename, or None."""
+        with self._lock:
+            return self._entries.get(name)
+
+    def set(self, name, entry):
+        """Record the entry for the filename."""
+        with self._lock:
+            self._entries[name] = entry
+
+    def save(self):
+        """Write the manifest atomically."""
+        with self._lock:
+            tmp_path = self._path.with_name(self._path.name + PARTIAL_SUFFIX)
+            tmp_path.write_text(json.dumps(self._entries, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+
+
+def _get_content_size(distribution):
+    """Return the expected size of the distribution in bytes, or None if unknown."""
+    size = getattr(distribution, "contentSize", None)
+    size = getattr(size, "value", size)
+    return int(size) if size is not None else None
+
+
+def _get_digest(distribution):
+    """Return a tuple (hashlib algorithm name, digest) of the distribution, or None if unknown."""
+    digest = getattr(distribution, "digest", None)
+    algorithm = getattr(digest, "algorithm", None)
+    value = getattr(digest, "value", None)
+    if not algorithm or not value:
+        return None
+
+    algorithm = algorithm.replace("-", "").lower()
+    if algorithm not in hashlib.algorithms_available:
+        L.warning("Unsupported digest algorithm %s, the checksum is not verified.", algorithm)
+        return None
+    return algorithm, value
+
+
+def get_chunk_size() -> int:
+    """Return the size of the chunks read and written while downloading."""
+    chunk_size = os.environ.get(ENV_CHUNK_SIZE)
+    if not chunk_size:
+        return CHUNK_SIZE
+    try:
+        chunk_size = int(chunk_size)
+    except ValueError:
+        chunk_size = 0
+    if chunk_size <= 0:
+        raise BluepyEntityError(f"{ENV_CHUNK_SIZE} must be a positive integer")
+    return chunk_size
+
+
+def _update_checksum(checksum, path):
+    chunk_size = get_chunk_size()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b""):
+            checksum.update(chunk)
+    return checksum
+
+
+def _file_digest(path, algorithm):
+    return _update_checksum(hashlib.new(algorithm), path).hexdigest()
+
+
+def _manifest_entry(distribution, target_path):
+    digest = _get_digest(distribution)
+    stat = target_path.stat()
+    return {
+        "contentUrl": distribution.contentUrl,
+        "digest": list(digest) if digest else None,
+        "contentSize": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
+def _is_unchanged(distribution, target_path, entry):
+    """Return True if the target path already contains the expected distribution.
+
+    The size and the checksum are compared to the ones of the distribution. The checksum is
+    computed only if the file has been modified since the last download recorded in the manifest.
+    """
+    if not target_path.is_file():
+        return False
+
+    stat = target_path.stat()
+    size = _get_content_size(distribution)
+    if size is not None and size != stat.st_size:
+        return False
+
+    digest = _get_digest(distribution)
+    if entry and entry["contentUrl"] == distribution.contentUrl:
+        recorded_digest = tuple(entry["digest"]) if entry["digest"] else None
+        if (
+            recorded_digest == digest
+            and entry["contentSize"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime_ns
+        ):
+            return True
+
+    if digest is None:
+        return False
+    return _file_digest(target_path, digest[0]) == digest[1]
+
+
+def _verify_file(distribution, path, checksum=None):
+    """Raise a BluepyEntityError if the size or the checksum of the file are not the expected.
+
+    Args:
+        distribution: The distribution of the file.
+        path: Path of the file.
+        checksum: Optional hashlib object already updated with the content of the file, to avoid
+            reading it again.
+    """
+    size = _get_content_size(distribution)
+    if size is not None and size != path.stat().st_size:
+        raise BluepyEntityError(
+            f"Size of {path} ({path.stat().st_size}) does not match the distribution ({size})."
+        )
+
+    digest = _get_digest(distribution)
+    if digest is None:
+        return
+    if checksum is not None and checksum.name == digest[0]:
+        actual = checksum.hexdigest()
+    else:
+        actual = _file_digest(path, digest[0])
+    if actual != digest[1]:
+        raise BluepyEntityError(f"Checksum of {path} does not match the distribution.")
+
+
+def _download_distribution_file(
+    forge,
+    distribution,
+    target_path,
+    create_links_if_possible,
+    *,
+    manifest=None,
+    content_store=None,
+    bandwidth_limiter=None,
+):
+    # pylint: disable=too-many-arguments
+    entry = manifest.get(target_path.name) if manifest else None
     filesystem_location = _get_filesystem_location(distribution)
 
     if filesystem_location:
         L.debug("Distribution with file %s has atLocation.", target_path.name)
         _copy_file(filesystem_location, target_path, create_links_if_possible)
+    elif _is_unchanged(distribution, target_path, entry):
+        L.info("Target %s is up to date, not downloading...", target_path)
     else:
         L.debug("Distribution with file %s doesn't have atLocation.", target_path.name)
-        forge.download(
-            distribution, follow="contentUrl", path=target_path.parent, cross_bucket=True
+        _download_stored_file(
+            forge, distribution, target_path, content_store, bandwidth_limiter=bandwidth_limiter
         )
 
+    if manifest:
+        manifest.set(target_path.name, _manifest_entry(distribution, target_path))
+
+
+def _download_stored_file(forge, distribution, target_path, content_store, bandwidth_limiter=None):
+    """Materialise the distribution from the content store, or download and store it."""
+    digest = _get_digest(distribution)
+    if content_store is None or digest is None:
+        _download_file(forge, distribution, target_path, bandwidth_limiter=bandwidth_limiter)
+        return
+
+    stored_path = content_store.get(*digest)
+    if stored_path is not None:
+        content_store.materialize(stored_path, target_path)
+    else:
+        _download_file(forge, distribution, target_path, bandwidth_limiter=bandwidth_limiter)
+        content_store.add(target_path, *digest)
+
+
+def _get_download_request(forge, distribution):
+    """Return the url, headers and query parameters needed to download the distribution."""
+    # pylint: disable=protected-access
+    store = forge._store
+    url, _ = store._prepare_download_one(
+        distribution.contentUrl, distribution._store_metadata, True
+    )
+    headers = dict(store.service.headers_download)
+    params = dict(store.service.params.get("download", {}))
+    return url, headers, params
+
+
+def _download_file(forge, distribution, target_path, bandwidth_limiter=None):
+    """Download the distribution atomically, resuming a previously interrupted download.
+
+    The download is resumed with the retry policy if the connection is lost while streaming.
+    The bytes downloaded take the tokens of the `bandwidth_limiter`, if any.
+    """
+    url, headers, params = _get_download_request(forge, distribution)
+    partial_path = target_path.with_name(target_path.name + PARTIAL_SUFFIX)
+    digest = _get_digest(distribution)
+
+    with span("download.file", file=target_path.name) as args:
+        checksum = RetryPolicy.from_environment().call(
+            _download_url,
+            url,
+            headers,
+            params,
+            partial_path,
+            algorithm=digest[0] if digest else None,
+            bandwidth_limiter=bandwidth_limiter,
+            retry_on=RESUMED_ERRORS,
+        )
+        args["bytes"] = partial_path.stat().st_size
+
+    try:
+        _verify_file(distribution, partial_path, checksum=checksum)
+    except BluepyEntityError:
+        partial_path.unlink()
+        raise
+
+    os.replace(partial_path, target_path)
+    L.debug("Downloaded %s -> %s", url, target_path)
+
+
+def _download_url(
+    url, headers, params, path, *, algorithm=None, resume=True, bandwidth_limiter=None
+):
+    """Stream the url to path, appending to its content if it already exists.
+
+    The response is written in chunks of `get_chunk_size` bytes, so that the memory used doesn't
+    depend on the size of the file.
+
+    Args:
+        url: The url to download.
+        headers: The headers of the request.
+        params: The query parameters of the request.
+        path: Path of the file to write.
+        algorithm: Optional name of the hashlib algorithm of the checksum computed while writing.
+        resume: If True, only the content missing from an existing file is requested.
+        bandwidth_limiter: Optional RateLimiter of the bytes downloaded, shared by the workers.
+
+    Returns:
+        The hashlib object updated with the whole content of the file, or None if no algorithm
+        is given.
+    """
+    # pylint: disable=too-many-arguments
+    offset = path.stat().st_size if resume and path.exists() else 0
+    request_headers = headers
+    if offset:
+        request_headers = {**headers, "Range": f"bytes={offset}-"}
+        L.debug("Resuming download of %s from byte %d", url, offset)
+
+    chunk_size = get_chunk_size()
+    with get_session().get(
+        url, headers=request_headers, params=params, stream=True, timeout=TIMEOUT
+    ) as r:
+        if offset and r.status_code == http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+            # the partial file is not a prefix of the content, start again
+            return _download_url(
+                url,
+                headers,
+                params,
+                path,
+                algorithm=algorithm,
+                resume=False,
+                bandwidth_limiter=bandwidth_limiter,
+            )
+        r.raise_for_status()
+        if r.status_code != http.HTTPStatus.PARTIAL_CONTENT:
+            # the server ignored the range
+            offset = 0
+
+        checksum = hashlib.new(algorithm) if algorithm else None
+        if offset and checksum is not None:
+            _update_checksum(checksum, path)
+
+        with open(path, "ab" if offset else "wb", buffering=chunk_size) as fd:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                if bandwidth_limiter is not None:
+                    bandwidth_limiter.acquire(len(chunk))
+                fd.write(chunk)
+                if checksum is not None:
+                    checksum.update(chunk)
+    return checksum
+
 
 def _remove_prefix(prefix: str, path: str) -> str:
     """Return the path without the prefix."""
@@ -134,18 +755,40 @@ def _remove_prefix(prefix: str, path: str) -> str:
 
 def _copy_file(source_path: Path, target_path: Path, create_link: bool = True) -> Path:
     source_path = Path(source_path).resolve()
-    target_path = Path(target_path).resolve()
+    # don't resolve the target itself, it could be a link to the source
+    target_path = Path(target_path).parent.resolve() / Path(target_path).name
 
     if not source_path.exists():
         raise BluepyEntityError(f"Source path {source_path} does not exist.")
 
-    if target_path.exists():
+    if create_link and target_path.is_symlink() and target_path.resolve() == source_path:
+        L.debug("Link %s -> %s already exists", source_path, target_path)
+        return target_path
+
+    if (
+        not create_link
+        and target_path.is_file()
+        and not target_path.is_symlink()
+        and target_path.stat().st_size == source_path.stat().st_size
+        and target_path.stat().st_mtime_ns >= source_path.stat().st_mtime_ns
+    ):
+        L.debug("Copy %s -> %s is up to date", source_path, target_path)
+        return target_path
+
+    if target_path.exists() or target_path.is_symlink():
         L.info("Target %s already exists and will be replaced.", target_path)
-        target_path.unlink()
+
+    # write a temporary file and rename it, so that the target is never partially written
+    tmp_path = target_path.with_name(target_path.name + PARTIAL_SUFFIX)
+    if tmp_path.exists() or tmp_path.is_symlink():
+        tmp_path.unlink()
 
     if create_link:
-        target_path.symlink_to(source_path)
+        tmp_path.symlink_to(source_path)
         L.debug("Link %s -> %s", source_path, target_path)
     else:
-        shutil.copy(source_path, target_path)
+        shutil.copy2(source_path, tmp_path)
         L.debug("Copy %s -> %s", source_path, target_path)
+
+    os.replace(tmp_path, target_path)
+    return target_path
@@ -1,18 +1,48 @@
 # SPDX-License-Identifier: Apache-2.0
 """Wrap different environments with different parameters ex: endpoints"""
 
+import copy
+import hashlib
 import importlib.resources
-
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+import requests
 import yaml
-from kgforge.core import KnowledgeGraphForge
 
 from bluepyentity.exceptions import BluepyEntityError
+from bluepyentity.instrumentation import span
+from bluepyentity.session import get_session, inject_session, use_shared_session
+from bluepyentity.utils import get_cache_dir
+
+L = logging.getLogger(__name__)
 
 ENVIRONMENTS = {
     "prod": "prod-forge-nexus.yaml",
     "staging": "staging-forge-nexus.yaml",
 }
 
+# Maximum number of forges kept by the process, the least recently used ones are dropped.
+MAX_FORGES = 8
+# Time in seconds after which the cached mapping files are downloaded again.
+MAPPING_TTL = 24 * 3600
+# Timeout in seconds of the mapping downloads.
+MAPPING_TIMEOUT = 30
+
+# Directory of the mapping files vendored in bluepyentity.data, see `bluepyentity env sync`.
+VENDORED_DIR = "mappings"
+
+# Futures of the forges kept by the process, indexed by their arguments.
+_FORGES = OrderedDict()
+_FORGES_LOCK = threading.Lock()
+
 
 def get_environment(env):
     """get yaml associated with environment `env`"""
@@ -21,9 +51,14 @@ def get_environment(env):
     )
 
 
-def create_forge(environment, token, bucket, store_overrides=None, debug=False):
+def create_forge(environment, token, bucket, store_overrides=None, debug=False, *, cached=True):
     """Create a kgforge.KnowledgeGraphForge object
 
+    The forges are kept by the process and reused by the calls with the same arguments, since
+    creating a forge resolves the model context and fetches the mapping files. The mapping files
+    vendored in ``bluepyentity.data`` are used instead of the remote ones, and the other remote
+    mapping files are cached on disk, in the user cache directory.
+
     Args:
 
         environment (str): Name of the configuration environment. Example: 'prod'
@@ -48,9 +83,10 @@ def create_forge(environment, token, bucket, store_overrides=None, debug=False):
                 versioned_id_template: A string template using 'x' to access resource fields.
                 file_resource_mapping: An Hjson string, a file path, or an URL.
         debug (bool): If True debug mode is enabled.
+        cached (bool): If False, a new forge is created and not kept by the process.
 
     Returns:
-        A KnowledgeGraphForge instance.
+        A KnowledgeGraphForge instance, shared with the other callers if `cached` is True.
 
     Raises:
         BluepyEntityError:
@@ -90,14 +126,283 @@ def create_forge(environment, token, bucket, store_overrides=None, debug=False):
             )
         forge_kwargs.update(store_overrides)
 
-    with get_environment(environment) as env:
-        forge = KnowledgeGraphForge(
-            str(env.absolute()),
-            token=token,
-            bucket=bucket,
-            **forge_kwargs,
-        )
-        return forge
+    if not cached:
+        return _create_forge(environment, token, bucket, forge_kwargs)
+
+    key = (
+        environment,
+        bucket,
+        _token_identity(token),
+        json.dumps(forge_kwargs, sort_keys=True, default=str),
+    )
+    # the forge is created outside of the lock, the other callers with the same key wait for it
+    with _FORGES_LOCK:
+        future = _FORGES.get(key)
+        creating = future is None
+        if creating:
+            future = _FORGES[key] = Future()
+            while len(_FORGES) > MAX_FORGES:
+                _FORGES.popitem(last=False)
+        else:
+            L.debug("Reusing the forge of %s for %s", environment, bucket)
+        _FORGES.move_to_end(key)
+
+    if not creating:
+        return future.result()
+    try:
+        forge = _create_forge(environment, token, bucket, forge_kwargs)
+    except BaseException as e:
+        with _FORGES_LOCK:
+            if _FORGES.get(key) is future:
+                del _FORGES[key]
+        future.set_exception(e)
+        raise
+    future.set_result(forge)
+    return forge
+
+
+def clear_forges():
+    """Drop the forges kept by the process, the next `create_forge` calls create new ones."""
+    with _FORGES_LOCK:
+        _FORGES.clear()
+
+
+def _rekey_forge(forge, token):
+    """Move the forge kept by the process to the key of its new token."""
+    with _FORGES_LOCK:
+        for key, future in list(_FORGES.items()):
+            if future.done() and not future.exception() and future.result() is forge:
+                del _FORGES[key]
+                new_key = (key[0], key[1], _token_identity(token), key[3])
+                # a forge already created with the new token is kept
+                _FORGES.setdefault(new_key, future)
+                return
+
+
+def _token_identity(token):
+    """Return a digest identifying the token, to avoid keeping it in the keys of the pool."""
+    if token is None:
+        return None
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _create_forge(environment, token, bucket, forge_kwargs):
+    # kgforge is slow to import, and not needed by the commands not creating a forge
+    # pylint: disable=import-outside-toplevel
+    from kgforge.core import KnowledgeGraphForge
+
+    # the store sends its requests with the pooled session of bluepyentity
+    inject_session()
+    start = time.monotonic()
+    with span("forge.create", environment=environment, bucket=bucket), use_shared_session():
+        config = _with_local_mappings(get_environment_config(environment))
+        if "file_resource_mapping" in forge_kwargs:
+            forge_kwargs = {
+                **forge_kwargs,
+                "file_resource_mapping": get_local_mapping(forge_kwargs["file_resource_mapping"]),
+            }
+        forge = KnowledgeGraphForge(config, token=token, bucket=bucket, **forge_kwargs)
+    L.debug("Created the forge of %s in %.2f s", environment, time.monotonic() - start)
+    return forge
+
+
+def _map_mappings(config, func):
+    """Apply `func` to the mapping files of the store and the resolvers of the configuration."""
+    store = config.get("Store", {})
+    if "file_resource_mapping" in store:
+        store["file_resource_mapping"] = func(store["file_resource_mapping"])
+    for resolvers in config.get("Resolvers", {}).values():
+        for resolver in resolvers:
+            if "result_resource_mapping" in resolver:
+                resolver["result_resource_mapping"] = func(resolver["result_resource_mapping"])
+    return config
+
+
+def _with_local_mappings(config):
+    """Return a copy of the configuration where the remote mapping files are local files."""
+    return _map_mappings(copy.deepcopy(config), get_local_mapping)
+
+
+def get_mapping_urls(environment):
+    """Return the urls of the remote mapping files of the `environment` configuration."""
+    urls = []
+
+    def _append(source):
+        if _is_url(source):
+            urls.append(source)
+        return source
+
+    _map_mappings(get_environment_config(environment), _append)
+    return urls
+
+
+def _is_url(source):
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+
+def get_vendored_dir():
+    """Return the directory of the mapping files vendored in `bluepyentity.data`."""
+    return Path(str(importlib.resources.files("bluepyentity.data").joinpath(VENDORED_DIR)))
+
+
+def get_vendored_mapping(source, vendored_dir=None):
+    """Return the path of the vendored copy of the mapping `source`, or None if not vendored."""
+    if not _is_url(source):
+        return None
+    vendored_dir = Path(vendored_dir) if vendored_dir is not None else get_vendored_dir()
+    path = vendored_dir / _vendored_name(source)
+    return str(path) if path.is_file() else None
+
+
+def _vendored_name(url):
+    """Return the name of the vendored file, the last segment of the url path."""
+    return Path(urllib.parse.urlparse(url).path).name
+
+
+def get_local_mapping(source):
+    """Return a local path of the mapping `source`, avoiding remote fetches when possible.
+
+    The vendored copy is used if available, otherwise the copy cached in the user cache directory
+    (see :py:func:`get_cached_mapping`).
+    """
+    return get_vendored_mapping(source) or get_cached_mapping(source)
+
+
+def sync_mappings(vendored_dir):
+    """Download the mapping files of all the environments and vendor them.
+
+    The directory is explicit since the one of the installed package, `get_vendored_dir`, is
+    usually not writable: the files are refreshed in a checkout, in ``bluepyentity/data/mappings``.
+
+    Args:
+        vendored_dir (str): Directory of the vendored files.
+
+    Returns:
+        dict: The paths of the vendored files, indexed by url.
+
+    Raises:
+        BluepyEntityError: If a mapping can't be downloaded, or if two urls have the same name.
+    """
+    vendored_dir = Path(vendored_dir)
+    urls = sorted({url for env in ENVIRONMENTS for url in get_mapping_urls(env)})
+    names = {}
+    for url in urls:
+        name = _vendored_name(url)
+        if names.setdefault(name, url) != url:
+            raise BluepyEntityError(f"Mappings {names[name]} and {url} have the same name {name}")
+
+    contents = {}
+    for url in urls:
+        try:
+            response = get_session().get(url, timeout=MAPPING_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise BluepyEntityError(f"Unable to download the mapping {url}: {e}") from e
+        contents[url] = response.content
+
+    vendored_dir.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for url, content in contents.items():
+        path = vendored_dir / _vendored_name(url)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+        L.info("Vendored the mapping %s as %s", url, path)
+        paths[url] = path
+    return paths
+
+
+def get_cached_mapping(source, cache_dir=None, ttl=MAPPING_TTL):
+    """Return the path of a local copy of a remote mapping file.
+
+    The file is downloaded again when the local copy is older than `ttl` seconds. If the download
+    fails, an expired local copy is used if available, otherwise the source is returned unchanged.
+
+    Args:
+        source (str): A mapping as accepted by kgforge: an Hjson string, a file path, or an URL.
+        cache_dir (str): Directory of the cache, defaults to the user cache directory.
+        ttl (float): Time to live in seconds of the local copy.
+
+    Returns:
+        str: The path of the local copy if `source` is an URL, otherwise `source`.
+    """
+    if not _is_url(source):
+        return source
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else get_cache_dir()
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    path = cache_dir / "mappings" / f"{digest}.hjson"
+    try:
+        if time.time() - path.stat().st_mtime <= ttl:
+            return str(path)
+    except FileNotFoundError:
+        pass
+
+    try:
+        response = get_session().get(source, timeout=MAPPING_TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if path.exists():
+            L.warning("Unable to update the mapping %s, using the cached one: %s", source, e)
+            return str(path)
+        L.warning("Unable to cache the mapping %s: %s", source, e)
+        return source
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(response.content)
+    os.replace(tmp_path, path)
+    L.debug("Cached the mapping %s as %s", source, path)
+    return str(path)
+
+
+def set_forge_token(forge, token):
+    """Replace the token used by the stores of the forge, including its model and resolvers.
+
+    The requests already sent keep using the previous token. If the forge is kept by the process,
+    it's reused by the `create_forge` calls with the new token instead of the previous one.
+    """
+    _rekey_forge(forge, token)
+    for store in _iter_stores(forge):
+        store.token = token
+        service = getattr(store, "service", None)
+        for name in _HEADERS:
+            headers = getattr(service, name, None)
+            if isinstance(headers, dict):
+                headers["Authorization"] = f"Bearer {token}"
+
+    # pylint: disable=import-outside-toplevel
+    try:
+        import nexussdk.config
+    except ModuleNotFoundError:
+        pass
+    else:
+        # set by the store when the sdk has a global configuration
+        nexussdk.config.set_token(token)
+
+
+# attributes of the nexus store service holding the headers of the requests
+_HEADERS = ("headers", "headers_sparql", "headers_elastic", "headers_upload", "headers_download")
+
+
+def _iter_stores(forge):
+    """Yield the distinct stores of the forge, its model and its resolvers."""
+    # pylint: disable=protected-access
+    model_service = getattr(getattr(forge, "_model", None), "service", None)
+    stores = [
+        forge._store,
+        getattr(model_service, "default_store", None),
+        getattr(model_service, "context_store", None),
+    ]
+    for resolvers in (getattr(forge, "_resolvers", None) or {}).values():
+        for resolver in resolvers.values():
+            stores.extend(getattr(resolver.service, "sources", {}).values())
+
+    seen = set()
+    for store in stores:
+        if store is not None and id(store) not in seen:
+            seen.add(id(store))
+            yield store
 
 
 def get_environment_config(environment):
@@ -115,6 +420,7 @@ def create_nexus_client(environment, token):
 
     import nexussdk
 
+    inject_session()
     try:
         # nexussdk.config was deleted when they moved to having NexusClient,
         # so it's used as canary
@@ -162,7 +468,7 @@ def create_nexus_client(environment, token):
 
             Raise an ``Exception`` if ``rev`` and ``tag`` are used together.
             """
-            # pylint: disable=protected-access
+            # pylint: disable=protected-access,too-many-positional-arguments
             _resolvers._check(rev, tag)
             encoded_resolver_id = encode_url(resolver_id)
             encoded_id = encode_url(id_)
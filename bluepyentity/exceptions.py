@@ -3,3 +3,20 @@
 
 class BluepyEntityError(Exception):
     """bluepyentity error."""
+
+
+class RetrievalError(BluepyEntityError):
+    """Raised when some resources of a bulk retrieval could not be fetched."""
+
+    def __init__(self, errors, resources):
+        """Instantiate a new RetrievalError.
+
+        Args:
+            errors (dict): Mapping of the failed resource ids to the raised exceptions.
+            resources (list): Retrieved resources in the requested order, None for the failures.
+        """
+        super().__init__(
+            f"Unable to retrieve {len(errors)} of {len(resources)} resources: {sorted(errors)}"
+        )
+        self.errors = errors
+        self.resources = resources
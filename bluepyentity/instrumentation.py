@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: Apache-2.0
+"""timing of the calls to Nexus: aggregated statistics and Chrome traces"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+L = logging.getLogger(__name__)
+
+# Maximum number of durations kept by name to compute the percentiles.
+MAX_SAMPLES = 10000
+# Arguments of the spans summed in the statistics.
+SUMMED_ARGS = ("bytes", "cache_hit", "results")
+
+
+def _percentile(sorted_values, percent):
+    """Return the percentile of the sorted values, with the nearest-rank method."""
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+
+class Recorder:
+    """Record the duration and the arguments of the spans of the process.
+
+    The statistics are computed from the last `max_samples` durations of each span name. The
+    spans themselves are only kept if `trace` is True, to be written as a Chrome trace.
+    """
+
+    def __init__(self, trace=False, max_samples=MAX_SAMPLES):
+        """Instantiate a new Recorder.
+
+        Args:
+            trace (bool): If True, the spans are kept to be written with `write_trace`.
+            max_samples (int): Maximum number of durations kept by span name.
+        """
+        self.trace = trace
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._samples = defaultdict(lambda: deque(maxlen=self._max_samples))
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._events = []
+
+    def add(self, name, start, duration, **args):
+        """Record a span.
+
+        Args:
+            name (str): Name of the span, for example ``nexus.retrieve``.
+            start (float): Start of the span, as returned by ``time.perf_counter``.
+            duration (float): Duration of the span in seconds.
+            args: Arguments of the span, the ones in ``SUMMED_ARGS`` are summed in the stats.
+        """
+        with self._lock:
+            self._samples[name].append(duration)
+            totals = self._totals[name]
+            totals["count"] += 1
+            totals["total"] += duration
+            for arg in SUMMED_ARGS:
+                if args.get(arg) is not None:
+                    totals[arg] += args[arg]
+            if self.trace:
+                self._events.append((name, start, duration, threading.get_ident(), args))
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """Context manager recording the span of the code it wraps.
+
+        The dictionary of the arguments is yielded, to add the ones known only at the end.
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            self.add(name, start, time.perf_counter() - start, **args)
+
+    def stats(self):
+        """Return the statistics of the spans.
+
+        Returns:
+            dict: Dictionary indexed by span name, with the ``count``, the ``total``, ``p50``,
+            ``p95`` and ``max`` durations in seconds, and the sums of the ``SUMMED_ARGS``.
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = {name: dict(values) for name, values in self._totals.items()}
+
+        stats = {}
+        for name, values in sorted(samples.items()):
+            stats[name] = {
+                **totals[name],
+                "count": int(totals[name]["count"]),
+                "p50": _percentile(values, 50),
+                "p95": _percentile(values, 95),
+                "max": values[-1],
+            }
+        return stats
+
+    def trace_events(self):
+        """Return the spans in the Chrome trace event format, with times in microseconds."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+        return [
+            {
+                "name": name,
+                "cat": name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": duration * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+            for name, start, duration, tid, args in events
+        ]
+
+    def write_trace(self, path):
+        """Write the spans to `path` as a Chrome trace, to be opened with chrome://tracing."""
+        with open(path, "w", encoding="utf-8") as fd:
+            json.dump({"traceEvents": self.trace_events()}, fd, default=str)
+        L.info("Wrote the trace of %d spans to %s", len(self._events), path)
+
+    def reset(self):
+        """Forget the recorded spans."""
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._events.clear()
+
+
+_RECORDER = Recorder()
+
+
+def get_recorder():
+    """Return the recorder of the process."""
+    return _RECORDER
+
+
+def set_recorder(recorder):
+    """Replace the recorder of the process, and return the previous one."""
+    global _RECORDER  # pylint: disable=global-statement
+    previous, _RECORDER = _RECORDER, recorder
+    return previous
+
+
+def span(name, **args):
+    """Record a span with the recorder of the process, see `Recorder.span`."""
+    return get_recorder().span(name, **args)
@@ -0,0 +1,300 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""Persistent cache of the resources retrieved from Nexus."""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import closing
+from pathlib import Path
+
+from kgforge.core.conversions.json import as_json, from_json
+from kgforge.core.wrappings.dict import wrap_dict
+
+from bluepyentity.utils import (
+    get_cache_dir,
+    url_get_revision,
+    url_with_revision,
+    url_without_revision,
+)
+
+L = logging.getLogger(__name__)
+
+# Time to live in seconds of the resources retrieved without a revision.
+DEFAULT_TTL = 3600
+# Time in seconds to wait for the database lock held by other processes.
+LOCK_TIMEOUT = 30
+# Maximum number of resources kept in memory.
+DEFAULT_MAXSIZE = 1024
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    key TEXT PRIMARY KEY,
+    pinned INTEGER NOT NULL,
+    created REAL NOT NULL,
+    data BLOB NOT NULL
+)
+"""
+
+
+def get_cache_path(environment, cache_dir=None):
+    """Return the path of the cache database for the given environment.
+
+    Args:
+        environment (str): Name of the nexus environment ("prod", "staging").
+        cache_dir (str): Directory of the cache, defaults to the user cache directory.
+
+    Returns:
+        Path: Path to the SQLite database.
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    return Path(cache_dir, f"resources-{environment}.db")
+
+
+def _cache_key(resource_id, version=None):
+    """Return a tuple (key, pinned) for the resource id, or None if it can't be cached.
+
+    Resources identified by a revision are immutable and pinned in the cache,
+    while resources identified by a tag are never cached since tags can be moved.
+    """
+    if version is not None:
+        if not isinstance(version, int):
+            return None
+        resource_id = url_with_revision(resource_id, version)
+
+    revision = url_get_revision(resource_id)
+    if revision is not None:
+        return url_with_revision(url_without_revision(resource_id), revision), True
+    if "?" in resource_id:
+        return None
+    return resource_id, False
+
+
+def _cache_keys(resource_id, resource, version=None):
+    """Return the list of (key, pinned) under which a retrieved resource can be cached.
+
+    The resource is also pinned under the revision found in its store metadata.
+    """
+    key = _cache_key(resource_id, version)
+    if key is None:
+        return []
+
+    keys = [key]
+    metadata = getattr(resource, "_store_metadata", None)
+    revision = metadata.get("_rev") if metadata else None
+    if not key[1] and revision is not None:
+        keys.append((url_with_revision(key[0], revision), True))
+    return keys
+
+
+def _serialize(resource):
+    data = as_json(
+        resource,
+        expanded=False,
+        store_metadata=False,
+        model_context=None,
+        metadata_context=None,
+        context_resolver=None,
+    )
+    metadata = getattr(resource, "_store_metadata", None)
+    return zlib.compress(json.dumps({"data": data, "metadata": metadata}).encode("utf-8"))
+
+
+def _deserialize(blob):
+    content = json.loads(zlib.decompress(blob).decode("utf-8"))
+    resource = from_json(content["data"], None)
+    # pylint: disable=protected-access
+    if content["metadata"] is not None:
+        resource._store_metadata = wrap_dict(content["metadata"])
+    resource._synchronized = True
+    return resource
+
+
+class ResourceCache:
+    """On-disk cache of the retrieved resources.
+
+    The resources are stored as compressed JSON in a SQLite database, so that the cache can be
+    shared between processes running on the same node.
+    Resources retrieved with a revision are served forever, while the other ones are served
+    until their time to live expires.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        """Instantiate a new ResourceCache.
+
+        Args:
+            path (str): Path to the SQLite database, created if it doesn't exist.
+            ttl (float): Time to live in seconds of the resources retrieved without a revision.
+                If 0, only the resources retrieved with a revision are cached.
+        """
+        self._path = Path(path)
+        self._ttl = ttl
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(_SCHEMA)
+
+    @property
+    def path(self):
+        """Path to the SQLite database."""
+        return self._path
+
+    def _connect(self):
+        # one connection per operation, since the connector uses several threads
+        return sqlite3.connect(self._path, timeout=LOCK_TIMEOUT)
+
+    def get(self, resource_id, version=None):
+        """Return the cached resource, or None if it's not cached or has expired.
+
+        Args:
+            resource_id (str): ID of a Nexus resource.
+            version (int, str): Revision or tag of the resource, as in KnowledgeGraphForge.retrieve.
+
+        Returns:
+            kgforge.core.Resource: The cached resource or None.
+        """
+        key = _cache_key(resource_id, version)
+        if key is None:
+            return None
+        key, pinned = key
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT created, data FROM resources WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        created, data = row
+        if not pinned and time.time() - created > self._ttl:
+            L.debug("Cached resource %s has expired", key)
+            return None
+
+        L.debug("Resource %s found in cache", key)
+        return _deserialize(data)
+
+    def put(self, resource_id, resource, version=None):
+        """Store a retrieved resource in the cache.
+
+        The resource is also pinned under its revision when it's known from the store metadata.
+
+        Args:
+            resource_id (str): ID used to retrieve the resource.
+            resource (kgforge.core.Resource): The retrieved resource.
+            version (int, str): Revision or tag of the resource, as in KnowledgeGraphForge.retrieve.
+        """
+        keys = [
+            (key, pinned)
+            for key, pinned in _cache_keys(resource_id, resource, version=version)
+            if pinned or self._ttl
+        ]
+        if not keys:
+            return
+
+        data = _serialize(resource)
+        now = time.time()
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO resources (key, pinned, created, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(key, int(pinned), now, data) for key, pinned in keys],
+                )
+
+    def clear(self):
+        """Remove all the resources from the cache."""
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute("DELETE FROM resources")
+
+
+class LRUResourceCache:
+    """In-memory cache of the retrieved resources, evicting the least recently used ones.
+
+    The cached resources are shared between all the callers, and they shouldn't be modified.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=None):
+        """Instantiate a new LRUResourceCache.
+
+        Args:
+            maxsize (int): Maximum number of resources kept in memory.
+            ttl (float): Time to live in seconds of the resources retrieved without a revision,
+                they never expire if None.
+        """
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def get(self, resource_id, version=None):
+        """Return the cached resource, or None if it's not cached.
+
+        Args:
+            resource_id (str): ID of a Nexus resource.
+            version (int, str): Revision or tag of the resource, as in KnowledgeGraphForge.retrieve.
+
+        Returns:
+            kgforge.core.Resource: The cached resource or None.
+        """
+        key = _cache_key(resource_id, version)
+        if key is None:
+            return None
+
+        with self._lock:
+            resource, pinned, created = self._data.get(key[0], (None, False, 0))
+            if resource is not None and not pinned and self._is_expired(created):
+                del self._data[key[0]]
+                resource = None
+            if resource is None:
+                self._misses += 1
+                return None
+            self._data.move_to_end(key[0])
+            self._hits += 1
+            return resource
+
+    def put(self, resource_id, resource, version=None):
+        """Store a retrieved resource in the cache.
+
+        Args:
+            resource_id (str): ID used to retrieve the resource.
+            resource (kgforge.core.Resource): The retrieved resource.
+            version (int, str): Revision or tag of the resource, as in KnowledgeGraphForge.retrieve.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key, pinned in _cache_keys(resource_id, resource, version=version):
+                self._data[key] = (resource, pinned, now)
+                self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def _is_expired(self, created):
+        """Return True if a resource cached at `created` without a revision has expired."""
+        return self._ttl is not None and time.monotonic() - created > self._ttl
+
+    def clear(self):
+        """Remove all the resources from the cache, and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self):
+        """Return the cache statistics.
+
+        Returns:
+            CacheInfo: Named tuple with hits, misses, evictions, maxsize and currsize.
+        """
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._evictions, self._maxsize, len(self._data)
+            )
@@ -2,10 +2,36 @@
 
 """Implementation of Nexus connector for the kgforge API."""
 import logging
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from kgforge.core import Resource
+from kgforge.core.archetypes.store import rewrite_sparql
+from more_itertools import always_iterable
+
+from bluepyentity.download import download_distribution
+from bluepyentity.environments import set_forge_token
+from bluepyentity.exceptions import BluepyEntityError, RetrievalError
+from bluepyentity.instrumentation import span
+from bluepyentity.nexus import elastic
+from bluepyentity.nexus import graph as graph_utils
+from bluepyentity.session import get_session, use_shared_session
 
 L = logging.getLogger(__name__)
 
+# Same default as the ``max_connection`` of the store in the environment configs.
+DEFAULT_MAX_WORKERS = 5
+# Default number of resources searched with each request.
+DEFAULT_PAGE_SIZE = 100
+# Timeout in seconds of the graph queries.
+GRAPH_QUERY_TIMEOUT = 300
+# Backends of the searches: the SPARQL view used by the forge, or its Elasticsearch view.
+SEARCH_BACKENDS = ("sparql", "elastic")
+# Maximum number of hits returned by each Elasticsearch request.
+ELASTIC_MAX_PAGE_SIZE = 1000
+# Timeout in seconds of the Elasticsearch requests.
+ELASTIC_TIMEOUT = 300
+
 PROJECTS_NAMESPACE = "https://bbp.epfl.ch/nexus/v1/projects/"
 USERS_NAMESPACE = "https://bbp.epfl.ch/nexus/v1/realms/bbp/users/"
 
@@ -80,52 +106,273 @@ def _build_search_filters(type_, filters):
     return search_filters
 
 
+def _get_search_backend(backend):
+    """Return the backend of the searches, if supported."""
+    if backend not in SEARCH_BACKENDS:
+        raise BluepyEntityError(
+            f"Invalid search backend {backend!r}, supported: {list(SEARCH_BACKENDS)}"
+        )
+    return backend
+
+
 class NexusConnector:
     """Handles communication with Nexus."""
 
-    def __init__(self, forge, debug=False):
+    def __init__(
+        self,
+        forge,
+        debug=False,
+        *,
+        max_workers=None,
+        cache=None,
+        memory_cache=None,
+        search_backend="sparql",
+    ):
         """Instantiate a new NexusConnector.
 
         Args:
             forge (KnowledgeGraphForge): A KnowledgeGraphForge instance.
             debug (bool): A flag that enables more verbose output.
+            max_workers (int): Maximum number of concurrent requests used when fetching
+                several resources. Defaults to ``DEFAULT_MAX_WORKERS``.
+            cache (ResourceCache): Optional persistent cache of the retrieved resources
+                (see :py:class:`~bluepyentity.nexus.cache.ResourceCache`).
+            memory_cache (LRUResourceCache): Optional in-memory cache of the retrieved resources
+                (see :py:class:`~bluepyentity.nexus.cache.LRUResourceCache`).
+            search_backend (str): Default backend of the searches, one of ``SEARCH_BACKENDS``
+                (see :py:meth:`search`).
         """
+        # pylint: disable=too-many-arguments
         self._forge = forge
         self._debug = debug
+        self._max_workers = max_workers or DEFAULT_MAX_WORKERS
+        self._cache = cache
+        self._memory_cache = memory_cache
+        self._search_backend = _get_search_backend(search_backend)
+
+    @property
+    def memory_cache(self):
+        """The in-memory cache of the retrieved resources, or None."""
+        return self._memory_cache
+
+    def set_token(self, token):
+        """Replace the token used by the forge, without interrupting the requests in flight.
+
+        Args:
+            token (str): A base64 encoded Nexus access token.
+        """
+        set_forge_token(self._forge, token)
 
-    def search(self, type_, filters, **kwargs):
+    def search(self, type_, filters, backend=None, **kwargs):
         """Search for resources in Nexus.
 
         Args:
             type_ (str): Resource type (e.g., ``"DetailedCircuit"``).
             filters (dict): Search filters to use.
-            kwargs (dict): See KnowledgeGraphForge.search.
+            backend (str): ``"sparql"`` to search with KnowledgeGraphForge.search, or
+                ``"elastic"`` to search the Elasticsearch view (see :py:meth:`search_elastic`).
+                Defaults to the backend of the connector.
+            kwargs (dict): See KnowledgeGraphForge.search, or :py:meth:`search_elastic`.
 
         Returns:
             list: An array of found (kgforge.core.Resource) resources.
         """
+        if _get_search_backend(backend or self._search_backend) == "elastic":
+            return self.search_elastic(type_, filters, **kwargs)
+
         search_filters = _build_search_filters(type_, filters)
         kwargs["debug"] = kwargs.get("debug", self._debug)
         kwargs["search_in_graph"] = kwargs.get("search_in_graph", False)
 
-        return self._forge.search(search_filters, **kwargs)
+        with span("nexus.search", type=type_) as args, use_shared_session():
+            resources = self._forge.search(search_filters, **kwargs)
+            args["results"] = len(resources or [])
+        return resources
+
+    def search_elastic(self, type_, filters, limit=DEFAULT_PAGE_SIZE, **kwargs):
+        """Search for resources in the Elasticsearch view of the forge.
+
+        The search filters are translated to an Elasticsearch query, without fetching the mapping
+        of the view: the string values are matched with the keyword sub-field of their field, as
+        with the default mappings of Nexus. The results are paged through with ``search_after``,
+        so that the number of results is not limited by the maximum window of the index.
+
+        Args:
+            type_ (str): Resource type (e.g., ``"DetailedCircuit"``).
+            filters (dict): Search filters to use.
+            limit (int): Maximum number of results, or None to return all of them.
+            kwargs (dict): See :py:meth:`_search_elastic_page`.
+
+        Returns:
+            list: An array of found (kgforge.core.Resource) resources.
+
+        Examples:
+            >>> connector.search_elastic(
+            ...     "DetailedCircuit", {"brainLocation": {"brainRegion": {"label": "Thalamus"}}},
+            ...     includes=["@id", "name", "_rev", "_project"], limit=None)
+        """
+        # the offset only applies to the first page, the next ones being searched after it
+        offset = kwargs.pop("offset", None)
+        resources = []
+        search_after = None
+        while limit is None or len(resources) < limit:
+            size = ELASTIC_MAX_PAGE_SIZE
+            if limit is not None:
+                size = min(size, limit - len(resources))
+            page, search_after = self._search_elastic_page(
+                type_, filters, size, search_after=search_after, offset=offset, **kwargs
+            )
+            offset = None
+            resources.extend(page)
+            if len(page) < size:
+                break
+        return resources
+
+    def _search_elastic_page(
+        self,
+        type_,
+        filters,
+        size,
+        *,
+        search_after=None,
+        offset=None,
+        includes=None,
+        excludes=None,
+        deprecated=False,
+        cross_bucket=False,
+        debug=None,
+    ):
+        """Search a page of resources in the Elasticsearch view of the forge.
+
+        Args:
+            type_ (str): Resource type (e.g., ``"DetailedCircuit"``).
+            filters (dict): Search filters to use.
+            size (int): Number of resources of the page.
+            search_after (list): Sort values of the last hit of the previous page, if any.
+            offset (int): Number of resources skipped, only on the first page.
+            includes (list): Fields of the resources returned, all of them if None.
+            excludes (list): Fields of the resources not returned.
+            deprecated (bool): Search the deprecated resources instead of the other ones,
+                unless ``deprecated`` is a search filter.
+            cross_bucket (bool): If True, search the resources of all the projects of the view.
+            debug (bool): If True, print the submitted query. Defaults to the debug flag of the
+                connector.
+
+        Returns:
+            tuple: The page of resources, and the sort values of its last hit.
 
-    def query(self, query, **kwargs):
+        Raises:
+            BluepyEntityError: If the search failed.
+        """
+        # pylint: disable=too-many-arguments,too-many-locals
+        store = self._forge._store  # pylint: disable=protected-access
+        service = store.service
+        search_filters = _build_search_filters(type_, filters)
+        search_filters.setdefault("_deprecated", deprecated)
+        if not cross_bucket:
+            search_filters.setdefault("_project", f"{store.endpoint}/projects/{store.bucket}")
+        query = elastic.build_query(
+            search_filters,
+            size,
+            keyword_field=service.elastic_endpoint.get("default_str_keyword_field"),
+            context=store.model_context,
+            includes=includes,
+            excludes=excludes,
+            search_after=search_after,
+            offset=offset,
+        )
+        if debug if debug is not None else self._debug:
+            L.info("Submitted elastic query:\n%s", query)
+
+        with span("nexus.search", type=type_, backend="elastic") as args:
+            response = get_session().post(
+                service.elastic_endpoint["endpoint"],
+                json=query,
+                headers=service.headers_elastic,
+                timeout=ELASTIC_TIMEOUT,
+            )
+            if not response.ok:
+                raise BluepyEntityError(
+                    f"The elastic search failed with status {response.status_code}: "
+                    f"{response.text}"
+                )
+            hits = response.json()["hits"]["hits"]
+            resources = elastic.hits_to_resources(hits, store)
+            args["results"] = len(resources)
+        return resources, hits[-1]["sort"] if hits else None
+
+    def query(self, query, graph=False, **kwargs):
         """Query resources using SparQL as defined in KnowledgeGraphForge.
 
         Args:
             query (str): Query string to be passed to KnowledgeGraphForge.sparql.
+            graph (bool): If True, the query is a CONSTRUCT or DESCRIBE query, whose graph is
+                converted to resources (see :py:meth:`query_graph`).
             kwargs (dict): See KnowledgeGraphForge.sparql.
 
         Returns:
             list: An array of found (kgforge.core.Resource) resources.
         """
+        if graph:
+            return self.query_graph(query, **kwargs)
+
         kwargs["debug"] = kwargs.get("debug", self._debug)
-        return self._forge.sparql(query, **kwargs)
+        with span("nexus.query") as args, use_shared_session():
+            resources = self._forge.sparql(query, **kwargs)
+            args["results"] = len(resources or [])
+        return resources
+
+    def query_graph(self, query, debug=None, rewrite=True):
+        """Run a CONSTRUCT or DESCRIBE query, and convert the returned graph to resources.
+
+        The whole resources are returned by a single request, instead of the ids returned by a
+        SELECT query, to be retrieved one by one. Each subject of the graph identified by an IRI
+        is a resource, with its blank nodes embedded (see
+        :py:func:`~bluepyentity.nexus.graph.graph_to_resources`).
+        Unlike with KnowledgeGraphForge.sparql, no LIMIT is added to the query, since it would
+        limit the number of triples instead of the number of resources.
+
+        Args:
+            query (str): CONSTRUCT or DESCRIBE query string.
+            debug (bool): If True, print the submitted query. Defaults to the debug flag of the
+                connector.
+            rewrite (bool): If True, the names of the properties and types are rewritten with the
+                context of the forge, as with KnowledgeGraphForge.sparql.
+
+        Returns:
+            list: An array of (kgforge.core.Resource) resources, sorted by id.
+
+        Raises:
+            BluepyEntityError: If the query failed.
+        """
+        store = self._forge._store  # pylint: disable=protected-access
+        service = store.service
+        if rewrite and store.model_context is not None:
+            query = rewrite_sparql(query, store.model_context, service.metadata_context)
+        if debug if debug is not None else self._debug:
+            L.info("Submitted graph query:\n%s", query)
+
+        with span("nexus.query", graph=True) as args:
+            response = get_session().post(
+                service.sparql_endpoint["endpoint"],
+                data=query.encode("utf-8"),
+                headers={**service.headers_sparql, "Accept": graph_utils.ACCEPT},
+                timeout=GRAPH_QUERY_TIMEOUT,
+            )
+            if not response.ok:
+                raise BluepyEntityError(
+                    f"The graph query failed with status {response.status_code}: {response.text}"
+                )
+            graph = graph_utils.parse_graph(response.content, response.headers.get("Content-Type"))
+            resources = graph_utils.graph_to_resources(graph, store)
+            args["results"] = len(resources)
+        return resources
 
     def get_resource_by_id(self, resource_id, **kwargs):
         """Fetch a resource based on its ID.
 
+        The resource is served from the in-memory cache, or from the persistent cache, if available.
+
         Args:
             resource_id (str): ID of a Nexus resource.
             kwargs (dict): See KnowledgeGraphForge.retrieve.
@@ -134,52 +381,320 @@ class NexusConnector:
             kgforge.core.Resource: Desired resource.
         """
         kwargs["cross_bucket"] = kwargs.get("cross_bucket", True)
-        return self._forge.retrieve(resource_id, **kwargs)
-
-    def get_resources_by_query(self, query, **kwargs):
+        version = kwargs.get("version")
+
+        with span("nexus.retrieve", cache_hit=True) as args:
+            if self._memory_cache is not None:
+                resource = self._memory_cache.get(resource_id, version=version)
+                if resource is not None:
+                    return resource
+
+            resource = None
+            if self._cache is not None:
+                resource = self._cache.get(resource_id, version=version)
+            if resource is None:
+                args["cache_hit"] = False
+                with use_shared_session():
+                    resource = self._forge.retrieve(resource_id, **kwargs)
+                if resource is not None and self._cache is not None:
+                    self._cache.put(resource_id, resource, version=version)
+
+        if resource is not None and self._memory_cache is not None:
+            self._memory_cache.put(resource_id, resource, version=version)
+        return resource
+
+    def get_resources_by_query(
+        self, query, skip_errors=False, retrieve=True, graph=False, **kwargs
+    ):
         """Query for resources and fetch them.
 
         Args:
             query (str): SparQL query string.
+            skip_errors (bool): See :py:meth:`get_resources_by_ids`.
+            retrieve (bool): If False, return the query results without retrieving each of them.
+            graph (bool): If True, the query is a CONSTRUCT or DESCRIBE query returning the
+                resources themselves, which are never retrieved (see :py:meth:`query_graph`).
             kwargs (dict): See KnowledgeGraphForge.sparql.
 
         Returns:
             list: An array of found (kgforge.core.Resource) resources.
         """
-        result = self.query(query, **kwargs)
-        # TODO: execute requests concurrently, or pass a list of ids if possible,
-        #  to avoid calling the nexus endpoint for each resource.
-        return [self.get_resource_by_id(r.id) for r in result]
-
-    def get_resources(self, resource_type, resource_filter=None, **kwargs):
+        result = self.query(query, graph=graph, **kwargs)
+        if graph or not retrieve:
+            return result
+        return self.get_resources_by_ids([r.id for r in result], skip_errors=skip_errors)
+
+    def get_resources(
+        self, resource_type, resource_filter=None, skip_errors=False, retrieve=True, **kwargs
+    ):
         """Search for resources and fetch them.
 
         Args:
             resource_type (str): Resource type (e.g., ``"DetailedCircuit"``).
             resource_filter (dict): Search filters to use.
-            kwargs (dict): See KnowledgeGraphForge.search.
+            skip_errors (bool): See :py:meth:`get_resources_by_ids`.
+            retrieve (bool): If False, return the search results without retrieving each of them.
+            kwargs (dict): See :py:meth:`search`.
 
         Returns:
             list: An array of found (kgforge.core.Resource) resources.
         """
         resource_filter = resource_filter or {}
-        kwargs["limit"] = kwargs.get("limit", 100)
+        kwargs["limit"] = kwargs.get("limit", DEFAULT_PAGE_SIZE)
         resources = self.search(resource_type, resource_filter, **kwargs)
+        if not retrieve:
+            return resources
+
+        return self.get_resources_by_ids([r.id for r in resources], skip_errors=skip_errors)
+
+    def _get_resources_page(
+        self,
+        resource_type,
+        resource_filter,
+        cursor,
+        *,
+        backend,
+        retrieve,
+        skip_errors,
+        offset=None,
+        **kwargs,
+    ):
+        """Return a tuple (number of search results, cursor of the next page, page of resources).
+
+        The cursor is the offset of the page, or the sort values of the last hit of the previous
+        page with the Elasticsearch backend, the first page of which skips `offset` resources.
+        """
+        # pylint: disable=too-many-arguments
+        if backend == "elastic":
+            size = kwargs.pop("limit")
+            resources, next_cursor = self._search_elastic_page(
+                resource_type, resource_filter, size, search_after=cursor, offset=offset, **kwargs
+            )
+        else:
+            resources = self.search(
+                resource_type, resource_filter, backend=backend, offset=cursor, **kwargs
+            )
+            resources = resources or []
+            next_cursor = cursor + kwargs["limit"]
+        count = len(resources)
+        if retrieve:
+            resources = self.get_resources_by_ids(
+                [r.id for r in resources], skip_errors=skip_errors
+            )
+        return count, next_cursor, resources
+
+    def iter_resources(
+        self,
+        resource_type,
+        resource_filter=None,
+        page_size=DEFAULT_PAGE_SIZE,
+        skip_errors=False,
+        retrieve=True,
+        **kwargs,
+    ):
+        """Search for resources page by page and yield them.
+
+        The next page is searched and fetched in the background while the current one is consumed.
+
+        Args:
+            resource_type (str): Resource type (e.g., ``"DetailedCircuit"``).
+            resource_filter (dict): Search filters to use.
+            page_size (int): Number of resources searched with each request.
+            skip_errors (bool): See :py:meth:`get_resources_by_ids`.
+            retrieve (bool): If False, yield the search results without retrieving each of them.
+            kwargs (dict): See :py:meth:`search`, ``offset`` being the number of resources skipped
+                before the first page.
+
+        Yields:
+            kgforge.core.Resource: The found resources.
+        """
+        resource_filter = resource_filter or {}
+        backend = _get_search_backend(kwargs.pop("backend", None) or self._search_backend)
+        offset = kwargs.pop("offset", None) or 0
+        kwargs["limit"] = page_size
+        fetch_page = partial(
+            self._get_resources_page,
+            resource_type,
+            resource_filter,
+            backend=backend,
+            retrieve=retrieve,
+            skip_errors=skip_errors,
+            **kwargs,
+        )
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            # the pages of the Elasticsearch backend are searched after the previous ones
+            if backend == "elastic":
+                future = executor.submit(fetch_page, None, offset=offset)
+            else:
+                future = executor.submit(fetch_page, offset)
+            while future is not None:
+                count, cursor, page = future.result()
+                # a partial page means that there are no more results
+                future = executor.submit(fetch_page, cursor) if count >= page_size else None
+                yield from page
+        finally:
+            if future is not None:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _try_get_resource_by_id(self, resource_id, **kwargs):
+        """Fetch a resource and return a tuple (resource, error) instead of raising."""
+        try:
+            resource = self.get_resource_by_id(resource_id, **kwargs)
+        except Exception as error:  # pylint: disable=broad-except
+            return None, error
+        if resource is None:
+            return None, BluepyEntityError(f"Resource {resource_id} could not be retrieved.")
+        return resource, None
+
+    def get_resources_by_ids(self, resource_ids, skip_errors=False, **kwargs):
+        """Fetch several resources concurrently.
+
+        The number of concurrent requests is bounded by ``max_workers``.
+        A failure does not abort the retrieval of the other resources.
+
+        Args:
+            resource_ids (list): IDs of Nexus resources.
+            skip_errors (bool): If True, the resources that could not be retrieved are logged and
+                omitted from the result instead of raising an error.
+            kwargs (dict): See KnowledgeGraphForge.retrieve.
+
+        Returns:
+            list: An array of (kgforge.core.Resource) resources, in the same order as the ids.
+
+        Raises:
+            RetrievalError: If any resource could not be retrieved and ``skip_errors`` is False.
+        """
+        resource_ids = list(resource_ids)
+        max_workers = min(self._max_workers, len(resource_ids))
+
+        if max_workers <= 1:
+            results = [self._try_get_resource_by_id(id_, **kwargs) for id_ in resource_ids]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self._try_get_resource_by_id, id_, **kwargs)
+                    for id_ in resource_ids
+                ]
+                results = [future.result() for future in futures]
+
+        errors = {}
+        for resource_id, (_, error) in zip(resource_ids, results):
+            if error is not None:
+                L.warning("Unable to retrieve %s: %s", resource_id, error)
+                errors[resource_id] = error
+
+        resources = [resource for resource, _ in results]
+        if not errors:
+            return resources
+        if skip_errors:
+            return [resource for resource in resources if resource is not None]
+        raise RetrievalError(errors, resources)
+
+    def prefetch_links(self, resources, paths, skip_errors=True, **kwargs):
+        """Retrieve the resources linked from `resources` by the paths of attributes.
+
+        The paths are resolved breadth-first: the links of each level are deduplicated and
+        retrieved concurrently, as with :py:meth:`get_resources_by_ids`, before following the
+        next level. A resource is retrieved when one of the attributes of the path is missing
+        from it, as when traversing the attributes of a
+        :py:class:`~bluepyentity.nexus.entity.ResolvingResource`, and at the end of each path.
+        The retrieved resources are kept in the caches of the connector.
+
+        Args:
+            resources (list): Resources from which the paths are followed.
+            paths (list): Paths of attributes separated by dots, for example
+                ``"brainLocation.brainRegion"``.
+            skip_errors (bool): If False, raise an error if any resource could not be retrieved.
+            kwargs (dict): See KnowledgeGraphForge.retrieve.
+
+        Returns:
+            dict: The retrieved resources, indexed by id.
+
+        Raises:
+            RetrievalError: If any resource could not be retrieved and ``skip_errors`` is False.
+        """
+        paths = [tuple(path.split(".")) for path in always_iterable(paths)]
+        # resources with the attributes left to follow from them
+        stack = [(resource, path) for resource in resources for path in paths]
+        retrieved = {}
+
+        with span("nexus.prefetch", paths=len(paths)) as args:
+            level = 0
+            while stack:
+                pending = self._follow_links(stack, retrieved)
+                if not pending:
+                    break
+                level += 1
+                L.debug("Prefetching %d resources at level %d", len(pending), level)
+                ids = list(pending)
+                for resource_id, resource in zip(ids, self._prefetch(ids, skip_errors, **kwargs)):
+                    retrieved[resource_id] = resource
+                    if resource is not None:
+                        stack.extend((resource, path) for path in pending[resource_id] if path)
+            args["results"] = sum(resource is not None for resource in retrieved.values())
+            args["levels"] = level
+
+        return {id_: resource for id_, resource in retrieved.items() if resource is not None}
+
+    @staticmethod
+    def _follow_links(stack, retrieved):
+        """Follow the attributes of the resources in `stack` until they need to be retrieved.
+
+        An empty path means that the resource is the end of a path, to be retrieved.
 
-        return [self.get_resource_by_id(r.id) for r in resources]
+        Returns:
+            dict: The ids of the resources to retrieve, with the paths to follow from them.
+        """
+        pending = {}
+        while stack:
+            resource, path = stack.pop()
+            if path:
+                value = getattr(resource, path[0], None)
+                if value is not None:
+                    for item in always_iterable(value):
+                        # the distributions are not linked resources
+                        if isinstance(item, Resource) and getattr(item, "type", None) != (
+                            "DataDownload"
+                        ):
+                            stack.append((item, path[1:]))
+                    continue
+
+            resource_id = getattr(resource, "id", None)
+            if resource_id is None or retrieved.get(resource_id, resource) is None:
+                # an embedded resource, or a failed retrieval
+                continue
+            if resource_id in retrieved:
+                if path and retrieved[resource_id] is not resource:
+                    stack.append((retrieved[resource_id], path))
+                continue
+            pending.setdefault(resource_id, set()).add(path)
+        return pending
+
+    def _prefetch(self, resource_ids, skip_errors, **kwargs):
+        """Retrieve the resources, returning None for the failures if `skip_errors` is True."""
+        try:
+            return self.get_resources_by_ids(resource_ids, **kwargs)
+        except RetrievalError as error:
+            if not skip_errors:
+                raise
+            return error.resources
 
     def download_resource(self, resource, path):
         """Download a resource.
 
+        The download is skipped if the file already exists with the expected size and checksum
+        (see :py:func:`~bluepyentity.download.download_distribution`).
+
         Args:
             resource (kgforge.core.Resource): A downloadable resource.
             path (str): The path to the directory into which the data is downloaded.
+
+        Returns:
+            Path: The path of the downloaded file.
         """
-        file_path = Path(path, resource.name)
-        if file_path.is_file():
-            L.warning("File %s already exists, not downloading...", file_path)
-            return
         if resource.type == "DataDownload" and hasattr(resource, "contentUrl"):
-            self._forge.download(resource, "contentUrl", path)
-        else:
-            raise RuntimeError(f"resource {resource.type} can not be downloaded.")
+            return download_distribution(self._forge, resource, path)
+        raise RuntimeError(f"resource {resource.type} can not be downloaded.")
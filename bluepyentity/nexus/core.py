@@ -17,19 +17,70 @@
 
 """Nexus-forge API integration."""
 import logging
+import weakref
 
-from bluepyentity.environments import create_forge
-from bluepyentity.nexus.connector import NexusConnector
+from bluepyentity.environments import create_forge, get_environment_config
+from bluepyentity.exceptions import BluepyEntityError
+from bluepyentity.instrumentation import get_recorder
+from bluepyentity.nexus.cache import DEFAULT_MAXSIZE, LRUResourceCache
+from bluepyentity.nexus.connector import DEFAULT_PAGE_SIZE, NexusConnector
+from bluepyentity.nexus.entity import Entity
 from bluepyentity.nexus.factory import EntityFactory
-from bluepyentity.token import get_token
+from bluepyentity.token import TokenRefresher, get_token
 
 L = logging.getLogger(__name__)
 
+# Retrieval strategies of the search results, mapped to the tuple (retrieve, synchronized):
+#   none: the entities are backed by the search results only,
+#   lazy: the entities are retrieved only when accessing an attribute missing from the results,
+#   eager: the entities are retrieved immediately.
+FETCH_MODES = {
+    "none": (False, True),
+    "lazy": (False, False),
+    "eager": (True, True),
+}
+
+
+def _get_fetch_mode(fetch):
+    """Return the tuple (retrieve, synchronized) corresponding to the fetch mode."""
+    if fetch not in FETCH_MODES:
+        raise BluepyEntityError(f"Invalid fetch mode {fetch!r}, supported: {list(FETCH_MODES)}")
+    return FETCH_MODES[fetch]
+
+
+def _token_setter(connector):
+    """Return a callback setting the token of the connector, while it's alive.
+
+    The connector is weakly referenced, so that the refresh stops when the helper is deleted.
+    """
+    connector_ref = weakref.ref(connector)
+
+    def _set_token(token):
+        connector = connector_ref()
+        if connector is None:
+            return False
+        connector.set_token(token)
+        return True
+
+    return _set_token
+
 
 class NexusHelper:
     """The "main" class for the nexus-forge integration."""
 
-    def __init__(self, bucket, token=None, nexus_environment="prod", debug=False):
+    def __init__(
+        self,
+        bucket,
+        token=None,
+        nexus_environment="prod",
+        debug=False,
+        *,
+        max_workers=None,
+        cache=None,
+        memory_cache_size=DEFAULT_MAXSIZE,
+        refresh_token=True,
+        search_backend="sparql",
+    ):
         """Instantiate a new NexusHelper class.
 
         Args:
@@ -37,17 +88,75 @@ class NexusHelper:
             token (str): A base64 encoded Nexus access token.
             nexus_environment (str): Which nexus environment to use ("prod", "staging").
             debug (bool): A flag that enables more verbose output.
+            max_workers (int): Maximum number of concurrent requests when fetching several
+                resources. Defaults to the ``max_connection`` of the environment store config.
+            cache (ResourceCache): Optional persistent cache of the retrieved resources
+                (see :py:class:`~bluepyentity.nexus.cache.ResourceCache`).
+            memory_cache_size (int): Maximum number of retrieved resources kept in memory and
+                shared by all the entities of the helper. If 0, the in-memory cache is disabled.
+            refresh_token (bool): If True and no `token` is given, the token is refreshed in a
+                background thread before it expires, with the same providers as
+                :py:func:`~bluepyentity.token.get_token`. A given `token` is never replaced.
+            search_backend (str): Default backend of the searches, ``"sparql"`` or ``"elastic"``
+                (see :py:meth:`~bluepyentity.nexus.connector.NexusConnector.search`).
         """
+        # pylint: disable=too-many-arguments
+        # only the tokens resolved with the providers are refreshed with them
+        refresh_token = refresh_token and not token
         token = token or get_token(nexus_environment)
+        if max_workers is None:
+            store_config = get_environment_config(nexus_environment)["Store"]
+            max_workers = store_config.get("max_connection")
         self._forge = create_forge(nexus_environment, token, bucket, debug=debug)
-        self._connector = NexusConnector(forge=self._forge, debug=debug)
+        self._connector = NexusConnector(
+            forge=self._forge,
+            debug=debug,
+            max_workers=max_workers,
+            cache=cache,
+            memory_cache=LRUResourceCache(memory_cache_size) if memory_cache_size else None,
+            search_backend=search_backend,
+        )
         self._factory = EntityFactory(helper=self, connector=self._connector)
+        self._token_refresher = (
+            TokenRefresher(nexus_environment, token, _token_setter(self._connector))
+            if refresh_token
+            else None
+        )
+
+    def close(self):
+        """Stop refreshing the token in the background."""
+        if self._token_refresher is not None:
+            self._token_refresher.stop()
 
     @property
     def factory(self):
         """:py:class:`~bluepyentity.nexus.factory.EntityFactory` instance creating the entities."""
         return self._factory
 
+    def cache_info(self):
+        """Return the statistics of the in-memory cache of the retrieved resources.
+
+        Returns:
+            CacheInfo: Named tuple with hits, misses, evictions, maxsize and currsize,
+            or None if the in-memory cache is disabled.
+        """
+        memory_cache = self._connector.memory_cache
+        return memory_cache.info() if memory_cache is not None else None
+
+    def stats(self):
+        """Return the timing statistics of the calls to Nexus made by the process.
+
+        The calls are grouped by name: ``nexus.search``, ``nexus.query``, ``nexus.retrieve``,
+        ``nexus.prefetch``, ``download.file``, ``forge.create``, ``http.request``, ``http.retry``
+        and ``retry``.
+
+        Returns:
+            dict: Dictionary indexed by call name, with the ``count``, the ``total``, ``p50``,
+            ``p95`` and ``max`` durations in seconds, and the sums of the ``bytes``,
+            ``cache_hit`` and ``results`` of the calls that have them.
+        """
+        return get_recorder().stats()
+
     def get_entity_by_id(self, resource_id, tool=None, **kwargs):
         """Retrieve and return a single entity based on the id.
 
@@ -61,24 +170,41 @@ class NexusHelper:
             Entity: Desired resource wrapped as an entity.
         """
         resource = self._connector.get_resource_by_id(resource_id, tool=tool, **kwargs)
-        return self._factory.open(resource, tool=tool)
+        return self._factory.open(resource, tool=tool, synchronized=True)
 
-    def get_entities_by_query(self, query, tool=None, **kwargs):
+    def get_entities_by_query(self, query, tool=None, fetch="eager", graph=False, **kwargs):
         """Retrieve and return a list of entities based on a SPARQL query.
 
         Args:
             query (str): Query string to be passed to KnowledgeGraphForge.sparql
             tool (str): Name of the tool to open the resource with, or None to use the default tool
                         (see :py:class:`~bluepyentity.nexus.factory.EntityFactory.open`).
-            kwargs (dict): See KnowledgeGraphForge.sparql.
+            fetch (str): How the query results are retrieved: ``"eager"`` retrieves all of them,
+                ``"lazy"`` retrieves each one only when accessing a missing attribute, and
+                ``"none"`` never retrieves them.
+            graph (bool): If True, the query is a CONSTRUCT or DESCRIBE query returning the
+                resources in a single request, which are not retrieved unless ``fetch`` is
+                ``"lazy"`` (see
+                :py:meth:`~bluepyentity.nexus.connector.NexusConnector.query_graph`).
+            kwargs (dict): See KnowledgeGraphForge.sparql, or ``NexusConnector.query_graph``.
 
         Returns:
             list: An array of found entities (py:class:~bluepyentity.nexus.entity.Entity`).
+
+        Examples:
+            >>> helper.get_entities_by_query(
+            ...     "CONSTRUCT { ?id ?p ?o } WHERE { ?id a DetailedCircuit ; ?p ?o }", graph=True)
         """
-        resources = self._connector.get_resources_by_query(query, tool=tool, **kwargs)
-        return [self._factory.open(r, tool=tool) for r in resources]
+        retrieve, synchronized = _get_fetch_mode(fetch)
+        if graph:
+            resources = self._connector.get_resources_by_query(query, graph=True, **kwargs)
+        else:
+            resources = self._connector.get_resources_by_query(
+                query, retrieve=retrieve, tool=tool, **kwargs
+            )
+        return [self._factory.open(r, tool=tool, synchronized=synchronized) for r in resources]
 
-    def get_entities(self, type_, filters=None, tool=None, **kwargs):
+    def get_entities(self, type_, filters=None, tool=None, fetch="eager", **kwargs):
         """Retrieve and return a list of entities based on the resource type and a filter.
 
         Args:
@@ -86,7 +212,10 @@ class NexusHelper:
             filters (dict): Search filters to use.
             tool (str): Name of the tool to open the resource with, or None to use the default tool
                         (see :py:class:`~bluepyentity.nexus.factory.EntityFactory.open`).
-            kwargs (dict): See KnowledgeGraphForge.search.
+            fetch (str): How the search results are retrieved: ``"eager"`` retrieves all of them,
+                ``"lazy"`` retrieves each one only when accessing a missing attribute, and
+                ``"none"`` never retrieves them.
+            kwargs (dict): See :py:meth:`~bluepyentity.nexus.connector.NexusConnector.search`.
 
         Returns:
             list: An array of found (kgforge.core.Resource) resources.
@@ -97,9 +226,79 @@ class NexusHelper:
             ...     {"brainLocation": {"brainRegion": {"label": "Thalamus"}}},
             ...     tool="snap",
             ...     limit=10)
+            >>> helper.get_entities(
+            ...     "NeuronMorphology",
+            ...     fetch="lazy",
+            ...     backend="elastic",
+            ...     includes=["@id", "@type", "name", "_rev", "_project"],
+            ...     limit=None)
+        """
+        retrieve, synchronized = _get_fetch_mode(fetch)
+        resources = self._connector.get_resources(
+            type_, resource_filter=filters, retrieve=retrieve, **kwargs
+        )
+        return [self._factory.open(r, tool=tool, synchronized=synchronized) for r in resources]
+
+    def iter_entities(
+        self, type_, filters=None, tool=None, fetch="eager", page_size=DEFAULT_PAGE_SIZE, **kwargs
+    ):
+        """Search entities page by page and yield them.
+
+        Unlike :py:meth:`get_entities`, the number of results is not limited, and only a page of
+        results is held in memory. The next page is fetched in the background.
+
+        Args:
+            type_ (str): Resource type (e.g., ``"DetailedCircuit"``).
+            filters (dict): Search filters to use.
+            tool (str): Name of the tool to open the resource with, or None to use the default tool
+                        (see :py:class:`~bluepyentity.nexus.factory.EntityFactory.open`).
+            fetch (str): How the search results are retrieved (see :py:meth:`get_entities`).
+            page_size (int): Number of resources searched with each request.
+            kwargs (dict): See :py:meth:`~bluepyentity.nexus.connector.NexusConnector.search`.
+
+        Yields:
+            Entity: The found entities.
+
+        Examples:
+            >>> for entity in helper.iter_entities("NeuronMorphology", fetch="lazy"):
+            ...     print(entity.name)
+        """
+        retrieve, synchronized = _get_fetch_mode(fetch)
+        resources = self._connector.iter_resources(
+            type_, resource_filter=filters, page_size=page_size, retrieve=retrieve, **kwargs
+        )
+        for resource in resources:
+            yield self._factory.open(resource, tool=tool, synchronized=synchronized)
+
+    def prefetch(self, entities, paths, skip_errors=True, **kwargs):
+        """Retrieve the resources linked from the entities by the paths of attributes.
+
+        Traversing ``entity.circuitBase.atlasRelease`` retrieves one resource per attribute,
+        discovered only when it's accessed. The links of the paths are instead resolved
+        breadth-first for all the entities, retrieving the resources of each level concurrently
+        (see :py:meth:`~bluepyentity.nexus.connector.NexusConnector.prefetch_links`). They are
+        kept in the in-memory cache, from which they are served when traversing the attributes.
+
+        Args:
+            entities (Entity, list): Entity or list of entities.
+            paths (str, list): Path or list of paths of attributes separated by dots.
+            skip_errors (bool): If False, raise an error if any resource could not be retrieved.
+            kwargs (dict): See KnowledgeGraphForge.retrieve.
+
+        Returns:
+            dict: The retrieved resources, indexed by id.
+
+        Examples:
+            >>> circuits = helper.get_entities("DetailedCircuit", fetch="lazy")
+            >>> helper.prefetch(circuits, ["atlasRelease", "brainLocation.brainRegion"])
         """
-        resources = self._connector.get_resources(type_, resource_filter=filters, **kwargs)
-        return [self._factory.open(r, tool=tool) for r in resources]
+        if self._connector.memory_cache is None:
+            L.warning("The prefetched resources are not kept, the in-memory cache is disabled")
+        if isinstance(entities, Entity):
+            entities = [entities]
+        return self._connector.prefetch_links(
+            [entity.resource for entity in entities], paths, skip_errors=skip_errors, **kwargs
+        )
 
     def as_dataframe(self, data, store_metadata=True, **kwargs):
         """Return a pandas dataframe representing the list of entities.
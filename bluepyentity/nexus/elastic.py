@@ -0,0 +1,112 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""Elasticsearch queries built from the search filters, and conversion of their hits."""
+import re
+
+# Sort of the hits, unique to page through them with ``search_after``.
+SORT = [{"_createdAt": "asc"}, {"@id": "asc"}]
+
+# Datatype of the typed values of the search filters (e.g. ``"...^^xsd:dateTime"``), not indexed.
+_DATATYPE = re.compile(r"\^\^\S+$")
+
+# Names of the search filters of the JSON-LD keywords.
+_KEYWORDS = {"id": "@id", "type": "@type"}
+
+
+def _field(path):
+    """Return the name of the field of the path of keys of the search filters."""
+    return ".".join(_KEYWORDS.get(key, key) for key in path)
+
+
+def _is_exact(path):
+    """Return True if the field is indexed as a keyword, without a keyword sub-field.
+
+    The JSON-LD keywords and the Nexus metadata are keywords in the Nexus mappings, the other
+    string fields are indexed as text with a keyword sub-field by the dynamic mappings.
+    """
+    return path[-1] in _KEYWORDS or path[-1].startswith(("@", "_"))
+
+
+def _term(path, value, keyword_field, context):
+    """Return the term query of the value of the field, or of any of the values if a list."""
+    values = list(value) if isinstance(value, list) else [value]
+    if path[-1] == "type" and context is not None:
+        # the types are indexed compacted or expanded, depending on the view
+        values += [iri for iri in map(context.expand, values) if iri not in values]
+    values = [_DATATYPE.sub("", v) if isinstance(v, str) else v for v in values]
+
+    field = _field(path)
+    if keyword_field and not _is_exact(path) and any(isinstance(v, str) for v in values):
+        field = f"{field}.{keyword_field}"
+    if len(values) == 1:
+        return {"term": {field: values[0]}}
+    return {"terms": {field: values}}
+
+
+def _clauses(filters, keyword_field, context, prefix=()):
+    """Yield the term queries of the search filters, the nested dicts being paths of keys."""
+    for key, value in filters.items():
+        path = prefix + tuple(key.split("/"))
+        if isinstance(value, dict):
+            yield from _clauses(value, keyword_field, context, path)
+        else:
+            yield _term(path, value, keyword_field, context)
+
+
+def build_query(
+    search_filters,
+    size,
+    *,
+    keyword_field=None,
+    context=None,
+    includes=None,
+    excludes=None,
+    search_after=None,
+    offset=None,
+):
+    """Build the Elasticsearch query of the search filters.
+
+    Args:
+        search_filters (dict): Search filters, as built by ``_build_search_filters``.
+        size (int): Number of hits returned.
+        keyword_field (str): Name of the keyword sub-field of the string fields, if any.
+        context (kgforge.core.commons.Context): Context expanding the types, if any.
+        includes (list): Fields of the documents returned, all of them if None.
+        excludes (list): Fields of the documents not returned.
+        search_after (list): Sort values of the last hit of the previous page.
+        offset (int): Number of hits skipped, only on the first page.
+
+    Returns:
+        dict: The query.
+    """
+    query = {
+        "query": {"bool": {"filter": list(_clauses(search_filters, keyword_field, context))}},
+        "size": size,
+        "sort": SORT,
+        "track_total_hits": False,
+    }
+    source = {}
+    if includes:
+        source["includes"] = list(includes)
+    if excludes:
+        source["excludes"] = list(excludes)
+    if source:
+        query["_source"] = source
+    if search_after is not None:
+        query["search_after"] = search_after
+    elif offset:
+        query["from"] = offset
+    return query
+
+
+def hits_to_resources(hits, store):
+    """Convert the hits of an Elasticsearch query to resources.
+
+    Args:
+        hits (list): Hits of the response, with their ``_source``.
+        store (kgforge.core.archetypes.Store): Nexus store of the forge.
+
+    Returns:
+        list: kgforge.core.Resource instances.
+    """
+    return [store.service.to_resource(hit["_source"], True, id=hit.get("_id")) for hit in hits]
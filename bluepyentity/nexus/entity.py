@@ -16,7 +16,7 @@ _ATTR_FETCHED = "_resource_updated_from_nexus"
 class ResolvingResource:
     """Class implementing traversing the resources attributes."""
 
-    def __init__(self, resource, retriever=None):
+    def __init__(self, resource, retriever=None, synchronized=False):
         """Instantiate a new wrapper class.
 
         Wraps kgforge Resource object and provides easier access (traversing) to linked objects
@@ -25,10 +25,12 @@ class ResolvingResource:
         Args:
             resource (kgforge.core.Resource): The wrapped resource.
             retriever (callable): A function implementing the communication with Nexus.
+            synchronized (bool): True if the resource has already been retrieved from Nexus,
+                so that it's never retrieved again.
         """
         self._wrapped = resource
         self._retriever = retriever
-        setattr(self, _ATTR_FETCHED, False)
+        setattr(self, _ATTR_FETCHED, synchronized)
 
     @property
     def wrapped(self):
@@ -91,7 +93,9 @@ class ResolvingResource:
 class Entity:
     """Implements the instantiation and downloading of a resource."""
 
-    def __init__(self, resource: Resource, helper=None, connector=None, opener=None):
+    def __init__(
+        self, resource: Resource, helper=None, connector=None, opener=None, synchronized=False
+    ):
         """Instantiate a new entity.
 
         Args:
@@ -99,6 +103,8 @@ class Entity:
             helper (NexusHelper): NexusHelper instance.
             connector (NexusConnector): Connector instance.
             opener (callable): A function used to open the instance associated to the resource.
+            synchronized (bool): True if the resource doesn't need to be retrieved from Nexus
+                when accessing a missing attribute.
         """
         if connector is None:
             retriever = downloader = None
@@ -108,7 +114,9 @@ class Entity:
 
         self._helper = helper
         self._connector = connector
-        self._resolving_resource = ResolvingResource(resource, retriever=retriever)
+        self._resolving_resource = ResolvingResource(
+            resource, retriever=retriever, synchronized=synchronized
+        )
         self._instance = Proxy(partial(opener, self)) if opener else None
         self._downloader = downloader
 
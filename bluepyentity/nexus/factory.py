@@ -85,12 +85,13 @@ class EntityFactory:
         """
         return list(self._function_registry.get(resource_type, {}))
 
-    def open(self, resource: Resource, tool=None):
+    def open(self, resource: Resource, tool=None, synchronized=False):
         """Open the resource and return an entity (resource, proxy).
 
         Args:
             resource (kgforge.core.Resource): The resource to be opened.
             tool (str): Name of the tool to open the resource with, or None to use the default tool.
+            synchronized (bool): True if the resource has already been retrieved from Nexus.
 
         Returns:
             Entity: An entity binding the resource and the opener.
@@ -100,6 +101,7 @@ class EntityFactory:
             helper=self._helper,
             connector=self._connector,
             opener=partial(self._open_entity, tool=tool),
+            synchronized=synchronized,
         )
 
     def _open_entity(self, entity, tool=None):
@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: Apache-2.0
+
+"""Conversion of the RDF graphs returned by the CONSTRUCT and DESCRIBE queries to resources."""
+import json
+import logging
+
+from kgforge.core.conversions.rdf import _remove_ld_keys
+from pyld import jsonld
+from rdflib import BNode, Graph, Literal, URIRef
+
+from bluepyentity.exceptions import BluepyEntityError
+
+L = logging.getLogger(__name__)
+
+# Media type requested for the graphs.
+ACCEPT = "application/n-triples"
+# rdflib formats of the media types of the graphs.
+FORMATS = {
+    "application/n-triples": "nt",
+    "text/plain": "nt",
+    "text/turtle": "turtle",
+    "application/rdf+xml": "xml",
+    "application/ld+json": "json-ld",
+}
+# Media type of the results of the SELECT queries, used for the graphs by some Nexus versions.
+SPARQL_RESULTS = "application/sparql-results+json"
+
+BLANK_NODE_PREFIX = "_:"
+
+
+def _term(binding):
+    """Return the rdflib term of a binding of the SPARQL JSON results."""
+    if binding["type"] == "uri":
+        return URIRef(binding["value"])
+    if binding["type"] == "bnode":
+        return BNode(binding["value"])
+    return Literal(binding["value"], datatype=binding.get("datatype"), lang=binding.get("xml:lang"))
+
+
+def parse_graph(content, content_type):
+    """Parse the graph returned by a CONSTRUCT or DESCRIBE query.
+
+    Args:
+        content (bytes): Content of the response.
+        content_type (str): Media type of the response.
+
+    Returns:
+        rdflib.Graph: The graph.
+    """
+    media_type = (content_type or ACCEPT).split(";", 1)[0].strip().lower()
+    graph = Graph()
+    if media_type in (SPARQL_RESULTS, "application/json"):
+        # one binding of subject, predicate and object by triple
+        for binding in json.loads(content)["results"]["bindings"]:
+            graph.add(
+                (
+                    _term(binding["subject"]),
+                    _term(binding["predicate"]),
+                    _term(binding["object"]),
+                )
+            )
+        return graph
+    if media_type not in FORMATS:
+        raise BluepyEntityError(f"Unsupported media type of the graph: {content_type}")
+    return graph.parse(data=content, format=FORMATS[media_type])
+
+
+def _embed(value, nodes, seen):
+    """Replace the references to the blank nodes in `value` by the nodes themselves."""
+    if isinstance(value, list):
+        return [_embed(item, nodes, seen) for item in value]
+    if not isinstance(value, dict):
+        return value
+    id_ = value.get("@id", "")
+    if len(value) == 1 and id_.startswith(BLANK_NODE_PREFIX) and id_ in nodes:
+        if id_ in seen:
+            # a cycle of blank nodes, kept as a reference
+            return value
+        value = {k: v for k, v in nodes[id_].items() if k != "@id"}
+        seen = seen | {id_}
+    return {k: _embed(v, nodes, seen) for k, v in value.items()}
+
+
+def frame_graph(graph):
+    """Return the nodes of the graph identified by an IRI, with their blank nodes embedded.
+
+    Returns:
+        list: Nodes in expanded JSON-LD, sorted by id.
+    """
+    nodes = json.loads(graph.serialize(format="json-ld"))
+    by_id = {node["@id"]: node for node in nodes}
+    roots = sorted(
+        (node for node in nodes if not node["@id"].startswith(BLANK_NODE_PREFIX)),
+        key=lambda node: node["@id"],
+    )
+    return [_embed(node, by_id, frozenset()) for node in roots]
+
+
+def graph_to_resources(graph, store):
+    """Convert the graph returned by a query to resources, framed client-side.
+
+    Each subject identified by an IRI is a resource, with its blank nodes embedded, and its
+    links to the other resources as references. The graph is compacted at once with the context
+    of the store, and its Nexus metadata (``_rev``, ``_project``...) are set as store metadata.
+
+    Args:
+        graph (rdflib.Graph): The graph.
+        store (kgforge.core.archetypes.Store): Nexus store of the forge.
+
+    Returns:
+        list: kgforge.core.Resource instances, sorted by id.
+    """
+    roots = frame_graph(graph)
+    if not roots:
+        return []
+
+    context = store.model_context or store.context
+    metadata_context = store.service.metadata_context
+    document = {"@context": [context.document["@context"], metadata_context.document["@context"]]}
+    compacted = jsonld.compact(roots, document)
+    nodes = compacted.get("@graph", [compacted])
+    metadata_keys = set(metadata_context.terms)
+
+    resources = []
+    for node in nodes:
+        node.pop("@context", None)
+        data = {k: v for k, v in node.items() if k not in metadata_keys}
+        resource = _remove_ld_keys(data, context)
+        resource.context = context.iri if context.is_http_iri() else context.document["@context"]
+        store.service.sync_metadata(resource, node)
+        resources.append(resource)
+    L.debug("Framed %d resources from %d triples", len(resources), len(graph))
+    return resources
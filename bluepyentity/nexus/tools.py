@@ -19,21 +19,6 @@ from bluepyentity.nexus.entity import DOWNLOADED_CONTENT_PATH
 
 L = logging.getLogger(__name__)
 
-try:
-    from bluepyopt import ephys
-except ImportError:
-    L.warning("Need to have bluepyopt installed")
-
-try:
-    from bluepyemodel.model.model import (
-        define_distributions,
-        define_mechanisms,
-        define_morphology,
-        define_parameters,
-    )
-except ImportError:
-    L.warning("Need to have bluepyemodel installed")
-
 
 def _get_path(p):
     return Path(p.replace("file://", ""))
@@ -392,6 +377,15 @@ class EModelConfiguration:  # pragma: no cover
         Returns:
             bluepyopt.ephys.models.CellModel: Cell model
         """
+        # pylint: disable=import-error
+        from bluepyemodel.model.model import (
+            define_distributions,
+            define_mechanisms,
+            define_morphology,
+            define_parameters,
+        )
+        from bluepyopt import ephys
+
         self._compile_mod_file()
         morphology = define_morphology(self._morphology)
         mechanisms = define_mechanisms(self._mechanisms, None)
@@ -0,0 +1,159 @@
+# SPDX-License-Identifier: Apache-2.0
+"""token bucket rate limiters of the requests sent to Nexus"""
+import fcntl
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from bluepyentity.instrumentation import span
+from bluepyentity.retry import CircuitBreakerAdapter, _PolicyRetry
+
+L = logging.getLogger(__name__)
+
+# Maximum number of requests per second sent by each process, unlimited if unset or 0.
+ENV_RATE_LIMIT = "BLUEPYENTITY_RATE_LIMIT"
+# Maximum number of requests per second sent by all the processes of the node sharing the
+# lock file, unlimited if unset or 0.
+ENV_NODE_RATE_LIMIT = "BLUEPYENTITY_NODE_RATE_LIMIT"
+# Number of requests that can be sent at once after an idle period, defaults to the rate.
+ENV_RATE_BURST = "BLUEPYENTITY_RATE_BURST"
+# Path of the lock file shared by the processes, it must be on a local filesystem of the node.
+ENV_RATE_LIMIT_FILE = "BLUEPYENTITY_RATE_LIMIT_FILE"
+
+# content of the lock file: number of tokens available, and time of the last update
+_STATE = struct.Struct("dd")
+
+
+def get_rate_limit_file():
+    """Return the path of the lock file shared by the processes of the user on the node."""
+    default = Path(tempfile.gettempdir()) / f"bluepyentity-ratelimit-{os.getuid()}"
+    return Path(os.environ.get(ENV_RATE_LIMIT_FILE) or default)
+
+
+class RateLimiter:
+    """Token bucket limiting the rate of the requests of the process.
+
+    The bucket holds up to `burst` tokens, refilled at `rate` tokens per second, and each request
+    takes one token. When the bucket is empty, the request waits until a token is refilled.
+    """
+
+    def __init__(self, rate, burst=None):
+        """Instantiate a new RateLimiter.
+
+        Args:
+            rate (float): Maximum number of requests per second.
+            burst (float): Number of requests that can be sent at once, defaults to `rate`.
+        """
+        if rate <= 0:
+            raise ValueError(f"The rate must be positive, got {rate}")
+        self.rate = rate
+        self.burst = max(1.0, burst or rate)
+        self._lock = threading.Lock()
+        self._available = self.burst
+        self._updated = time.monotonic()
+
+    def _take(self, available, updated, now, tokens):
+        """Return the tuple (tokens available after taking `tokens`, time to wait for them)."""
+        available = min(self.burst, available + (now - updated) * self.rate) - tokens
+        return available, max(0.0, -available / self.rate)
+
+    def _reserve(self, tokens):
+        """Take the tokens, and return the time to wait before they are available."""
+        with self._lock:
+            now = time.monotonic()
+            self._available, wait = self._take(self._available, self._updated, now, tokens)
+            self._updated = now
+        return wait
+
+    def acquire(self, tokens=1):
+        """Wait until the tokens are available, and return the time waited in seconds."""
+        wait = self._reserve(tokens)
+        if wait:
+            L.debug("Rate limited, waiting %.3f s", wait)
+            time.sleep(wait)
+        return wait
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket shared by the processes of the node, stored in a lock file.
+
+    Each process reserves its tokens while holding an exclusive lock on the file, so that the
+    aggregate rate of the processes stays under `rate`, and waits without holding the lock.
+    """
+
+    def __init__(self, rate, burst=None, path=None):
+        """Instantiate a new SharedRateLimiter.
+
+        Args:
+            rate (float): Maximum number of requests per second of all the processes.
+            burst (float): Number of requests that can be sent at once, defaults to `rate`.
+            path (str): Path of the lock file, defaults to `get_rate_limit_file`.
+        """
+        super().__init__(rate, burst)
+        self.path = Path(path) if path else get_rate_limit_file()
+
+    def _reserve(self, tokens):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # the time is compared between processes, the monotonic clock may not be shared
+            now = time.time()
+            data = os.pread(fd, _STATE.size, 0)
+            available, updated = (
+                _STATE.unpack(data) if len(data) == _STATE.size else (self.burst, now)
+            )
+            available, wait = self._take(available, min(updated, now), now, tokens)
+            os.pwrite(fd, _STATE.pack(available, now), 0)
+        finally:
+            os.close(fd)
+        return wait
+
+
+def get_rate_limiters():
+    """Return the rate limiters configured with the environment variables."""
+    burst = float(os.environ.get(ENV_RATE_BURST) or 0) or None
+    limiters = []
+    rate = float(os.environ.get(ENV_RATE_LIMIT) or 0)
+    if rate:
+        limiters.append(RateLimiter(rate, burst))
+    node_rate = float(os.environ.get(ENV_NODE_RATE_LIMIT) or 0)
+    if node_rate:
+        limiters.append(SharedRateLimiter(node_rate, burst))
+    return tuple(limiters)
+
+
+class RateLimitedAdapter(CircuitBreakerAdapter):
+    """HTTPAdapter waiting for a token of each rate limiter before sending a request.
+
+    A token is also taken before each retry of urllib3, the retries being sent when the server
+    asks the clients to slow down.
+    """
+
+    def __init__(self, *args, rate_limiters=(), **kwargs):
+        """Instantiate a new RateLimitedAdapter, taking the tokens of the `rate_limiters`."""
+        super().__init__(*args, **kwargs)
+        self.rate_limiters = tuple(rate_limiters)
+        if self.rate_limiters and isinstance(self.max_retries, _PolicyRetry):
+            self.max_retries = self.max_retries.new(on_retry=self.acquire)
+
+    def acquire(self):
+        """Wait until a token of each rate limiter is available."""
+        if not self.rate_limiters:
+            return
+        with span("ratelimit.wait"):
+            for limiter in self.rate_limiters:
+                limiter.acquire()
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Send the request once a token of each rate limiter is available."""
+        self.acquire()
+        host = urlsplit(request.url).netloc
+        with span("http.request", method=request.method, host=host) as span_args:
+            response = super().send(request, *args, **kwargs)
+            span_args["status"] = response.status_code
+        return response
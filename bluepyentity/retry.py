@@ -0,0 +1,288 @@
+# SPDX-License-Identifier: Apache-2.0
+"""retry policy and circuit breaker of the requests sent to Nexus"""
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+
+from bluepyentity.exceptions import BluepyEntityError
+from bluepyentity.instrumentation import get_recorder
+
+L = logging.getLogger(__name__)
+
+# Maximum number of retries of a request failing to connect or with RETRY_STATUSES.
+ENV_RETRIES = "BLUEPYENTITY_HTTP_RETRIES"
+DEFAULT_RETRIES = 3
+# Backoff factor in seconds between the retries, doubled after each retry.
+ENV_BACKOFF_FACTOR = "BLUEPYENTITY_HTTP_BACKOFF_FACTOR"
+DEFAULT_BACKOFF_FACTOR = 0.5
+# Maximum backoff in seconds between two retries.
+ENV_MAX_BACKOFF = "BLUEPYENTITY_HTTP_MAX_BACKOFF"
+DEFAULT_MAX_BACKOFF = 30.0
+# Number of consecutive failures of a host after which its requests fail fast, 0 to disable.
+ENV_CIRCUIT_FAILURES = "BLUEPYENTITY_CIRCUIT_FAILURES"
+DEFAULT_CIRCUIT_FAILURES = 5
+# Time in seconds after which a request is sent again to a host failing fast.
+ENV_CIRCUIT_RESET = "BLUEPYENTITY_CIRCUIT_RESET"
+DEFAULT_CIRCUIT_RESET = 30.0
+
+RETRY_STATUSES = (429, 502, 503, 504)
+# Statuses of the requests refused without being processed, retried for the methods retried by
+# urllib3 and for the queries sent with POST to READ_ONLY_PATHS.
+REFUSED_STATUSES = (429, 503)
+# Ends of the paths of the endpoints of Nexus only reading data, whatever the method of the
+# requests: the SPARQL and Elasticsearch queries of the views.
+READ_ONLY_PATHS = ("/sparql", "/_search")
+# Statuses counted as failures of the host by the circuit breaker.
+FAILURE_STATUSES = (502, 503, 504)
+
+
+class CircuitOpenError(BluepyEntityError, requests.ConnectionError):
+    """Raised instead of sending a request to a host that is considered down."""
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, honouring the Retry-After header of the responses."""
+
+    def __init__(
+        self,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        jitter=True,
+        statuses=RETRY_STATUSES,
+    ):
+        """Instantiate a new RetryPolicy.
+
+        Args:
+            retries (int): Maximum number of retries, the maximum number of attempts being one more.
+            backoff_factor (float): Backoff in seconds before the first retry, doubled after each.
+            max_backoff (float): Maximum backoff in seconds.
+            jitter (bool): If True, the backoff is drawn uniformly between 0 and its value, so that
+                the clients failing at the same time don't retry at the same time.
+            statuses (tuple): HTTP statuses of the responses retried.
+        """
+        # pylint: disable=too-many-arguments
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = tuple(statuses)
+
+    @classmethod
+    def from_environment(cls):
+        """Return the policy configured with the environment variables."""
+        return cls(
+            retries=int(os.environ.get(ENV_RETRIES, DEFAULT_RETRIES)),
+            backoff_factor=float(os.environ.get(ENV_BACKOFF_FACTOR, DEFAULT_BACKOFF_FACTOR)),
+            max_backoff=float(os.environ.get(ENV_MAX_BACKOFF, DEFAULT_MAX_BACKOFF)),
+        )
+
+    def backoff(self, retry):
+        """Return the time in seconds to wait before the `retry`-th retry, starting from 1."""
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** (retry - 1))
+        return random.uniform(0, backoff) if self.jitter else backoff
+
+    def to_urllib3(self):
+        """Return the urllib3 Retry applying the policy to the requests of a session."""
+        return _PolicyRetry(
+            total=self.retries,
+            status_forcelist=self.statuses,
+            respect_retry_after_header=True,
+            # the response is returned to the caller, which raises the error if needed
+            raise_on_status=False,
+            policy=self,
+        )
+
+    def call(self, func, *args, retry_on=(requests.ConnectionError, requests.Timeout), **kwargs):
+        """Call `func`, retrying it when it raises one of the `retry_on` exceptions.
+
+        The circuit breaker errors are not retried.
+        """
+        for retry in range(1, self.retries + 2):
+            try:
+                return func(*args, **kwargs)
+            except CircuitOpenError:
+                raise
+            except retry_on as e:
+                if retry > self.retries:
+                    raise
+                backoff = self.backoff(retry)
+                L.warning("Retrying in %.1f s after error: %s", backoff, e)
+                get_recorder().add("retry", time.perf_counter(), backoff, error=type(e).__name__)
+                time.sleep(backoff)
+        raise AssertionError("unreachable")  # pragma: no cover
+
+
+class _PolicyRetry(Retry):
+    """urllib3 Retry computing the backoff with a RetryPolicy."""
+
+    def __init__(self, *args, policy=None, on_retry=None, **kwargs):
+        """Instantiate a new _PolicyRetry.
+
+        Args:
+            policy (RetryPolicy): Policy computing the backoff.
+            on_retry (callable): Called without arguments before each retry, after the backoff.
+        """
+        super().__init__(*args, **kwargs)
+        self.policy = policy
+        self.on_retry = on_retry
+
+    def new(self, **kw):
+        """Return a copy of the Retry with the updated `kw`, keeping the policy and the hook."""
+        kw.setdefault("policy", self.policy)
+        kw.setdefault("on_retry", self.on_retry)
+        return super().new(**kw)
+
+    def sleep(self, response=None):
+        """Wait before the next retry, and call the `on_retry` hook."""
+        super().sleep(response)
+        if self.on_retry is not None:
+            self.on_retry()
+
+    def increment(
+        self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None
+    ):
+        """Return the Retry of the next attempt, recording the retry.
+
+        Raises:
+            MaxRetryError: If the request was refused and isn't idempotent, since the session is
+                also used to write to Nexus and the writes mustn't be replayed.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if (
+            response is not None
+            and response.status in REFUSED_STATUSES
+            and not self._is_method_retryable(method)
+            and not _is_read_only(url)
+        ):
+            reason = ResponseError(f"{method} request refused with status {response.status}")
+            raise MaxRetryError(_pool, url, reason)
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        status = response.status if response is not None else None
+        get_recorder().add("http.retry", time.perf_counter(), 0, method=method, status=status)
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        """Return True if the response must be retried.
+
+        The refused requests are retried whatever their method, the non-idempotent ones being
+        only retried when sent to READ_ONLY_PATHS, see `increment`.
+        """
+        if self.total and status_code in REFUSED_STATUSES and status_code in self.status_forcelist:
+            return True
+        return super().is_retry(method, status_code, has_retry_after=has_retry_after)
+
+    def get_backoff_time(self):
+        """Return the time in seconds to wait before the next retry, computed by the policy."""
+        if self.policy is None:
+            return super().get_backoff_time()
+        # the errors before the last redirect are not counted, as in urllib3
+        retries = 0
+        for error in reversed(self.history):
+            if error.redirect_location is not None:
+                break
+            retries += 1
+        return self.policy.backoff(retries) if retries else 0
+
+
+def _is_read_only(url):
+    """Return True if the url is the one of an endpoint only reading data."""
+    return urlsplit(url or "").path.rstrip("/").endswith(READ_ONLY_PATHS)
+
+
+class CircuitBreaker:
+    """Fail fast the requests to the hosts that are down.
+
+    After `failures` consecutive failures of a host, the circuit of the host is open: its
+    requests raise CircuitOpenError without being sent. After `reset_timeout` seconds, the
+    requests are sent again, and the circuit is closed by the first success.
+    """
+
+    def __init__(self, failures=DEFAULT_CIRCUIT_FAILURES, reset_timeout=DEFAULT_CIRCUIT_RESET):
+        """Instantiate a new CircuitBreaker.
+
+        Args:
+            failures (int): Number of consecutive failures opening the circuit, 0 to disable.
+            reset_timeout (float): Time in seconds after which the requests are sent again.
+        """
+        self._failures = failures
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        # number of consecutive failures and time of the opening, indexed by host
+        self._hosts = {}
+
+    @classmethod
+    def from_environment(cls):
+        """Return the circuit breaker configured with the environment variables."""
+        return cls(
+            failures=int(os.environ.get(ENV_CIRCUIT_FAILURES, DEFAULT_CIRCUIT_FAILURES)),
+            reset_timeout=float(os.environ.get(ENV_CIRCUIT_RESET, DEFAULT_CIRCUIT_RESET)),
+        )
+
+    def is_open(self, host):
+        """Return True if the requests to the host must fail fast."""
+        with self._lock:
+            _, opened = self._hosts.get(host, (0, None))
+            return opened is not None and time.monotonic() - opened < self._reset_timeout
+
+    def check(self, host):
+        """Raise CircuitOpenError if the requests to the host must fail fast."""
+        if self.is_open(host):
+            raise CircuitOpenError(f"{host} is considered down after repeated failures")
+
+    def record_success(self, host):
+        """Record a successful request to the host, closing its circuit."""
+        with self._lock:
+            if self._hosts.pop(host, None) is not None:
+                L.info("%s is available again", host)
+
+    def record_failure(self, host):
+        """Record a failed request to the host, opening its circuit if it failed too often."""
+        if not self._failures:
+            return
+        with self._lock:
+            count, opened = self._hosts.get(host, (0, None))
+            count += 1
+            if count >= self._failures:
+                if opened is None:
+                    L.warning(
+                        "%s failed %d times, failing fast for %.0f s",
+                        host,
+                        count,
+                        self._reset_timeout,
+                    )
+                opened = time.monotonic()
+            self._hosts[host] = (count, opened)
+
+
+class CircuitBreakerAdapter(HTTPAdapter):
+    """HTTPAdapter failing fast the requests to the hosts considered down by a CircuitBreaker."""
+
+    def __init__(self, *args, circuit_breaker=None, **kwargs):
+        """Instantiate a new CircuitBreakerAdapter, with a new CircuitBreaker by default."""
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Send the request, raising CircuitOpenError if its host is considered down."""
+        host = urlsplit(request.url).netloc
+        self.circuit_breaker.check(host)
+        try:
+            response = super().send(request, *args, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self.circuit_breaker.record_failure(host)
+            raise
+
+        if response.status_code in FAILURE_STATUSES:
+            self.circuit_breaker.record_failure(host)
+        else:
+            self.circuit_breaker.record_success(host)
+        return response
@@ -0,0 +1,330 @@
+# SPDX-License-Identifier: Apache-2.0
+"""pooled HTTP session shared by the forges, the nexussdk client and the downloads"""
+import asyncio
+import contextlib
+import contextvars
+import functools
+import importlib
+import logging
+import os
+import threading
+
+import requests
+
+from bluepyentity.cassette import Cassette, CassetteAdapter, get_cassette
+from bluepyentity.ratelimit import RateLimitedAdapter, get_rate_limiters
+from bluepyentity.retry import CircuitBreaker, RetryPolicy
+
+L = logging.getLogger(__name__)
+
+# Maximum number of connections kept alive per host.
+ENV_POOL_SIZE = "BLUEPYENTITY_HTTP_POOL_SIZE"
+DEFAULT_POOL_SIZE = 10
+# If "0", the connections are closed after each request.
+ENV_KEEP_ALIVE = "BLUEPYENTITY_HTTP_KEEP_ALIVE"
+
+# modules using the `requests` functions, which are routed to the shared session in the scope of
+# `use_shared_session`
+INJECTED_MODULES = (
+    "kgforge.core.commons.files",
+    "kgforge.specializations.stores.bluebrain_nexus",
+    "kgforge.specializations.stores.nexus.service",
+    "nexussdk.utils.http",
+)
+# modules using the `aiohttp.ClientSession` to send batches of requests, which are routed to the
+# shared session in the same scope
+INJECTED_CLIENT_SESSION_MODULES = ("kgforge.specializations.stores.nexus.service",)
+
+_SESSION = None
+_LOCK = threading.Lock()
+# True in the scope of `use_shared_session`
+_IN_SCOPE = contextvars.ContextVar("bluepyentity_shared_session", default=False)
+
+
+def create_session(
+    *,
+    pool_size=None,
+    retry_policy=None,
+    circuit_breaker=None,
+    rate_limiters=None,
+    keep_alive=None,
+    cassette=None,
+):
+    """Create a pooled session.
+
+    The arguments default to the environment variables, then to the defaults of this module and
+    of `bluepyentity.retry`, `bluepyentity.ratelimit` and `bluepyentity.cassette`.
+
+    Args:
+        pool_size (int): Maximum number of connections kept alive per host.
+        retry_policy (RetryPolicy): Retry policy of the requests.
+        circuit_breaker (CircuitBreaker): Circuit breaker failing fast the requests to the hosts
+            that are down.
+        rate_limiters (list): Rate limiters of the requests, see `bluepyentity.ratelimit`.
+        keep_alive (bool): If False, the connections are closed after each request.
+        cassette (Cassette): Cassette recording the responses, or replaying them without sending
+            the requests, see `bluepyentity.cassette`.
+
+    Returns:
+        requests.Session: The session.
+    """
+    pool_size = pool_size or int(os.environ.get(ENV_POOL_SIZE, DEFAULT_POOL_SIZE))
+    retry_policy = retry_policy or RetryPolicy.from_environment()
+    circuit_breaker = circuit_breaker or CircuitBreaker.from_environment()
+    if rate_limiters is None:
+        rate_limiters = get_rate_limiters()
+    if keep_alive is None:
+        keep_alive = os.environ.get(ENV_KEEP_ALIVE, "1") != "0"
+    if cassette is None:
+        cassette = get_cassette()
+
+    adapter = RateLimitedAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry_policy.to_urllib3(),
+        circuit_breaker=circuit_breaker,
+        rate_limiters=rate_limiters,
+    )
+    if cassette is not None:
+        adapter = CassetteAdapter(cassette, adapter)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def get_session():
+    """Return the session shared by the process, created on first use."""
+    global _SESSION  # pylint: disable=global-statement
+    with _LOCK:
+        if _SESSION is None:
+            _SESSION = create_session()
+        return _SESSION
+
+
+def set_session(session):
+    """Replace the session shared by the process, and return the previous one.
+
+    The session is for example one created by `create_session`, or None to create a new one on
+    the next use.
+    """
+    global _SESSION  # pylint: disable=global-statement
+    with _LOCK:
+        previous, _SESSION = _SESSION, session
+    return previous
+
+
+@contextlib.contextmanager
+def use_shared_session():
+    """Context manager sending the requests of the injected modules with the shared session.
+
+    The scope is the current thread or asyncio task, and the ones started from it by `asyncio`.
+    Outside of it, the injected modules send their requests as if they were not injected, so that
+    the other users of kgforge and nexussdk in the process are not affected.
+
+    Yields:
+        requests.Session: The shared session.
+    """
+    token = _IN_SCOPE.set(True)
+    try:
+        yield get_session()
+    finally:
+        _IN_SCOPE.reset(token)
+
+
+@contextlib.contextmanager
+def use_cassette(path, mode="once"):
+    """Context manager recording or replaying the requests of the shared session.
+
+    Args:
+        path (str): Path of the cassette file.
+        mode (str): One of ``bluepyentity.cassette.MODES``.
+
+    Yields:
+        Cassette: The cassette, whose recorded responses are written at the exit.
+    """
+    cassette = Cassette(path, mode=mode)
+    previous = set_session(create_session(cassette=cassette))
+    try:
+        yield cassette
+    finally:
+        set_session(previous)
+        cassette.save()
+
+
+def _get_requests():
+    """Return the shared session in the scope of `use_shared_session`, else `requests`."""
+    return get_session() if _IN_SCOPE.get() else requests
+
+
+class _SessionRequests:
+    """Replacement of the `requests` module, sending the requests with the shared session.
+
+    The requests are sent with the functions of `requests` outside of `use_shared_session`.
+    """
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    @staticmethod
+    def request(method, url, **kwargs):
+        """See requests.request."""
+        return _get_requests().request(method, url, **kwargs)
+
+    @staticmethod
+    def get(url, params=None, **kwargs):
+        """See requests.get."""
+        return _get_requests().get(url, params=params, **kwargs)
+
+    @staticmethod
+    def post(url, data=None, json=None, **kwargs):
+        """See requests.post."""
+        return _get_requests().post(url, data=data, json=json, **kwargs)
+
+    @staticmethod
+    def put(url, data=None, **kwargs):
+        """See requests.put."""
+        return _get_requests().put(url, data=data, **kwargs)
+
+    @staticmethod
+    def patch(url, data=None, **kwargs):
+        """See requests.patch."""
+        return _get_requests().patch(url, data=data, **kwargs)
+
+    @staticmethod
+    def delete(url, **kwargs):
+        """See requests.delete."""
+        return _get_requests().delete(url, **kwargs)
+
+    @staticmethod
+    def head(url, **kwargs):
+        """See requests.head."""
+        return _get_requests().head(url, **kwargs)
+
+
+_SESSION_REQUESTS = _SessionRequests()
+
+
+class _SessionClientResponse:
+    """Replacement of the `aiohttp.ClientResponse` of a response of the shared session."""
+
+    def __init__(self, response):
+        self._response = response
+        self.status = response.status_code
+        self.reason = response.reason
+        self.headers = response.headers
+        self.url = response.url
+
+    async def read(self):
+        """Return the content of the response."""
+        return self._response.content
+
+    async def text(self, encoding=None):
+        """Return the content of the response decoded as text."""
+        if encoding:
+            return self._response.content.decode(encoding)
+        return self._response.text
+
+    async def json(self, **_):
+        """Return the content of the response decoded as JSON."""
+        return self._response.json()
+
+    def release(self):
+        """Close the response."""
+        self._response.close()
+
+
+class _SessionRequestContext:
+    """Context of a request of `_SessionClientSession`, sent in a thread of the event loop."""
+
+    def __init__(self, method, url, kwargs):
+        self._request = functools.partial(get_session().request, method, url, **kwargs)
+        self._response = None
+
+    async def _send(self):
+        loop = asyncio.get_event_loop()
+        self._response = _SessionClientResponse(await loop.run_in_executor(None, self._request))
+        return self._response
+
+    async def __aenter__(self):
+        return await self._send()
+
+    async def __aexit__(self, *_):
+        self._response.release()
+
+
+class _SessionClientSession:
+    """Replacement of `aiohttp.ClientSession`, sending the requests with the shared session.
+
+    The requests are sent in the default executor of the event loop, the concurrency of the
+    batches being bounded by the callers.
+    """
+
+    def __init__(self, headers=None, **_):
+        self._headers = dict(headers or {})
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def close(self):
+        """Do nothing, the shared session is kept open."""
+
+    def request(self, method, url, headers=None, **kwargs):
+        """See aiohttp.ClientSession.request."""
+        kwargs["headers"] = {**self._headers, **(headers or {})}
+        return _SessionRequestContext(method, str(url), kwargs)
+
+
+def _scope_client_session(client_session):
+    """Return a replacement of `client_session` using the shared session in its scope."""
+
+    @functools.wraps(client_session)
+    def _create_client_session(*args, **kwargs):
+        if _IN_SCOPE.get():
+            return _SessionClientSession(*args, **kwargs)
+        return client_session(*args, **kwargs)
+
+    return _create_client_session
+
+
+def inject_session(
+    modules=INJECTED_MODULES, client_session_modules=INJECTED_CLIENT_SESSION_MODULES
+):
+    """Route the requests sent by the `modules` through the shared session.
+
+    The modules call the functions of `requests`, which open a new connection for each request.
+    Their `requests` attribute is replaced by an object sending the requests with the session.
+    The `ClientSession` attribute of the `client_session_modules`, sending batches of requests
+    with aiohttp, is replaced in the same way, so that these requests are retried, rate limited
+    and recorded like the others.
+    The modules that can't be imported are skipped.
+
+    The attributes stay replaced in the whole process, but the replacements send the requests with
+    the shared session only in the scope of `use_shared_session`, and behave like the originals
+    elsewhere.
+    """
+    for name in modules:
+        module = _import_module(name)
+        if getattr(module, "requests", None) is requests:
+            module.requests = _SESSION_REQUESTS
+            L.debug("Injected the shared session in %s", name)
+
+    for name in client_session_modules:
+        module = _import_module(name)
+        client_session = getattr(module, "ClientSession", None)
+        if client_session is not None and not hasattr(client_session, "__wrapped__"):
+            module.ClientSession = _scope_client_session(client_session)
+            L.debug("Injected the shared session in the ClientSession of %s", name)
+
+
+def _import_module(name):
+    """Return the module `name`, or None if it can't be imported."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
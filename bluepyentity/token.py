@@ -6,6 +6,10 @@ import functools
 import getpass
 import logging
 import os
+import shutil
+import subprocess
+import threading
+import time
 
 import jwt
 import keyring
@@ -15,6 +19,21 @@ import bluepyentity.utils
 
 L = logging.getLogger(__name__)
 
+# Time in seconds before the expiry of a token from which it's resolved again.
+TOKEN_MARGIN = 60
+# Time in seconds before the expiry of a token from which it's refreshed in the background.
+REFRESH_MARGIN = 300
+# Time in seconds between the attempts to refresh a token, when no newer token was found.
+REFRESH_RETRY = 30
+# Timeout in seconds of the local check of the kerberos credentials.
+KLIST_TIMEOUT = 1
+
+# resolved tokens, as (token, expiry), indexed by (env, username)
+_TOKENS = {}
+# number of calls and total time in seconds of each token provider
+_PROVIDER_TIMINGS = {}
+_LOCK = threading.Lock()
+
 
 def _getuser(username=None):
     if username is None:
@@ -36,6 +55,27 @@ def _get_token_environment():
     return None
 
 
+def _has_kerberos_credentials():
+    """check locally if there may be a kerberos credential cache, without any request
+
+    The cache named by KRB5CCNAME is checked if it's a file or a directory, otherwise `klist -s`
+    is used if available. If the check isn't possible, the credentials are assumed to exist.
+    """
+    ccname = os.environ.get("KRB5CCNAME")
+    if ccname:
+        kind, _, path = ccname.rpartition(":")
+        if kind in ("", "FILE", "DIR"):
+            return os.path.exists(path)
+
+    klist = shutil.which("klist")
+    if klist is None:
+        return True
+    try:
+        return subprocess.run([klist, "-s"], timeout=KLIST_TIMEOUT, check=False).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return True
+
+
 def _get_token_kerberos():
     L.debug("Attempting to get ticket with kerberos")
     # pylint: disable=import-outside-toplevel, import-error
@@ -44,10 +84,14 @@ def _get_token_kerberos():
     except ImportError:
         return None
 
+    if not _has_kerberos_credentials():
+        L.debug("No kerberos credentials found")
+        return None
+
     import random
     from urllib.parse import parse_qs, urlencode, urlsplit
 
-    import requests
+    from bluepyentity.session import get_session
 
     payload = urlencode(
         {
@@ -63,7 +107,7 @@ def _get_token_kerberos():
 
     kerberos_auth = HTTPKerberosAuth(mutual_authentication=OPTIONAL)
     try:
-        r = requests.get(url, auth=kerberos_auth, timeout=1.0)
+        r = get_session().get(url, auth=kerberos_auth, timeout=1.0)
         r.raise_for_status()
 
         params = parse_qs(urlsplit(r.url).fragment)
@@ -101,29 +145,109 @@ def set_token(env, username=None, token=None):
     except NoKeyringError:
         pass
 
+    with _LOCK:
+        _TOKENS[(env, username)] = (token, _get_expiry(token))
+
     return token
 
 
 def get_token(env, username=None):
-    """try and get a token, will fall back to interactive if necessary"""
+    """try and get a token, will fall back to interactive if necessary
+
+    The resolved token is kept by the process, and returned by the next calls until it's about
+    to expire (see `TOKEN_MARGIN`).
+    """
     username = _getuser(username)
 
-    token = None
-    for func in (
-        functools.partial(_get_token_keyring, env, username),
-        _get_token_environment,
-        _get_token_kerberos,
-    ):
-        if is_valid(token):
-            break
-        token = func()
+    with _LOCK:
+        token, expiry = _TOKENS.get((env, username), (None, None))
+    if token is not None and time.time() < expiry - TOKEN_MARGIN:
+        return token
 
-    if not is_valid(token):
+    token, expiry = _resolve_token(env, username)
+    if not _is_unexpired(expiry):
         token = set_token(env=env, username=username)
 
     return token
 
 
+def _resolve_token(env, username, min_expiry=None):
+    """resolve a token with the providers, without the kept tokens and without interaction
+
+    Args:
+        env (str): name of the nexus environment
+        username (str): user of the token
+        min_expiry (float): if set, the tokens expiring before or at this timestamp are skipped,
+            so that the next providers are tried for a newer token
+
+    Returns:
+        tuple: the token and its expiry, or (None, None) if no valid token was found
+    """
+    for name, func in (
+        ("keyring", functools.partial(_get_token_keyring, env, username)),
+        ("environment", _get_token_environment),
+        ("kerberos", _get_token_kerberos),
+    ):
+        token = _timed(name, func)
+        expiry = _get_expiry(token)
+        if min_expiry is not None and expiry is not None and expiry <= min_expiry:
+            L.debug("The token of the %s provider is not newer than the current one", name)
+            continue
+        if _is_unexpired(expiry):
+            with _LOCK:
+                _TOKENS[(env, username)] = (token, expiry)
+            return token, expiry
+
+    return None, None
+
+
+def clear_token_cache():
+    """forget the tokens resolved by `get_token`"""
+    with _LOCK:
+        _TOKENS.clear()
+
+
+def get_provider_timings():
+    """return the number of calls and the total time in seconds of each token provider
+
+    Returns:
+        dict: tuples (calls, seconds) indexed by the name of the provider
+    """
+    with _LOCK:
+        return {name: tuple(timing) for name, timing in _PROVIDER_TIMINGS.items()}
+
+
+def _timed(name, func):
+    """call the token provider `func`, and record the time it took"""
+    start = time.monotonic()
+    try:
+        return func()
+    finally:
+        elapsed = time.monotonic() - start
+        L.debug("Token provider %s took %.3f s", name, elapsed)
+        with _LOCK:
+            timing = _PROVIDER_TIMINGS.setdefault(name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+
+
+def _get_expiry(token):
+    """return the expiry timestamp of the token, or None if it can't be decoded"""
+    if not token:
+        return None
+
+    try:
+        info = decode(token)
+    except jwt.DecodeError:
+        return None
+
+    return info.get("exp")
+
+
+def _is_unexpired(expiry):
+    return expiry is not None and datetime.datetime.now() < datetime.datetime.fromtimestamp(expiry)
+
+
 def decode(token):
     """decode the token, and return its contents"""
     return jwt.decode(token, options={"verify_signature": False})
@@ -135,12 +259,72 @@ def is_valid(token):
     * if it decodes properly
     * if it has not expired
     """
-    if not token:
-        return False
+    return _is_unexpired(_get_expiry(token))
 
-    try:
-        info = decode(token)
-    except jwt.DecodeError:
-        return False
 
-    return "exp" in info and datetime.datetime.now() < datetime.datetime.fromtimestamp(info["exp"])
+class TokenRefresher:
+    """Refresh a token in a background thread, before it expires.
+
+    The new token is resolved with the same providers as `get_token`, without interaction, and
+    passed to the callback. The refresh stops when the callback returns False.
+    """
+
+    def __init__(
+        self, env, token, callback, *, username=None, margin=REFRESH_MARGIN, retry=REFRESH_RETRY
+    ):
+        """Start refreshing the token, if it has an expiry.
+
+        Args:
+            env (str): Name of the nexus environment of the token.
+            token (str): The token to refresh.
+            callback (callable): Called with each new token.
+            username (str): User of the token, defaults to the current user.
+            margin (float): Time in seconds before the expiry from which the token is refreshed.
+            retry (float): Time in seconds between the attempts, when no newer token is found.
+        """
+        # pylint: disable=too-many-arguments
+        self._env = env
+        self._username = _getuser(username)
+        self._callback = callback
+        self._margin = margin
+        self._retry = retry
+        self._token = token
+        self._expiry = _get_expiry(token)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="bluepyentity-token-refresh", daemon=True
+        )
+        if self._expiry is not None:
+            self._thread.start()
+
+    @property
+    def token(self):
+        """The last token."""
+        return self._token
+
+    def stop(self):
+        """Stop refreshing the token."""
+        self._stopped.set()
+
+    def _run(self):
+        delay = self._expiry - self._margin - time.time()
+        while not self._stopped.wait(max(delay, 0)):
+            try:
+                token, expiry = _resolve_token(self._env, self._username, min_expiry=self._expiry)
+            except Exception:  # pylint: disable=broad-except
+                L.exception("Unable to refresh the token")
+                token, expiry = None, None
+
+            if expiry is None or expiry <= self._expiry:
+                L.warning(
+                    "No newer token found, the current one expires at %s",
+                    datetime.datetime.fromtimestamp(self._expiry),
+                )
+                delay = self._retry
+                continue
+
+            L.info("Token refreshed, expires at %s", datetime.datetime.fromtimestamp(expiry))
+            self._token, self._expiry = token, expiry
+            if self._callback(token) is False:
+                return
+            delay = expiry - self._margin - time.time()
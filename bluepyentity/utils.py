@@ -2,15 +2,23 @@
 
 """useful utilities"""
 import getpass
+import os
 import sys
 import termios
 import urllib.parse
 from collections import OrderedDict
+from pathlib import Path
 from typing import Optional
 
 from bluepyentity.exceptions import BluepyEntityError
 
 
+def get_cache_dir():
+    """return the user cache directory of bluepyentity, honouring `XDG_CACHE_HOME`"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home, "bluepyentity")
+
+
 def visit_container(container, func, dict_func=None):
     """recursively visit a container
 
@@ -1,6 +1,6 @@
 """version"""
 
-from pkg_resources import get_distribution
+from importlib.metadata import version
 
-VERSION = get_distribution("bluepyentity").version
+VERSION = version("bluepyentity")
 __version__ = VERSION
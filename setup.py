@@ -33,11 +33,13 @@ setup(
         "more-itertools>=8.2.0,<9.0.0",
         "nexusforge>=0.7.0,<1.0.0",
         "pyjwt",
+        "requests",
         "rich",
         "textual==0.9.1",  # API is unstable, hence the pinning.
     ],
     packages=find_packages(),
     include_package_data=True,
+    package_data={"bluepyentity.data": ["*.yaml", "mappings/*.hjson"]},
     python_requires=">=3.7",
     extras_require={
         "docs": ["sphinx", "sphinx-bluebrain-theme"],
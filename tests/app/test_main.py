@@ -0,0 +1,36 @@
+import json
+
+import click
+import pytest
+from click.testing import CliRunner
+
+from bluepyentity import instrumentation
+from bluepyentity.app.main import main
+
+
+@click.command()
+def fake_search():
+    with instrumentation.span("nexus.search"):
+        click.echo("searched")
+
+
+@pytest.fixture
+def fake_command():
+    main.add_command(fake_search, "fake-search")
+    yield
+    del main.commands["fake-search"]
+
+
+def test_profile(fake_command, tmp_path, monkeypatch):
+    monkeypatch.setenv("BLUEPYENTITY_NO_SERVE", "1")
+    previous = instrumentation.get_recorder()
+    path = tmp_path / "trace.json"
+
+    result = CliRunner().invoke(main, ["--profile", str(path), "fake-search"])
+
+    assert result.exit_code == 0, result.output
+    assert "searched" in result.output
+    events = json.loads(path.read_text())["traceEvents"]
+    assert [e["name"] for e in events] == ["nexus.search", "cli.command"]
+    assert events[1]["args"] == {"command": "fake-search"}
+    assert instrumentation.get_recorder() is previous
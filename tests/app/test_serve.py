@@ -0,0 +1,143 @@
+import io
+import json
+import logging
+import os
+import socket
+import threading
+
+import click
+import pytest
+
+from bluepyentity.app import serve as tested
+from bluepyentity.app.main import LazyGroup, main
+
+
+@click.command()
+@click.argument("code", type=int)
+def echo(code):
+    click.echo(f"cwd={os.getcwd()} var={os.environ.get('BLUEPYENTITY_TEST_VAR')}")
+    click.echo("error", err=True)
+    raise click.exceptions.Exit(code)
+
+
+@click.group(cls=LazyGroup)
+def group():
+    pass
+
+
+group.add_command(echo)
+
+
+@click.command()
+def logs():
+    logging.getLogger("bluepyentity.test").info("info")
+    logging.getLogger("bluepyentity.test").warning("warning")
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = tmp_path / "s.sock"
+    server = tested._Server(str(socket_path), group)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_get_subcommand():
+    assert main._get_subcommand(["--env", "staging", "-vv", "info", "id"]) == "info"
+    assert main._get_subcommand(["--bucket=a/b", "download", "--output", "info"]) == "download"
+    assert main._get_subcommand(["--help"]) is None
+
+
+def test_is_forwarded(monkeypatch):
+    assert main._is_forwarded(["--env", "staging", "info", "id"])
+    assert not main._is_forwarded(["explorer", "id"])
+    assert not main._is_forwarded(["download", "--from-file", "-"])
+    monkeypatch.setenv(tested.ENV_NO_SERVE, "1")
+    assert not main._is_forwarded(["info", "id"])
+
+
+def test_forward__not_running(tmp_path):
+    assert tested.forward(["info", "id"], socket_path=tmp_path / "missing.sock") is None
+
+
+def test_forward(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("BLUEPYENTITY_TEST_VAR", "value")
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    code = tested.forward(["echo", "3"], socket_path=server, stdout=stdout, stderr=stderr)
+
+    assert code == 3
+    assert stdout.getvalue() == f"cwd={tmp_path} var=value\n"
+    assert stderr.getvalue() == "error\n"
+    # the environment of the daemon is restored
+    monkeypatch.delenv("BLUEPYENTITY_TEST_VAR")
+    code = tested.forward(["echo", "0"], socket_path=server, stdout=stdout, stderr=io.StringIO())
+    assert code == 0
+    assert stdout.getvalue().endswith("var=None\n")
+
+
+def _send(socket_path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            return [json.loads(line) for line in stream]
+
+
+def test_forward__identity(server, tmp_path, monkeypatch):
+    monkeypatch.setenv("NEXUS_TOKEN", "token")
+    request = {"args": ["echo", "0"], "cwd": str(tmp_path), "env": {}, "terminal": False}
+    request["columns"] = None
+
+    messages = _send(server, {**request, "identity": tested._get_identity()})
+    assert messages[-1] == {"exit": 0}
+
+    # the daemon doesn't run the commands of the clients with another token or credentials
+    for name in tested.IDENTITY_ENV:
+        identity = {**tested._get_identity(), name: "other"}
+        assert _send(server, {**request, "identity": identity}) == [{"exit": None}]
+
+
+def test_forward__logging(tmp_path, monkeypatch):
+    monkeypatch.setitem(main.commands, "logs", logs)
+    socket_path = tmp_path / "s.sock"
+    server = tested._Server(str(socket_path), main)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        stderr = io.StringIO()
+        assert tested.forward(["logs"], socket_path=socket_path, stderr=stderr) == 0
+        assert "WARNING  warning" in stderr.getvalue()
+        assert "info" not in stderr.getvalue()
+
+        # the verbosity of each command is applied
+        stderr = io.StringIO()
+        assert tested.forward(["-v", "logs"], socket_path=socket_path, stderr=stderr) == 0
+        assert "INFO     info" in stderr.getvalue()
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+    # the handlers writing to the clients are removed
+    assert not any(
+        getattr(h, "stream", None).__class__ is tested._MessageStream
+        for h in logging.getLogger().handlers
+    )
+
+
+def test_remove_stale_socket(server, tmp_path):
+    with pytest.raises(click.ClickException, match="already running"):
+        tested._remove_stale_socket(server)
+
+    stale = tmp_path / "stale.sock"
+    stale_server = tested._Server(str(stale), group)
+    stale_server.server_close()
+    tested._remove_stale_socket(stale)
+    assert not stale.exists()
@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: Apache-2.0
+
+from unittest.mock import patch
+
+import pytest
+from kgforge.core import Resource
+from kgforge.core.wrappings.dict import wrap_dict
+
+from bluepyentity.nexus import cache as test_module
+
+
+def _resource(id_="id1", rev=3):
+    resource = Resource(
+        id=id_,
+        type="DetailedCircuit",
+        name="fake_name",
+        circuitBase=Resource(id="id2", url="file:///fake/path"),
+    )
+    resource._store_metadata = wrap_dict({"id": id_, "_rev": rev})
+    return resource
+
+
+@pytest.mark.parametrize(
+    "resource_id,version,expected",
+    [
+        ("id1", None, ("id1", False)),
+        ("id1?rev=2", None, ("id1?rev=2", True)),
+        ("id1", 2, ("id1?rev=2", True)),
+        ("id1", "v1.0", None),
+        ("id1?tag=v1.0", None, None),
+    ],
+)
+def test_cache_key(resource_id, version, expected):
+    assert test_module._cache_key(resource_id, version) == expected
+
+
+def test_get_cache_path(tmp_path, monkeypatch):
+    assert test_module.get_cache_path("prod", tmp_path) == tmp_path / "resources-prod.db"
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    expected = tmp_path / "bluepyentity" / "resources-staging.db"
+    assert test_module.get_cache_path("staging") == expected
+
+
+def test_resource_cache_roundtrip(tmp_path):
+    cache = test_module.ResourceCache(tmp_path / "cache.db")
+    resource = _resource()
+
+    assert cache.get("id1") is None
+    cache.put("id1", resource)
+
+    result = cache.get("id1")
+    assert result is not resource
+    assert result.name == "fake_name"
+    assert result.circuitBase.url == "file:///fake/path"
+    assert result._store_metadata._rev == 3
+
+    # pinned under the revision found in the store metadata
+    assert cache.get("id1?rev=3").name == "fake_name"
+    assert cache.get("id1", version=3).name == "fake_name"
+    assert cache.get("id1?rev=2") is None
+
+    # shared with other instances using the same database
+    assert test_module.ResourceCache(tmp_path / "cache.db").get("id1").name == "fake_name"
+
+    cache.clear()
+    assert cache.get("id1") is None
+
+
+def test_resource_cache_ttl(tmp_path):
+    cache = test_module.ResourceCache(tmp_path / "cache.db", ttl=10)
+    cache.put("id1", _resource())
+
+    with patch(test_module.__name__ + ".time.time", return_value=1e12):
+        assert cache.get("id1") is None
+        # resources with a revision never expire
+        assert cache.get("id1?rev=3") is not None
+
+
+def test_resource_cache_no_ttl(tmp_path):
+    cache = test_module.ResourceCache(tmp_path / "cache.db", ttl=0)
+    cache.put("id1", _resource())
+
+    assert cache.get("id1") is None
+    assert cache.get("id1?rev=3") is not None
+
+
+def test_lru_resource_cache():
+    cache = test_module.LRUResourceCache(maxsize=3)
+    resource1 = _resource("id1", rev=1)
+    resource2 = _resource("id2", rev=1)
+
+    assert cache.get("id1") is None
+    cache.put("id1", resource1)
+    assert cache.get("id1") is resource1
+    assert cache.get("id1?rev=1") is resource1
+    assert cache.info() == test_module.CacheInfo(2, 1, 0, 3, 2)
+
+    # the least recently used id1 is evicted first
+    cache.put("id2", resource2)
+    assert cache.get("id2") is resource2
+    assert cache.info().evictions == 1
+    assert cache.get("id1") is None
+    assert cache.get("id1?rev=1") is resource1
+
+    # tags can't be cached and aren't counted
+    assert cache.get("id1", version="tag") is None
+    assert cache.info() == test_module.CacheInfo(4, 2, 1, 3, 3)
+
+    cache.clear()
+    assert cache.info() == test_module.CacheInfo(0, 0, 0, 3, 0)
+
+
+def test_lru_resource_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(test_module.time, "monotonic", lambda: now[0])
+    cache = test_module.LRUResourceCache(ttl=10)
+    resource = _resource("id1", rev=1)
+    cache.put("id1", resource)
+
+    now[0] += 5
+    assert cache.get("id1") is resource
+
+    # only the resources retrieved without a revision expire
+    now[0] += 10
+    assert cache.get("id1") is None
+    assert cache.get("id1?rev=1") is resource
+    assert cache.info().currsize == 1
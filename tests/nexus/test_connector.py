@@ -1,12 +1,15 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 from kgforge.core import KnowledgeGraphForge, Resource
 
+from bluepyentity import instrumentation
+from bluepyentity.exceptions import BluepyEntityError, RetrievalError
 from bluepyentity.nexus import connector as test_module
+from bluepyentity.nexus.cache import LRUResourceCache, ResourceCache
 
 
 def test_nexus_connector_init():
@@ -40,6 +43,99 @@ def test_nexus_connector_get_resource_by_id():
     forge.retrieve.assert_called_once()
 
 
+def test_nexus_connector_get_resource_by_id_cache(tmp_path):
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.return_value = Resource(id="id1", name="fake_name")
+    connector = test_module.NexusConnector(forge=forge, cache=ResourceCache(tmp_path / "db"))
+
+    assert connector.get_resource_by_id("id1").name == "fake_name"
+    assert connector.get_resource_by_id("id1").name == "fake_name"
+    forge.retrieve.assert_called_once()
+
+    # tags can't be cached
+    connector.get_resource_by_id("id1", version="tag")
+    assert forge.retrieve.call_count == 2
+
+
+def test_nexus_connector_get_resource_by_id_memory_cache(tmp_path):
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.return_value = Resource(id="id1", name="fake_name")
+    memory_cache = LRUResourceCache()
+    connector = test_module.NexusConnector(forge=forge, memory_cache=memory_cache)
+
+    result = connector.get_resource_by_id("id1")
+    assert connector.get_resource_by_id("id1") is result
+    forge.retrieve.assert_called_once()
+    assert connector.memory_cache.info().hits == 1
+
+    # resources found in the persistent cache are kept in memory
+    cache = ResourceCache(tmp_path / "db")
+    cache.put("id2", Resource(id="id2"))
+    connector = test_module.NexusConnector(forge=forge, cache=cache, memory_cache=memory_cache)
+    assert connector.get_resource_by_id("id2") is connector.get_resource_by_id("id2")
+    forge.retrieve.assert_called_once()
+
+
+def test_nexus_connector_instrumentation():
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.return_value = Resource(id="id1")
+    forge.search.return_value = [Resource(id="id1"), Resource(id="id2")]
+    connector = test_module.NexusConnector(forge=forge, memory_cache=LRUResourceCache())
+    previous = instrumentation.set_recorder(instrumentation.Recorder())
+    try:
+        connector.get_resource_by_id("id1")
+        connector.get_resource_by_id("id1")
+        connector.search("Foo", {})
+        stats = instrumentation.get_recorder().stats()
+    finally:
+        instrumentation.set_recorder(previous)
+
+    assert stats["nexus.retrieve"]["count"] == 2
+    assert stats["nexus.retrieve"]["cache_hit"] == 1
+    assert stats["nexus.search"]["results"] == 2
+
+
+@patch(test_module.__name__ + ".get_session")
+def test_nexus_connector_query_graph(mocked_session):
+    forge = MagicMock(KnowledgeGraphForge)
+    store = forge._store = MagicMock()
+    store.model_context = None
+    store.service.sparql_endpoint = {"endpoint": "https://nexus/sparql"}
+    store.service.headers_sparql = {"Authorization": "Bearer token", "Accept": "sparql-json"}
+    response = mocked_session.return_value.post.return_value
+    response.ok = True
+    response.content = b'<http://ex/a> <http://schema.org/name> "a" .'
+    response.headers = {"Content-Type": "application/n-triples"}
+    resources = [Resource(id="http://ex/a")]
+    connector = test_module.NexusConnector(forge=forge)
+
+    with patch.object(
+        test_module.graph_utils, "graph_to_resources", return_value=resources
+    ) as graph_to_resources:
+        result = connector.get_resources_by_query("CONSTRUCT QUERY", graph=True)
+
+    assert result == resources
+    graph, graph_store = graph_to_resources.call_args.args
+    assert len(graph) == 1
+    assert graph_store is store
+    call = mocked_session.return_value.post.call_args
+    assert call.args == ("https://nexus/sparql",)
+    assert call.kwargs["data"] == b"CONSTRUCT QUERY"
+    assert call.kwargs["headers"] == {
+        "Authorization": "Bearer token",
+        "Accept": "application/n-triples",
+    }
+    # no SELECT query and no retrieval
+    forge.sparql.assert_not_called()
+    forge.retrieve.assert_not_called()
+
+    response.ok = False
+    response.status_code = 400
+    response.text = "malformed query"
+    with pytest.raises(BluepyEntityError, match="failed with status 400: malformed query"):
+        connector.query("CONSTRUCT QUERY", graph=True)
+
+
 def test_nexus_connector_get_resources_by_query():
     resource = Resource(id="id1")
     forge = MagicMock(KnowledgeGraphForge)
@@ -69,10 +165,274 @@ def test_nexus_connector_get_resources():
     forge.search.assert_called_once()
     forge.retrieve.assert_called_once()
 
+    result = connector.get_resources(resource_type, resource_filter, retrieve=False)
+
+    assert result == [resource]
+    forge.retrieve.assert_called_once()
+
+
+def test_nexus_connector_iter_resources():
+    ids = [f"id{i}" for i in range(7)]
+
+    def search(*_, limit, offset, **__):
+        return [Resource(id=id_) for id_ in ids[offset : offset + limit]]
+
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.search.side_effect = search
+    forge.retrieve.side_effect = lambda id_, **_: Resource(id=id_, name=id_)
+    connector = test_module.NexusConnector(forge=forge)
+
+    result = list(connector.iter_resources("DetailedCircuit", page_size=3))
+
+    assert [r.name for r in result] == ids
+    assert [c.kwargs["offset"] for c in forge.search.call_args_list] == [0, 3, 6]
+    assert forge.retrieve.call_count == len(ids)
+
+    forge.reset_mock()
+    result = list(connector.iter_resources("DetailedCircuit", page_size=7, retrieve=False))
+
+    assert [r.id for r in result] == ids
+    # the first page is full, so the next one is searched
+    assert forge.search.call_count == 2
+    forge.retrieve.assert_not_called()
+
+    forge.reset_mock()
+    result = list(connector.iter_resources("DetailedCircuit", page_size=3, offset=2))
+
+    assert [r.name for r in result] == ids[2:]
+    assert [c.kwargs["offset"] for c in forge.search.call_args_list] == [2, 5]
+
+
+def _elastic_forge(ids):
+    """forge with a store whose Elasticsearch view returns the resources `ids` page by page"""
+    forge = MagicMock(KnowledgeGraphForge)
+    store = forge._store = MagicMock()
+    store.endpoint = "https://nexus/v1"
+    store.bucket = "bbp/atlas"
+    store.model_context = None
+    store.service.elastic_endpoint = {
+        "endpoint": "https://nexus/_search",
+        "default_str_keyword_field": "keyword",
+    }
+    store.service.headers_elastic = {"Authorization": "Bearer token"}
+    store.service.to_resource.side_effect = lambda payload, *_, **__: Resource(**payload)
+
+    def post(url, json, **_):
+        search_after = json.get("search_after", [""])[0]
+        page = [id_ for id_ in ids if id_ > search_after][json.get("from", 0) :][: json["size"]]
+        response = MagicMock(ok=True)
+        response.json.return_value = {
+            "hits": {"hits": [{"_id": id_, "_source": {"id": id_}, "sort": [id_]} for id_ in page]}
+        }
+        return response
+
+    return forge, post
+
+
+@patch(test_module.__name__ + ".get_session")
+def test_nexus_connector_search_elastic(mocked_session):
+    ids = [f"id{i}" for i in range(7)]
+    forge, post = _elastic_forge(ids)
+    mocked_session.return_value.post.side_effect = post
+    connector = test_module.NexusConnector(forge=forge, search_backend="elastic")
+
+    with patch.object(test_module, "ELASTIC_MAX_PAGE_SIZE", 3):
+        result = connector.search("DetailedCircuit", {"name": "circuit"}, limit=None)
+
+    assert [r.id for r in result] == ids
+    calls = mocked_session.return_value.post.call_args_list
+    assert [c.kwargs["json"].get("search_after") for c in calls] == [None, ["id2"], ["id5"]]
+    query = calls[0].kwargs["json"]
+    assert query["query"]["bool"]["filter"] == [
+        {"term": {"@type": "DetailedCircuit"}},
+        {"term": {"name.keyword": "circuit"}},
+        {"term": {"_deprecated": False}},
+        {"term": {"_project": "https://nexus/v1/projects/bbp/atlas"}},
+    ]
+    assert calls[0].args == ("https://nexus/_search",)
+    assert calls[0].kwargs["headers"] == {"Authorization": "Bearer token"}
+    forge.search.assert_not_called()
+
+    mocked_session.reset_mock()
+    result = connector.search(
+        "DetailedCircuit", {}, limit=2, offset=3, includes=["@id"], cross_bucket=True
+    )
 
-def test_nexus_connector_download_resource(caplog):
+    assert [r.id for r in result] == ["id3", "id4"]
+    (call,) = mocked_session.return_value.post.call_args_list
+    assert call.kwargs["json"]["from"] == 3
+    assert call.kwargs["json"]["_source"] == {"includes": ["@id"]}
+    assert len(call.kwargs["json"]["query"]["bool"]["filter"]) == 2
+
+    mocked_session.reset_mock()
+    with patch.object(test_module, "ELASTIC_MAX_PAGE_SIZE", 3):
+        result = connector.search("DetailedCircuit", {}, limit=None, offset=2)
+
+    assert [r.id for r in result] == ids[2:]
+    calls = mocked_session.return_value.post.call_args_list
+    assert [c.kwargs["json"].get("from") for c in calls] == [2, None]
+
+    # the backend can be selected for each search
+    forge.search.return_value = []
+    assert connector.search("DetailedCircuit", {}, backend="sparql") == []
+    forge.search.assert_called_once()
+
+    mocked_session.return_value.post.side_effect = None
+    mocked_session.return_value.post.return_value = MagicMock(
+        ok=False, status_code=400, text="bad query"
+    )
+    with pytest.raises(BluepyEntityError, match="failed with status 400: bad query"):
+        connector.search("DetailedCircuit", {})
+
+
+@patch(test_module.__name__ + ".get_session")
+def test_nexus_connector_iter_resources_elastic(mocked_session):
+    ids = [f"id{i}" for i in range(7)]
+    forge, post = _elastic_forge(ids)
+    mocked_session.return_value.post.side_effect = post
+    forge.retrieve.side_effect = lambda id_, **_: Resource(id=id_, name=id_)
+    connector = test_module.NexusConnector(forge=forge)
+
+    result = list(connector.iter_resources("DetailedCircuit", page_size=3, backend="elastic"))
+
+    assert [r.name for r in result] == ids
+    calls = mocked_session.return_value.post.call_args_list
+    assert [c.kwargs["json"].get("search_after") for c in calls] == [None, ["id2"], ["id5"]]
+    assert {c.kwargs["json"]["size"] for c in calls} == {3}
+    forge.search.assert_not_called()
+
+    # the offset only applies to the first page
+    mocked_session.reset_mock()
+    result = list(
+        connector.iter_resources(
+            "DetailedCircuit", page_size=3, backend="elastic", retrieve=False, offset=2
+        )
+    )
+
+    assert [r.id for r in result] == ids[2:]
+    calls = mocked_session.return_value.post.call_args_list
+    assert [c.kwargs["json"].get("from") for c in calls] == [2, None]
+
+
+def test_nexus_connector_search_backend():
+    with pytest.raises(BluepyEntityError, match="Invalid search backend 'other'"):
+        test_module.NexusConnector(forge=MagicMock(), search_backend="other")
+
+    connector = test_module.NexusConnector(forge=MagicMock())
+    with pytest.raises(BluepyEntityError, match="Invalid search backend 'other'"):
+        connector.search("DetailedCircuit", {}, backend="other")
+
+
+def test_nexus_connector_get_resources_by_ids():
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.side_effect = lambda id_, **_: Resource(id=id_)
+    connector = test_module.NexusConnector(forge=forge, max_workers=3)
+    ids = [f"id{i}" for i in range(10)]
+
+    result = connector.get_resources_by_ids(ids)
+
+    assert [r.id for r in result] == ids
+    assert forge.retrieve.call_count == len(ids)
+
+
+def test_nexus_connector_get_resources_by_ids_errors(caplog):
+    def retrieve(id_, **_):
+        if id_ == "missing":
+            return None
+        if id_ == "broken":
+            raise ValueError("broken resource")
+        return Resource(id=id_)
+
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.side_effect = retrieve
+    connector = test_module.NexusConnector(forge=forge)
+    ids = ["id1", "missing", "id2", "broken"]
+
+    with pytest.raises(RetrievalError, match="Unable to retrieve 2 of 4 resources") as e:
+        connector.get_resources_by_ids(ids)
+
+    assert set(e.value.errors) == {"missing", "broken"}
+    assert isinstance(e.value.errors["broken"], ValueError)
+    assert [getattr(r, "id", None) for r in e.value.resources] == ["id1", None, "id2", None]
+
+    with caplog.at_level(logging.WARNING):
+        result = connector.get_resources_by_ids(ids, skip_errors=True)
+
+    assert [r.id for r in result] == ["id1", "id2"]
+    assert "Unable to retrieve broken" in caplog.text
+
+
+def _linked_resources():
+    """graph of resources: circuits linking to an atlas, itself linking to an ontology"""
+    return {
+        "circuit1": Resource(
+            id="circuit1",
+            atlasRelease=Resource(id="atlas", type="AtlasRelease"),
+            brainLocation=Resource(brainRegion=Resource(id="region1", label="r1")),
+            distribution=Resource(type="DataDownload", contentUrl="url"),
+        ),
+        "circuit2": Resource(
+            id="circuit2",
+            atlasRelease=Resource(id="atlas", type="AtlasRelease"),
+            brainLocation=Resource(brainRegion=[Resource(id="region1"), Resource(id="region2")]),
+        ),
+        "atlas": Resource(id="atlas", name="atlas", parcellationOntology=Resource(id="ontology")),
+        "ontology": Resource(id="ontology", name="ontology"),
+        "region1": Resource(id="region1", name="region1"),
+        "region2": Resource(id="region2", name="region2"),
+    }
+
+
+def test_nexus_connector_prefetch_links():
+    resources = _linked_resources()
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.side_effect = lambda id_, **_: resources[id_]
+    connector = test_module.NexusConnector(forge=forge, memory_cache=LRUResourceCache(10))
+    # the search results don't have the attributes of the resources
+    roots = [Resource(id="circuit1"), Resource(id="circuit2"), Resource(id="missing")]
+
+    with patch.object(
+        connector, "get_resources_by_ids", wraps=connector.get_resources_by_ids
+    ) as get_resources_by_ids:
+        result = connector.prefetch_links(
+            roots, ["atlasRelease.parcellationOntology", "brainLocation.brainRegion", "unknown"]
+        )
+
+    assert set(result) == {"circuit1", "circuit2", "atlas", "ontology", "region1", "region2"}
+    # one concurrent retrieval by level, each resource being retrieved once
+    assert [sorted(c.args[0]) for c in get_resources_by_ids.call_args_list] == [
+        ["circuit1", "circuit2", "missing"],
+        ["atlas", "region1", "region2"],
+        ["ontology"],
+    ]
+    assert forge.retrieve.call_count == 7
+
+    # the prefetched resources are served from the cache
+    assert connector.get_resource_by_id("ontology").name == "ontology"
+    assert forge.retrieve.call_count == 7
+
+
+def test_nexus_connector_prefetch_links_errors():
+    resources = _linked_resources()
+    forge = MagicMock(KnowledgeGraphForge)
+    forge.retrieve.side_effect = lambda id_, **_: resources.get(id_)
+    connector = test_module.NexusConnector(forge=forge)
+    del resources["atlas"]
+
+    result = connector.prefetch_links([resources["circuit1"]], "atlasRelease.name")
+    assert result == {}
+
+    with pytest.raises(RetrievalError, match="Unable to retrieve 1 of 1 resources"):
+        connector.prefetch_links([resources["circuit1"]], "atlasRelease.name", skip_errors=False)
+
+    # the embedded resources are not retrieved
+    result = connector.prefetch_links([resources["circuit1"]], "brainLocation")
+    assert result == {}
+
+
+@patch(test_module.__name__ + ".download_distribution")
+def test_nexus_connector_download_resource(mocked_download):
     forge = MagicMock(KnowledgeGraphForge)
-    forge.download.return_value = None
     connector = test_module.NexusConnector(forge=forge)
 
     class MockResource:
@@ -81,13 +441,10 @@ def test_nexus_connector_download_resource(caplog):
             self.contentUrl = ""
             self.type = type_
 
-    with caplog.at_level(logging.WARNING):
-        connector.download_resource(MockResource(), __file__)
-        forge.download.assert_not_called()
-        assert "already exists, not downloading..." in caplog.text
-
-    connector.download_resource(MockResource("DataDownload"), "")
-    forge.download.assert_called_once()
+    resource = MockResource("DataDownload")
+    mocked_download.return_value = "fake_path"
+    assert connector.download_resource(resource, "path") == "fake_path"
+    mocked_download.assert_called_once_with(forge, resource, "path")
 
     with pytest.raises(RuntimeError, match="can not be downloaded"):
         connector.download_resource(MockResource("invalid_type"), "")
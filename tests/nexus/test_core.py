@@ -1,10 +1,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
+import gc
 from unittest.mock import patch
 
 import pandas as pd
+import pytest
 from kgforge.core import Resource
 
+from bluepyentity.exceptions import BluepyEntityError
+
 from bluepyentity.nexus import core as test_module
 from bluepyentity.nexus.entity import Entity
 from bluepyentity.nexus.factory import EntityFactory
@@ -14,6 +18,38 @@ from bluepyentity.nexus.factory import EntityFactory
 def test_nexushelper_init(mocked_forge):
     helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
     assert isinstance(helper, test_module.NexusHelper)
+    # max_connection of the prod store config
+    assert helper._connector._max_workers == 5
+
+
+@patch(test_module.__name__ + ".TokenRefresher")
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_refresh_token(mocked_forge, mocked_refresher):
+    with patch(test_module.__name__ + ".get_token", return_value="fake_token"):
+        helper = test_module.NexusHelper(bucket="fake/project")
+    env, token, callback = mocked_refresher.call_args.args
+    assert (env, token) == ("prod", "fake_token")
+
+    with patch.object(helper._connector, "set_token") as set_token:
+        assert callback("new_token") is True
+    set_token.assert_called_once_with("new_token")
+
+    helper.close()
+    mocked_refresher.return_value.stop.assert_called_once()
+
+    # the refresh stops with the helper
+    del helper
+    gc.collect()
+    assert callback("new_token") is False
+
+    mocked_refresher.reset_mock()
+    with patch(test_module.__name__ + ".get_token", return_value="fake_token"):
+        test_module.NexusHelper(bucket="fake/project", refresh_token=False)
+    mocked_refresher.assert_not_called()
+
+    # a given token is never replaced by the one of the providers
+    test_module.NexusHelper(bucket="fake/project", token="fake_token")
+    mocked_refresher.assert_not_called()
 
 
 @patch(test_module.__name__ + ".create_forge")
@@ -34,6 +70,22 @@ def test_nexushelper_get_entity_by_id(mocked_forge):
     assert result.type == "DetailedCircuit"
 
 
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_cache_info(mocked_forge):
+    mocked_forge.return_value.retrieve.return_value = Resource(id="id1", type="DetailedCircuit")
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+
+    helper.get_entity_by_id("id1")
+    helper.get_entity_by_id("id1")
+
+    mocked_forge.return_value.retrieve.assert_called_once()
+    assert helper.cache_info().hits == 1
+    assert helper.cache_info().misses == 1
+
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token", memory_cache_size=0)
+    assert helper.cache_info() is None
+
+
 @patch(test_module.__name__ + ".create_forge")
 def test_nexushelper_get_entities_by_query(mocked_forge):
     mocked_forge.return_value.sparql.return_value = [Resource(id="id1")]
@@ -64,6 +116,120 @@ def test_nexushelper_get_entities(mocked_forge):
     assert result[0].type == "DetailedCircuit"
 
 
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_get_entities_fetch(mocked_forge):
+    mocked_forge.return_value.search.return_value = [Resource(id="id1", name="fake_name")]
+    mocked_forge.return_value.retrieve.return_value = Resource(id="id1", type="DetailedCircuit")
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+
+    # backed by the search result
+    result = helper.get_entities("DetailedCircuit", fetch="none")
+    assert result[0].name == "fake_name"
+    with pytest.raises(AttributeError, match="object has no attribute"):
+        result[0].type
+    mocked_forge.return_value.retrieve.assert_not_called()
+
+    # retrieved when accessing a missing attribute
+    result = helper.get_entities("DetailedCircuit", fetch="lazy")
+    assert result[0].name == "fake_name"
+    mocked_forge.return_value.retrieve.assert_not_called()
+    assert result[0].type == "DetailedCircuit"
+    mocked_forge.return_value.retrieve.assert_called_once()
+
+    with pytest.raises(BluepyEntityError, match="Invalid fetch mode 'invalid'"):
+        helper.get_entities("DetailedCircuit", fetch="invalid")
+
+
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_get_entities_by_query_fetch(mocked_forge):
+    mocked_forge.return_value.sparql.return_value = [Resource(id="id1")]
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+
+    result = helper.get_entities_by_query("FAKE QUERY", fetch="none")
+
+    assert result[0].id == "id1"
+    mocked_forge.return_value.retrieve.assert_not_called()
+
+
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_get_entities_by_query_graph(mocked_forge):
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+    resources = [Resource(id="id1", name="fake_name")]
+    mocked_forge.return_value.retrieve.return_value = Resource(id="id1", type="DetailedCircuit")
+
+    with patch.object(helper._connector, "query_graph", return_value=resources) as query_graph:
+        result = helper.get_entities_by_query("CONSTRUCT QUERY", graph=True, rewrite=False)
+
+    query_graph.assert_called_once_with("CONSTRUCT QUERY", rewrite=False)
+    assert result[0].name == "fake_name"
+    # the resources of the graph are complete
+    with pytest.raises(AttributeError, match="object has no attribute"):
+        result[0].type
+    mocked_forge.return_value.retrieve.assert_not_called()
+
+    with patch.object(helper._connector, "query_graph", return_value=resources):
+        result = helper.get_entities_by_query("CONSTRUCT QUERY", graph=True, fetch="lazy")
+    assert result[0].type == "DetailedCircuit"
+
+
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_get_entities_search_backend(mocked_forge):
+    helper = test_module.NexusHelper(
+        bucket="fake/project", token="fake_token", search_backend="elastic"
+    )
+    resources = [Resource(id="id1", name="fake_name")]
+
+    with patch.object(
+        helper._connector, "search_elastic", return_value=resources
+    ) as search_elastic:
+        result = helper.get_entities("DetailedCircuit", fetch="none", includes=["name"])
+
+    assert result[0].name == "fake_name"
+    search_elastic.assert_called_once_with(
+        "DetailedCircuit", {}, limit=test_module.DEFAULT_PAGE_SIZE, includes=["name"]
+    )
+    mocked_forge.return_value.search.assert_not_called()
+
+
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_iter_entities(mocked_forge):
+    mocked_forge.return_value.search.side_effect = [[Resource(id="id1")], []]
+    mocked_forge.return_value.retrieve.return_value = Resource(id="id1", type="DetailedCircuit")
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+
+    result = helper.iter_entities("DetailedCircuit", page_size=1)
+
+    entities = list(result)
+    assert len(entities) == 1
+    assert isinstance(entities[0], Entity)
+    assert entities[0].type == "DetailedCircuit"
+
+
+@patch(test_module.__name__ + ".create_forge")
+def test_nexushelper_prefetch(mocked_forge, caplog):
+    resources = {
+        "id1": Resource(id="id1", type="DetailedCircuit", atlasRelease=Resource(id="atlas")),
+        "atlas": Resource(id="atlas", name="atlas", parcellationOntology=Resource(id="ontology")),
+        "ontology": Resource(id="ontology", name="ontology"),
+    }
+    mocked_forge.return_value.search.return_value = [Resource(id="id1")]
+    mocked_forge.return_value.retrieve.side_effect = lambda id_, **_: resources[id_]
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token")
+    entities = helper.get_entities("DetailedCircuit", fetch="lazy")
+
+    result = helper.prefetch(entities, ["atlasRelease.parcellationOntology"])
+
+    assert set(result) == {"id1", "atlas", "ontology"}
+    assert mocked_forge.return_value.retrieve.call_count == 3
+    # the traversal is served from the in-memory cache
+    assert entities[0].atlasRelease.parcellationOntology.name == "ontology"
+    assert mocked_forge.return_value.retrieve.call_count == 3
+
+    helper = test_module.NexusHelper(bucket="fake/project", token="fake_token", memory_cache_size=0)
+    assert set(helper.prefetch(entities[0], "atlasRelease")) == {"atlas"}
+    assert "the in-memory cache is disabled" in caplog.text
+
+
 @patch(test_module.__name__ + ".create_forge")
 def test_nexushelper_as_dataframe(mocked_forge):
     # KnowledgeGraphForge.as_dataframe is patched so we can only mock the result
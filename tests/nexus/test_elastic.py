@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: Apache-2.0
+
+from types import SimpleNamespace
+
+from kgforge.core.commons.context import Context
+
+from bluepyentity.nexus import elastic as test_module
+
+
+def test_build_query():
+    context = Context({"@context": {"@vocab": "https://neuroshapes.org/"}})
+    search_filters = {
+        "type": "DetailedCircuit",
+        "_createdAt": "2022-01-01T00:00:00^^xsd:dateTime",
+        "_deprecated": False,
+        "_rev": 2,
+        "name": "circuit",
+        "brainLocation": {"brainRegion": {"id": "http://ex/region", "label": ["CA1", "CA3"]}},
+        "distribution/contentSize/value": 1024,
+    }
+
+    query = test_module.build_query(search_filters, 10, keyword_field="keyword", context=context)
+
+    assert query["query"]["bool"]["filter"] == [
+        {"terms": {"@type": ["DetailedCircuit", "https://neuroshapes.org/DetailedCircuit"]}},
+        {"term": {"_createdAt": "2022-01-01T00:00:00"}},
+        {"term": {"_deprecated": False}},
+        {"term": {"_rev": 2}},
+        {"term": {"name.keyword": "circuit"}},
+        {"term": {"brainLocation.brainRegion.@id": "http://ex/region"}},
+        {"terms": {"brainLocation.brainRegion.label.keyword": ["CA1", "CA3"]}},
+        {"term": {"distribution.contentSize.value": 1024}},
+    ]
+    assert query["size"] == 10
+    assert query["sort"] == test_module.SORT
+    assert "_source" not in query
+    assert "search_after" not in query
+    assert "from" not in query
+
+    # the filters are not modified
+    assert search_filters["brainLocation"]["brainRegion"]["label"] == ["CA1", "CA3"]
+
+
+def test_build_query__paging_and_source():
+    query = test_module.build_query(
+        {"type": "DetailedCircuit", "name": "circuit"},
+        5,
+        includes=["@id", "name"],
+        excludes=("distribution",),
+        offset=20,
+    )
+
+    assert query["query"]["bool"]["filter"] == [
+        {"term": {"@type": "DetailedCircuit"}},
+        {"term": {"name": "circuit"}},
+    ]
+    assert query["_source"] == {"includes": ["@id", "name"], "excludes": ["distribution"]}
+    assert query["from"] == 20
+
+    query = test_module.build_query({}, 5, search_after=["2022-01-01", "http://ex/a"], offset=20)
+
+    assert query["search_after"] == ["2022-01-01", "http://ex/a"]
+    # the offset only applies to the first page
+    assert "from" not in query
+
+
+def test_hits_to_resources():
+    calls = []
+
+    def to_resource(payload, sync_metadata, **kwargs):
+        calls.append((payload, sync_metadata, kwargs))
+        return SimpleNamespace(**payload)
+
+    store = SimpleNamespace(service=SimpleNamespace(to_resource=to_resource))
+    hits = [
+        {"_id": "http://ex/a", "_source": {"name": "a"}, "sort": [1]},
+        {"_id": "http://ex/b", "_source": {"name": "b"}, "sort": [2]},
+    ]
+
+    resources = test_module.hits_to_resources(hits, store)
+
+    assert [r.name for r in resources] == ["a", "b"]
+    assert calls[0] == ({"name": "a"}, True, {"id": "http://ex/a"})
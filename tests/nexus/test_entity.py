@@ -42,6 +42,19 @@ def test_resolving_resource_nested():
     retriever.assert_called_once_with("id2")
 
 
+def test_resolving_resource_synchronized():
+    retriever = MagicMock(return_value=Resource(id="id1", name="fake_name"))
+
+    rr = test_module.ResolvingResource(Resource(id="id1"), retriever=retriever, synchronized=True)
+    with pytest.raises(AttributeError, match="object has no attribute"):
+        rr.name
+    retriever.assert_not_called()
+
+    rr = test_module.ResolvingResource(Resource(id="id1"), retriever=retriever)
+    assert rr.name == "fake_name"
+    retriever.assert_called_once_with("id1")
+
+
 def test_resolving_resource_metadata():
     resource = Resource(
         id="id1",
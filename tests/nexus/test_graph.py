@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from kgforge.core.commons.context import Context
+from kgforge.specializations.stores.nexus.service import Service
+from rdflib import Graph
+
+from bluepyentity.exceptions import BluepyEntityError
+from bluepyentity.nexus import graph as test_module
+
+NXV = "https://bluebrain.github.io/nexus/vocabulary/"
+TRIPLES = f"""
+<http://ex/a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://schema.org/Dataset> .
+<http://ex/a> <http://schema.org/name> "a" .
+<http://ex/a> <http://schema.org/location> _:b1 .
+_:b1 <http://schema.org/region> <http://ex/region> .
+_:b1 <http://schema.org/value> "3"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<http://ex/a> <http://schema.org/derivation> <http://ex/b> .
+<http://ex/a> <{NXV}rev> "2"^^<http://www.w3.org/2001/XMLSchema#integer> .
+<http://ex/b> <http://schema.org/name> "b" .
+_:b2 <http://schema.org/name> "orphan" .
+"""
+
+
+def create_store():
+    context = Context(
+        {
+            "@context": {
+                "@vocab": "http://schema.org/",
+                "Dataset": "http://schema.org/Dataset",
+                "derivation": {"@id": "http://schema.org/derivation", "@type": "@id"},
+            }
+        }
+    )
+    metadata_context = Context({"@context": {"nxv": NXV, "_rev": "nxv:rev"}})
+    service = SimpleNamespace(metadata_context=metadata_context)
+    service.sync_metadata = lambda resource, result: Service.sync_metadata(
+        service, resource, result
+    )
+    return SimpleNamespace(model_context=context, context=None, service=service)
+
+
+def test_parse_graph():
+    graph = test_module.parse_graph(TRIPLES.encode(), "application/n-triples; charset=utf-8")
+    assert len(graph) == 9
+
+    assert len(test_module.parse_graph(TRIPLES.encode(), None)) == 9
+
+    bindings = {
+        "results": {
+            "bindings": [
+                {
+                    "subject": {"type": "uri", "value": "http://ex/a"},
+                    "predicate": {"type": "uri", "value": "http://schema.org/name"},
+                    "object": {"type": "literal", "value": "a"},
+                },
+                {
+                    "subject": {"type": "uri", "value": "http://ex/a"},
+                    "predicate": {"type": "uri", "value": "http://schema.org/location"},
+                    "object": {"type": "bnode", "value": "b1"},
+                },
+            ]
+        }
+    }
+    graph = test_module.parse_graph(
+        json.dumps(bindings).encode(), "application/sparql-results+json"
+    )
+    assert len(graph) == 2
+
+    with pytest.raises(BluepyEntityError, match="Unsupported media type"):
+        test_module.parse_graph(b"", "text/html")
+
+
+def test_frame_graph():
+    graph = Graph().parse(data=TRIPLES, format="nt")
+
+    nodes = test_module.frame_graph(graph)
+
+    # the orphan blank node is not a resource
+    assert [node["@id"] for node in nodes] == ["http://ex/a", "http://ex/b"]
+    location = nodes[0]["http://schema.org/location"][0]
+    assert "@id" not in location
+    assert location["http://schema.org/region"] == [{"@id": "http://ex/region"}]
+    # the other resources are referenced
+    assert nodes[0]["http://schema.org/derivation"] == [{"@id": "http://ex/b"}]
+
+
+def test_frame_graph__cycle():
+    graph = Graph().parse(
+        data="""
+        <http://ex/a> <http://schema.org/knows> _:b1 .
+        _:b1 <http://schema.org/knows> _:b2 .
+        _:b2 <http://schema.org/knows> _:b1 .
+        """,
+        format="nt",
+    )
+
+    (node,) = test_module.frame_graph(graph)
+
+    b1 = node["http://schema.org/knows"][0]
+    b2 = b1["http://schema.org/knows"][0]
+    assert list(b2["http://schema.org/knows"][0]) == ["@id"]
+
+
+def test_graph_to_resources():
+    graph = Graph().parse(data=TRIPLES, format="nt")
+
+    resources = test_module.graph_to_resources(graph, create_store())
+
+    assert [r.id for r in resources] == ["http://ex/a", "http://ex/b"]
+    resource = resources[0]
+    assert resource.type == "Dataset"
+    assert resource.name == "a"
+    assert resource.location.value == 3
+    # compacted as an iri by the context
+    assert resource.derivation == "http://ex/b"
+    assert resource._store_metadata["_rev"] == 2
+    assert not hasattr(resource, "_rev")
+    assert resources[1].name == "b"
+
+    assert test_module.graph_to_resources(Graph(), create_store()) == []
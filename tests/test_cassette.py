@@ -0,0 +1,173 @@
+import json
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from bluepyentity import cassette as tested
+from bluepyentity import session
+from bluepyentity.exceptions import BluepyEntityError
+
+
+class FakeAdapter(BaseAdapter):
+    """adapter answering each request with its method, url and body"""
+
+    def send(self, request, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers["Content-Type"] = "application/json"
+        response.headers["Set-Cookie"] = "secret"
+        response._content = json.dumps(
+            {"method": request.method, "url": request.url, "body": request.body or None}
+        ).encode("utf-8")
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def _create_session(cassette, adapter):
+    http_session = requests.Session()
+    http_session.mount("https://", tested.CassetteAdapter(cassette, adapter))
+    return http_session
+
+
+def test_cassette__record_replay(tmp_path):
+    path = tmp_path / "cassette.json"
+    cassette = tested.Cassette(path, mode="record")
+    http_session = _create_session(cassette, FakeAdapter())
+    http_session.get("https://nexus/a", params={"b": 1, "a": 2})
+    http_session.post("https://nexus/sparql", data="SELECT 1", headers={"Authorization": "t"})
+    http_session.get("https://nexus/file", headers={"Range": "bytes=5-"})
+    cassette.save()
+
+    content = path.read_text()
+    assert len(json.loads(content)["interactions"]) == 3
+    assert "secret" not in content
+    assert "Authorization" not in content
+
+    cassette = tested.Cassette(path, mode="replay")
+    http_session = _create_session(cassette, FakeAdapter())
+    assert len(cassette) == 3
+
+    # the order of the parameters and the other headers don't matter
+    response = http_session.get("https://nexus/a?a=2&b=1", headers={"Authorization": "other"})
+    assert response.status_code == 200
+    assert response.json()["url"] == "https://nexus/a?b=1&a=2"
+    assert response.headers["Content-Length"] == str(len(response.content))
+    assert "Set-Cookie" not in response.headers
+
+    response = http_session.post("https://nexus/sparql", data="SELECT 1")
+    assert response.json()["body"] == "SELECT 1"
+
+    with http_session.get("https://nexus/file", headers={"Range": "bytes=5-"}, stream=True) as r:
+        assert json.loads(b"".join(r.iter_content(chunk_size=4)))["url"] == "https://nexus/file"
+
+    for kwargs in [
+        {"method": "POST", "url": "https://nexus/sparql", "data": "SELECT 2"},
+        {"method": "GET", "url": "https://nexus/file", "headers": {"Range": "bytes=6-"}},
+        {"method": "GET", "url": "https://nexus/missing"},
+    ]:
+        with pytest.raises(tested.CassetteError, match="No response recorded"):
+            http_session.request(**kwargs)
+
+
+class AuthAdapter(BaseAdapter):
+    """adapter redirecting the authentication requests to the web app, with the token"""
+
+    def send(self, request, *args, **kwargs):
+        response = requests.Response()
+        if "bbpauth" in request.url:
+            response.status_code = 302
+            response.headers["Location"] = "https://bbp.epfl.ch/nexus/web/?code=c#access_token=tok"
+        else:
+            response.status_code = 200
+            response.headers["Location"] = "https://bbp.epfl.ch/nexus/web/#id_token=tok"
+        response._content = b""
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def test_cassette__tokens(tmp_path):
+    path = tmp_path / "cassette.json"
+    cassette = tested.Cassette(path, mode="record")
+    http_session = _create_session(cassette, AuthAdapter())
+    response = http_session.get("https://bbpauth.epfl.ch/auth?access_token=tok")
+    assert response.url == "https://bbp.epfl.ch/nexus/web/?code=c#access_token=tok"
+    cassette.save()
+
+    content = path.read_text()
+    assert "tok" not in content
+    assert "bbpauth" not in content
+    interactions = json.loads(content)["interactions"]
+    assert [i["request"]["url"] for i in interactions] == ["https://bbp.epfl.ch/nexus/web/"]
+    assert interactions[0]["response"]["headers"]["Location"] == "https://bbp.epfl.ch/nexus/web/"
+
+
+def test_cassette__binary(tmp_path):
+    path = tmp_path / "cassette.json"
+    content = bytes(range(256))
+
+    class BinaryAdapter(FakeAdapter):
+        def send(self, request, *args, **kwargs):
+            response = super().send(request, *args, **kwargs)
+            response._content = content
+            return response
+
+    cassette = tested.Cassette(path, mode="record")
+    _create_session(cassette, BinaryAdapter()).get("https://nexus/file")
+    cassette.save()
+
+    cassette = tested.Cassette(path, mode="replay")
+    assert _create_session(cassette, None).get("https://nexus/file").content == content
+
+
+def test_cassette__once(tmp_path):
+    path = tmp_path / "cassette.json"
+
+    cassette = tested.Cassette(path)
+    assert cassette.mode == "record"
+    # nothing recorded, nothing written
+    cassette.save()
+    assert not path.exists()
+
+    _create_session(cassette, FakeAdapter()).get("https://nexus/a")
+    cassette.save()
+
+    assert tested.Cassette(path).mode == "replay"
+
+
+def test_cassette__errors(tmp_path):
+    with pytest.raises(BluepyEntityError, match="Unknown cassette mode"):
+        tested.Cassette(tmp_path / "cassette.json", mode="unknown")
+
+    with pytest.raises(tested.CassetteError, match="doesn't exist"):
+        tested.Cassette(tmp_path / "cassette.json", mode="replay")
+
+    path = tmp_path / "other.json"
+    path.write_text(json.dumps({"version": 0, "interactions": []}))
+    with pytest.raises(tested.CassetteError, match="Unsupported version"):
+        tested.Cassette(path)
+
+
+def test_get_cassette(monkeypatch, tmp_path):
+    monkeypatch.delenv(tested.ENV_CASSETTE, raising=False)
+    assert tested.get_cassette() is None
+
+    monkeypatch.setenv(tested.ENV_CASSETTE, str(tmp_path / "cassette.json"))
+    monkeypatch.setenv(tested.ENV_CASSETTE_MODE, "record")
+    monkeypatch.setattr(tested.atexit, "register", lambda func: None)
+    cassette = tested.get_cassette()
+    assert cassette.path == tmp_path / "cassette.json"
+    assert cassette.recording
+
+    adapter = session.create_session().get_adapter("https://nexus")
+    assert isinstance(adapter, tested.CassetteAdapter)
+    assert adapter.cassette.recording
@@ -0,0 +1,130 @@
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bluepyentity import content_store as tested
+from bluepyentity.exceptions import BluepyEntityError
+
+
+def _add(store, tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return store.add(path, "sha256", name * 8)
+
+
+def test_get_content_store(tmp_path, monkeypatch):
+    monkeypatch.delenv(tested.ENV_CONTENT_STORE, raising=False)
+    assert tested.get_content_store() is None
+
+    monkeypatch.setenv(tested.ENV_CONTENT_STORE, str(tmp_path / "store"))
+    monkeypatch.setenv(tested.ENV_CONTENT_STORE_MAX_SIZE, "10")
+    store = tested.get_content_store()
+    assert store.root == tmp_path / "store"
+    assert store.root.is_dir()
+
+    with pytest.raises(BluepyEntityError, match="Invalid link mode 'invalid'"):
+        tested.ContentStore(tmp_path, link_mode="invalid")
+
+
+def test_content_store_add_get(tmp_path):
+    store = tested.ContentStore(tmp_path / "store")
+
+    assert store.get("sha256", "abcdef") is None
+
+    stored_path = _add(store, tmp_path, "ab", b"content")
+
+    assert stored_path == tmp_path / "store" / "sha256" / "ab" / ("ab" * 8)
+    assert store.get("sha256", "ab" * 8) == stored_path
+    assert stored_path.read_bytes() == b"content"
+    assert not stored_path.stat().st_mode & stat.S_IWUSR
+    assert store.size() == len(b"content")
+    # the added file is left unchanged
+    added_path = tmp_path / "ab"
+    assert added_path.stat().st_mode & stat.S_IWUSR
+    assert not os.path.samefile(added_path, stored_path)
+    added_path.write_bytes(b"modified")
+    assert stored_path.read_bytes() == b"content"
+
+
+def test_content_store_add__concurrent(tmp_path, monkeypatch):
+    store = tested.ContentStore(tmp_path / "store", link_mode="copy")
+    path = tmp_path / "ab"
+    path.write_bytes(b"content")
+    # both workers are copying the same content at the same time
+    barrier = threading.Barrier(2)
+    copy = tested._copy
+
+    def _copy(source_path, target_path):
+        copy(source_path, target_path)
+        barrier.wait(5)
+
+    def _reflink(*_):
+        raise OSError("unsupported")
+
+    monkeypatch.setattr(tested, "_reflink", _reflink)
+    monkeypatch.setattr(tested, "_copy", _copy)
+    monkeypatch.setitem(tested._LINK_FUNCTIONS, "copy", _copy)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stored_paths = list(executor.map(lambda _: store.add(path, "sha256", "ab" * 8), range(2)))
+        assert stored_paths[0] == stored_paths[1]
+        assert stored_paths[0].read_bytes() == b"content"
+
+        target_path = tmp_path / "target"
+        targets = list(
+            executor.map(lambda _: store.materialize(stored_paths[0], target_path), range(2))
+        )
+        assert targets == [target_path, target_path]
+        assert target_path.read_bytes() == b"content"
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_content_store_get__not_owner(tmp_path, monkeypatch, caplog):
+    store = tested.ContentStore(tmp_path / "store")
+    stored_path = _add(store, tmp_path, "ab", b"content")
+
+    def utime(*_, **__):
+        raise PermissionError("Operation not permitted")
+
+    monkeypatch.setattr(tested.os, "utime", utime)
+    with caplog.at_level("DEBUG", logger=tested.__name__):
+        assert store.get("sha256", "ab" * 8) == stored_path
+    assert "Unable to update the access time" in caplog.text
+
+
+@pytest.mark.parametrize("link_mode", ["auto", "hardlink", "symlink", "copy"])
+def test_content_store_materialize(tmp_path, link_mode):
+    store = tested.ContentStore(tmp_path / "store", link_mode=link_mode)
+    stored_path = _add(store, tmp_path, "ab", b"content")
+    target_path = tmp_path / "out" / "file.txt"
+    target_path.parent.mkdir()
+    target_path.write_bytes(b"old")
+
+    assert store.materialize(stored_path, target_path) == target_path
+
+    assert target_path.read_bytes() == b"content"
+    assert target_path.is_symlink() == (link_mode == "symlink")
+    assert list(target_path.parent.iterdir()) == [target_path]
+
+
+def test_content_store_collect_garbage(tmp_path):
+    store = tested.ContentStore(tmp_path / "store", max_size=10)
+    old = _add(store, tmp_path, "aa", b"12345")
+    new = _add(store, tmp_path, "bb", b"12345")
+    os.utime(old, ns=(1, 1))
+    # the last access time is updated when getting the content
+    os.utime(new, ns=(2, 2))
+    store.get("sha256", "aa" * 8)
+
+    assert store.collect_garbage() == 0
+
+    _add(store, tmp_path, "cc", b"12345")
+
+    assert store.collect_garbage() == 5
+    assert not new.exists()
+    assert old.exists()
+    assert store.collect_garbage(max_size=0) == 10
+    assert store.size() == 0
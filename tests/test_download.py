@@ -1,7 +1,17 @@
+import hashlib
+import io
+import json
 import tempfile
 from pathlib import Path
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from kgforge.core import Resource
+
 from bluepyentity import download as tested
+from bluepyentity.content_store import ContentStore
+from bluepyentity.exceptions import BluepyEntityError
 
 
 def test_get_filesystem_location__no_resource_attributes():
@@ -33,3 +43,339 @@ def test_get_filesystem_location():
         mock.atLocation.location = f"file://{path}"
         res = tested._get_filesystem_location(mock)
         assert res == path
+
+
+def _distribution(path, name=None):
+    return Resource(
+        type="DataDownload",
+        name=name or path.name,
+        contentUrl=f"https://fake/{path.name}",
+        atLocation=Resource(location=f"file://{path}"),
+    )
+
+
+def test_download__jobs(tmp_path):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    sources = []
+    for i in range(5):
+        sources.append(source_dir / f"file{i}.txt")
+        sources[-1].write_text("x" * i)
+
+    forge = Mock()
+    forge.retrieve.return_value = Resource(
+        id="id1", distribution=[_distribution(path) for path in sources]
+    )
+    forge.retrieve.return_value._store_metadata = {"_rev": 1}
+    progress = Mock()
+
+    res = tested.download(forge, "id1", output_dir=tmp_path, jobs=3, progress=progress)
+
+    assert res == {path.name: tmp_path / path.name for path in sources}
+    assert all(path.read_text() == "x" * i for i, path in enumerate(res.values()))
+    assert progress.call_count == len(sources)
+    assert sorted(c.args[1] for c in progress.call_args_list) == [1, 2, 3, 4, 5]
+    assert {c.args[2] for c in progress.call_args_list} == {5}
+    forge.download.assert_not_called()
+
+    summary = tested.summarize(res, 2.0)
+    assert summary == {"files": 5, "bytes": 10, "seconds": 2.0, "throughput": 5.0}
+
+
+def test_download__duplicate_names(tmp_path):
+    path = tmp_path / "file.txt"
+    path.touch()
+    forge = Mock()
+    forge.retrieve.return_value = Resource(
+        id="id1", distribution=[_distribution(path), _distribution(path)]
+    )
+    forge.retrieve.return_value._store_metadata = {"_rev": 1}
+
+    with pytest.raises(BluepyEntityError, match="Multiple distributions found"):
+        tested.download(forge, "id1", output_dir=tmp_path / "out", jobs=2)
+
+
+def test_download_many(tmp_path):
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (source_dir / name).write_text(name)
+
+    resources = {
+        "id1": Resource(id="id1", distribution=_distribution(source_dir / "a.txt")),
+        "id2": Resource(
+            id="id2",
+            distribution=[_distribution(source_dir / "b.txt"), _distribution(source_dir / "c.txt")],
+        ),
+        # same filename as id1
+        "id3": Resource(id="id3", distribution=_distribution(source_dir / "a.txt")),
+        "id4": Resource(id="id4"),
+    }
+    for resource in resources.values():
+        resource._store_metadata = {"_rev": 1}
+    forge = Mock()
+    forge.retrieve.side_effect = lambda id_, **_: resources.get(id_)
+    report = io.StringIO()
+    progress = Mock()
+
+    ids = ["id1", "id2", "id1", "id3", "id4", "missing"]
+    res = tested.download_many(
+        forge, ids, output_dir=tmp_path / "out", jobs=3, report=report, progress=progress
+    )
+
+    out = tmp_path / "out"
+    assert res == {
+        "id1": {"a.txt": out / "a.txt"},
+        "id2": {"b.txt": out / "b.txt", "c.txt": out / "c.txt"},
+    }
+    assert (out / "c.txt").read_text() == "c.txt"
+    assert forge.retrieve.call_count == 5
+
+    lines = [json.loads(line) for line in report.getvalue().splitlines()]
+    assert [line["id"] for line in lines] == ["id1", "id2", "id3", "id4", "missing"]
+    assert [line["status"] for line in lines] == ["ok", "ok", "error", "error", "error"]
+    assert lines[1]["files"] == {"b.txt": str(out / "b.txt"), "c.txt": str(out / "c.txt")}
+    assert "also a distribution of id1" in lines[2]["error"]
+    assert "does not have distributions" in lines[3]["error"]
+    assert "could not be retrieved" in lines[4]["error"]
+    assert [c.args[1:] for c in progress.call_args_list] == [(i, 5) for i in range(1, 6)]
+
+
+def test_check_name_collisions():
+    owners = {}
+    tested._check_name_collisions("id1", {"a.txt": None}, owners)
+
+    with pytest.raises(BluepyEntityError, match="File a.txt is also a distribution of id1"):
+        tested._check_name_collisions("id2", {"b.txt": None, "a.txt": None}, owners)
+
+    # the names of the rejected resource are not registered
+    assert owners == {"a.txt": "id1"}
+    tested._check_name_collisions("id3", {"b.txt": None}, owners)
+    assert owners == {"a.txt": "id1", "b.txt": "id3"}
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+
+def _remote_distribution(content, name="file.txt"):
+    return Resource(
+        type="DataDownload",
+        name=name,
+        contentUrl="https://fake/file",
+        contentSize=Resource(unitCode="bytes", value=len(content)),
+        digest=Resource(algorithm="SHA-256", value=hashlib.sha256(content).hexdigest()),
+    )
+
+
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution(mocked_get, _, tmp_path):
+    content = b"0123456789"
+    distribution = _remote_distribution(content)
+    mocked_get.return_value = FakeResponse(content)
+
+    path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path == tmp_path / "file.txt"
+    assert path.read_bytes() == content
+    assert not (tmp_path / "file.txt.part").exists()
+    manifest = json.loads((tmp_path / tested.MANIFEST_NAME).read_text())
+    assert manifest["file.txt"]["contentSize"] == len(content)
+
+    # unchanged, not downloaded again
+    tested.download_distribution(None, distribution, tmp_path)
+    mocked_get.assert_called_once()
+
+    # modified, downloaded again
+    path.write_bytes(b"9876543210")
+    tested.download_distribution(None, distribution, tmp_path)
+    assert mocked_get.call_count == 2
+    assert path.read_bytes() == content
+
+
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__resume(mocked_get, _, tmp_path):
+    content = b"0123456789"
+    distribution = _remote_distribution(content)
+    (tmp_path / "file.txt.part").write_bytes(content[:4])
+    mocked_get.return_value = FakeResponse(content[4:], status_code=206)
+
+    path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path.read_bytes() == content
+    assert mocked_get.call_args.kwargs["headers"] == {"Range": "bytes=4-"}
+
+    # the range is ignored by the server
+    path.unlink()
+    (tmp_path / "file.txt.part").write_bytes(content[:4])
+    mocked_get.return_value = FakeResponse(content, status_code=200)
+
+    path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path.read_bytes() == content
+
+
+@patch(
+    tested.__name__ + "._get_download_request",
+    return_value=("url", {"Authorization": "Bearer token"}, {}),
+)
+@patch("requests.Session.get")
+def test_download_distribution__range_not_satisfiable(mocked_get, _, tmp_path):
+    content = b"0123456789"
+    distribution = _remote_distribution(content)
+    (tmp_path / "file.txt.part").write_bytes(b"not a prefix of the content")
+    mocked_get.side_effect = [FakeResponse(b"", status_code=416), FakeResponse(content)]
+
+    path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path.read_bytes() == content
+    first, retry = mocked_get.call_args_list
+    assert first.kwargs["headers"] == {"Authorization": "Bearer token", "Range": "bytes=27-"}
+    # the whole content is requested again, with the other headers
+    assert retry.kwargs["headers"] == {"Authorization": "Bearer token"}
+
+
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__streaming(mocked_get, _, tmp_path, monkeypatch):
+    content = b"0123456789" * 10
+    distribution = _remote_distribution(content)
+    response = FakeResponse(content)
+    response.iter_content = Mock(wraps=response.iter_content)
+    mocked_get.return_value = response
+    monkeypatch.setenv(tested.ENV_CHUNK_SIZE, "7")
+
+    with patch(tested.__name__ + "._file_digest") as mocked_digest:
+        path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path.read_bytes() == content
+    response.iter_content.assert_called_once_with(chunk_size=7)
+    # the checksum is computed while writing, the file is not read again
+    mocked_digest.assert_not_called()
+
+
+@patch("time.sleep")
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__max_bandwidth(mocked_get, _, sleep, tmp_path, monkeypatch):
+    content = b"0123456789" * 10
+    distribution = _remote_distribution(content)
+    mocked_get.return_value = FakeResponse(content)
+    monkeypatch.setenv(tested.ENV_CHUNK_SIZE, "10")
+
+    with patch("time.monotonic", return_value=100):
+        path = tested.download_distribution(None, distribution, tmp_path, max_bandwidth=20)
+
+    assert path.read_bytes() == content
+    # the first 2 chunks are within the burst of 20 bytes, the 8 others wait for their tokens
+    assert [c.args[0] for c in sleep.call_args_list] == [0.5 * i for i in range(1, 9)]
+
+
+def test_get_bandwidth_limiter(monkeypatch):
+    assert tested._get_bandwidth_limiter(None) is None
+    monkeypatch.setenv(tested.ENV_CHUNK_SIZE, "100")
+    limiter = tested._get_bandwidth_limiter(10)
+    assert (limiter.rate, limiter.burst) == (10, 100)
+
+
+class InterruptedResponse(FakeResponse):
+    def iter_content(self, chunk_size):
+        yield self.content
+        raise requests.exceptions.ChunkedEncodingError("connection lost")
+
+
+@patch("time.sleep")
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__interrupted(mocked_get, _, __, tmp_path):
+    content = b"0123456789"
+    distribution = _remote_distribution(content)
+    mocked_get.side_effect = [
+        InterruptedResponse(content[:4]),
+        FakeResponse(content[4:], status_code=206),
+    ]
+
+    path = tested.download_distribution(None, distribution, tmp_path)
+
+    assert path.read_bytes() == content
+    assert mocked_get.call_args.kwargs["headers"] == {"Range": "bytes=4-"}
+
+
+def test_get_chunk_size(monkeypatch):
+    assert tested.get_chunk_size() == tested.CHUNK_SIZE
+    monkeypatch.setenv(tested.ENV_CHUNK_SIZE, "4096")
+    assert tested.get_chunk_size() == 4096
+    monkeypatch.setenv(tested.ENV_CHUNK_SIZE, "-1")
+    with pytest.raises(BluepyEntityError, match="must be a positive integer"):
+        tested.get_chunk_size()
+
+
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__checksum_mismatch(mocked_get, _, tmp_path):
+    distribution = _remote_distribution(b"0123456789")
+    mocked_get.return_value = FakeResponse(b"9876543210")
+
+    with pytest.raises(BluepyEntityError, match="Checksum of .* does not match"):
+        tested.download_distribution(None, distribution, tmp_path)
+
+    assert not (tmp_path / "file.txt").exists()
+    assert not (tmp_path / "file.txt.part").exists()
+
+
+@patch(tested.__name__ + "._get_download_request", return_value=("url", {}, {}))
+@patch("requests.Session.get")
+def test_download_distribution__content_store(mocked_get, _, tmp_path):
+    content = b"0123456789"
+    distribution = _remote_distribution(content)
+    mocked_get.return_value = FakeResponse(content)
+    store = ContentStore(tmp_path / "store")
+
+    path = tested.download_distribution(None, distribution, tmp_path / "a", content_store=store)
+
+    assert path.read_bytes() == content
+    assert store.get("sha256", hashlib.sha256(content).hexdigest()) is not None
+
+    # another output directory uses the stored content
+    path = tested.download_distribution(None, distribution, tmp_path / "b", content_store=store)
+
+    assert path.read_bytes() == content
+    mocked_get.assert_called_once()
+
+
+def test_copy_file(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text("content")
+    target = tmp_path / "target.txt"
+
+    tested._copy_file(source, target, create_link=True)
+    assert target.is_symlink()
+    assert target.resolve() == source
+
+    # an existing link to the source is kept, and the source is not removed
+    tested._copy_file(source, target, create_link=True)
+    assert target.is_symlink()
+    assert source.read_text() == "content"
+
+    tested._copy_file(source, target, create_link=False)
+    assert not target.is_symlink()
+    assert target.read_text() == "content"
+    assert not (tmp_path / "target.txt.part").exists()
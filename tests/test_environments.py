@@ -1,5 +1,14 @@
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import hjson
 import pytest
+import requests
+
 from bluepyentity.exceptions import BluepyEntityError
 from bluepyentity import environments as tested
 
@@ -12,3 +21,229 @@ def test_create_forge__raises():
         tested.create_forge(
             "prod", None, None, store_overrides={"searchendpoints": {}, "John": "Beatle"}
         )
+
+
+@pytest.fixture
+def forges():
+    tested.clear_forges()
+    with patch("kgforge.core.KnowledgeGraphForge") as mocked:
+        mocked.side_effect = lambda *_, **__: Mock()
+        with patch(tested.__name__ + "._with_local_mappings", side_effect=lambda c: c):
+            yield mocked
+    tested.clear_forges()
+
+
+def test_create_forge__cached(forges):
+    forge = tested.create_forge("prod", "token", "bbp/atlas")
+    assert tested.create_forge("prod", "token", "bbp/atlas") is forge
+    assert forges.call_count == 1
+
+    assert tested.create_forge("prod", "other token", "bbp/atlas") is not forge
+    assert tested.create_forge("prod", "token", "bbp/other") is not forge
+    assert tested.create_forge("staging", "token", "bbp/atlas") is not forge
+    assert tested.create_forge("prod", "token", "bbp/atlas", debug=True) is not forge
+    assert tested.create_forge("prod", "token", "bbp/atlas", cached=False) is not forge
+    assert forges.call_count == 6
+
+    assert tested.create_forge("prod", "token", "bbp/atlas") is forge
+    tested.clear_forges()
+    assert tested.create_forge("prod", "token", "bbp/atlas") is not forge
+
+
+def test_create_forge__max_forges(forges):
+    forge = tested.create_forge("prod", "token", "bucket0")
+    for i in range(1, tested.MAX_FORGES + 1):
+        tested.create_forge("prod", "token", f"bucket{i}")
+
+    assert tested.create_forge("prod", "token", "bucket0") is not forge
+
+
+def test_create_forge__concurrent(forges):
+    started, release = threading.Event(), threading.Event()
+
+    def create(*_, bucket, **__):
+        if bucket == "bbp/slow":
+            started.set()
+            release.wait(10)
+        return Mock()
+
+    forges.side_effect = create
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = [executor.submit(tested.create_forge, "prod", "token", "bbp/slow") for _ in range(2)]
+        assert started.wait(10)
+        # the other forges are not blocked by the one being created
+        tested.create_forge("prod", "token", "bbp/atlas")
+        release.set()
+        assert slow[0].result() is slow[1].result()
+
+    assert forges.call_count == 2
+
+
+def test_create_forge__error(forges):
+    forges.side_effect = [RuntimeError("unreachable"), Mock()]
+
+    with pytest.raises(RuntimeError, match="unreachable"):
+        tested.create_forge("prod", "token", "bbp/atlas")
+
+    # the failed creation is not kept
+    assert tested.create_forge("prod", "token", "bbp/atlas") is not None
+    assert forges.call_count == 2
+
+
+def test_create_forge__set_forge_token(forges):
+    forges.side_effect = lambda *_, **__: Mock(_resolvers={})
+    forge = tested.create_forge("prod", "token", "bbp/atlas")
+
+    with patch("nexussdk.config.set_token"):
+        tested.set_forge_token(forge, "new token")
+
+    assert tested.create_forge("prod", "new token", "bbp/atlas") is forge
+    assert tested.create_forge("prod", "token", "bbp/atlas") is not forge
+    assert forges.call_count == 2
+
+
+@patch("requests.Session.get")
+def test_get_cached_mapping(mocked_get, tmp_path):
+    url = "https://example.com/mapping.hjson"
+    mocked_get.return_value = Mock(content=b"{}")
+
+    path = tested.get_cached_mapping(url, cache_dir=tmp_path)
+    assert Path(path).read_bytes() == b"{}"
+    assert tested.get_cached_mapping(url, cache_dir=tmp_path) == path
+    mocked_get.assert_called_once()
+
+    # expired and the download fails, the cached one is used
+    mocked_get.side_effect = requests.ConnectionError()
+    assert tested.get_cached_mapping(url, cache_dir=tmp_path, ttl=-1) == path
+
+    # not cached and the download fails, the url is left to kgforge
+    assert tested.get_cached_mapping(url + "?v=2", cache_dir=tmp_path) == url + "?v=2"
+
+    # not an url
+    assert tested.get_cached_mapping("{}", cache_dir=tmp_path) == "{}"
+
+
+@patch(tested.__name__ + ".get_local_mapping", side_effect=lambda url: f"cached:{url}")
+def test_with_local_mappings(_):
+    config = tested.get_environment_config("prod")
+    res = tested._with_local_mappings(config)
+
+    assert res["Store"]["file_resource_mapping"] == (
+        f"cached:{config['Store']['file_resource_mapping']}"
+    )
+    for scope, resolvers in res["Resolvers"].items():
+        for resolver, original in zip(resolvers, config["Resolvers"][scope]):
+            assert resolver["result_resource_mapping"] == (
+                f"cached:{original['result_resource_mapping']}"
+            )
+    assert not config["Store"]["file_resource_mapping"].startswith("cached:")
+
+
+def test_get_vendored_mapping(tmp_path):
+    url = "https://example.com/path/mapping.hjson"
+    assert tested.get_vendored_mapping(url, vendored_dir=tmp_path) is None
+    (tmp_path / "mapping.hjson").write_text("{}")
+    assert tested.get_vendored_mapping(url, vendored_dir=tmp_path) == str(
+        tmp_path / "mapping.hjson"
+    )
+    assert tested.get_vendored_mapping("{}", vendored_dir=tmp_path) is None
+
+
+@patch("requests.Session.get")
+def test_get_local_mapping__vendored(mocked_get):
+    urls = set(tested.get_mapping_urls("prod")) | set(tested.get_mapping_urls("staging"))
+    for url in urls:
+        path = tested.get_local_mapping(url)
+        assert Path(path).parent == tested.get_vendored_dir()
+        assert hjson.loads(Path(path).read_text())
+    mocked_get.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "name, keys",
+    [
+        (
+            "file-to-resource-mapping.hjson",
+            {"type", "contentSize", "digest", "encodingFormat", "name", "contentUrl", "atLocation"},
+        ),
+        (
+            "term-to-resource-mapping.hjson",
+            {"type", "id", "label", "prefLabel", "subClassOf", "notation", "altLabel"},
+        ),
+        ("agent-to-resource-mapping.hjson", {"type", "id", "name", "familyName", "givenName"}),
+    ],
+)
+def test_vendored_mappings(name, keys):
+    mapping = hjson.loads((tested.get_vendored_dir() / name).read_text())
+    assert keys <= set(mapping)
+    # the source of the vendored files is recorded
+    assert name in (tested.get_vendored_dir() / "README.rst").read_text()
+
+
+@patch(tested.__name__ + ".get_cached_mapping")
+@patch(tested.__name__ + ".get_vendored_mapping")
+def test_get_local_mapping(mocked_vendored, mocked_cached):
+    mocked_vendored.return_value = "vendored"
+    assert tested.get_local_mapping("url") == "vendored"
+    mocked_cached.assert_not_called()
+
+    mocked_vendored.return_value = None
+    mocked_cached.return_value = "cached"
+    assert tested.get_local_mapping("url") == "cached"
+
+
+def test_get_mapping_urls():
+    urls = tested.get_mapping_urls("prod")
+    assert len(urls) == 3
+    assert all(url.endswith(".hjson") for url in urls)
+
+
+@patch("requests.Session.get")
+def test_sync_mappings(mocked_get, tmp_path):
+    mocked_get.side_effect = lambda url, **_: Mock(content=url.encode())
+
+    res = tested.sync_mappings(vendored_dir=tmp_path)
+
+    urls = set(tested.get_mapping_urls("prod")) | set(tested.get_mapping_urls("staging"))
+    assert set(res) == urls
+    for url, path in res.items():
+        assert path.read_text() == url
+        assert tested.get_vendored_mapping(url, vendored_dir=tmp_path) == str(path)
+
+    mocked_get.side_effect = requests.ConnectionError()
+    with pytest.raises(BluepyEntityError, match="Unable to download the mapping"):
+        tested.sync_mappings(vendored_dir=tmp_path)
+
+
+def _store(token):
+    service = SimpleNamespace(
+        headers={"Authorization": f"Bearer {token}"},
+        headers_download={"Authorization": f"Bearer {token}", "Accept": "*/*"},
+    )
+    return SimpleNamespace(token=token, service=service)
+
+
+def test_set_forge_token():
+    store, model_store, resolver_store = _store("old"), _store("old"), _store("old")
+    forge = SimpleNamespace(
+        _store=store,
+        _model=SimpleNamespace(
+            service=SimpleNamespace(default_store=model_store, context_store=model_store)
+        ),
+        _resolvers={
+            "ontology": {
+                "OntologyResolver": SimpleNamespace(
+                    service=SimpleNamespace(sources={"terms": resolver_store})
+                )
+            }
+        },
+    )
+
+    with patch("nexussdk.config.set_token") as set_token:
+        tested.set_forge_token(forge, "new")
+
+    set_token.assert_called_once_with("new")
+    for s in (store, model_store, resolver_store):
+        assert s.token == "new"
+        assert s.service.headers == {"Authorization": "Bearer new"}
+        assert s.service.headers_download == {"Authorization": "Bearer new", "Accept": "*/*"}
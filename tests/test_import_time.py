@@ -0,0 +1,22 @@
+import subprocess
+import sys
+
+# Modules slow to import, only needed by the commands using them.
+HEAVY_MODULES = ["kgforge", "pandas", "textual", "dateutil"]
+
+TOKEN_GET = """
+import sys
+from bluepyentity.app.main import main
+main.get_command(None, "token").get_command(None, "get")
+print(",".join(sorted(m for m in {heavy} if m in sys.modules)))
+"""
+
+
+def test_token_get__lazy_imports():
+    res = subprocess.run(
+        [sys.executable, "-c", TOKEN_GET.format(heavy=HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert res.stdout.strip() == ""
@@ -0,0 +1,77 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from bluepyentity import instrumentation as tested
+
+
+@pytest.fixture
+def recorder():
+    recorder = tested.Recorder(trace=True)
+    previous = tested.set_recorder(recorder)
+    yield recorder
+    tested.set_recorder(previous)
+
+
+def test_recorder_stats():
+    recorder = tested.Recorder(max_samples=100)
+    for i in range(1, 101):
+        recorder.add("a", 0, i / 100, bytes=i, status=200)
+    recorder.add("b", 0, 1, cache_hit=True)
+    recorder.add("b", 0, 3, cache_hit=False)
+
+    stats = recorder.stats()
+    assert stats["a"]["count"] == 100
+    assert stats["a"]["total"] == pytest.approx(50.5)
+    assert stats["a"]["p50"] == 0.5
+    assert stats["a"]["p95"] == 0.95
+    assert stats["a"]["max"] == 1
+    assert stats["a"]["bytes"] == 5050
+    assert "status" not in stats["a"]
+    assert stats["b"] == {"count": 2, "total": 4, "p50": 1, "p95": 3, "max": 3, "cache_hit": 1}
+    # no trace by default
+    assert recorder.trace_events() == []
+
+    recorder.reset()
+    assert recorder.stats() == {}
+
+
+def test_recorder_max_samples():
+    recorder = tested.Recorder(max_samples=2)
+    for duration in (10, 1, 2):
+        recorder.add("a", 0, duration)
+
+    stats = recorder.stats()
+    assert stats["a"]["count"] == 3
+    assert stats["a"]["max"] == 2
+
+
+def test_span(recorder, tmp_path):
+    with patch("time.perf_counter", side_effect=[recorder._origin + 1, recorder._origin + 3]):
+        with tested.span("nexus.search", type="Foo") as args:
+            args["results"] = 5
+
+    with pytest.raises(ValueError):
+        with tested.span("nexus.retrieve"):
+            raise ValueError
+
+    (search, retrieve) = recorder.trace_events()
+    assert search["name"] == "nexus.search"
+    assert search["cat"] == "nexus"
+    assert search["ph"] == "X"
+    assert search["ts"] == pytest.approx(1e6)
+    assert search["dur"] == pytest.approx(2e6)
+    assert search["args"] == {"type": "Foo", "results": 5}
+    assert retrieve["args"] == {"error": "ValueError"}
+
+    path = tmp_path / "trace.json"
+    recorder.write_trace(path)
+    assert len(json.loads(path.read_text())["traceEvents"]) == 2
+
+
+def test_set_recorder(recorder):
+    assert tested.get_recorder() is recorder
+    other = tested.Recorder()
+    assert tested.set_recorder(other) is recorder
+    assert tested.get_recorder() is other
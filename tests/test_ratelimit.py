@@ -0,0 +1,107 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from bluepyentity import ratelimit as tested
+from bluepyentity.instrumentation import Recorder, set_recorder
+from bluepyentity.retry import RetryPolicy
+
+
+@patch("time.sleep")
+def test_rate_limiter(sleep):
+    with patch("time.monotonic", return_value=100):
+        limiter = tested.RateLimiter(rate=2, burst=3)
+        assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+        assert limiter.acquire() == 0.5
+        assert limiter.acquire() == 1
+        sleep.assert_called_with(1)
+
+    with patch("time.monotonic", return_value=110):
+        # refilled up to the burst
+        assert [limiter.acquire() for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_rate_limiter__invalid():
+    with pytest.raises(ValueError, match="The rate must be positive"):
+        tested.RateLimiter(rate=0)
+
+
+@patch("time.sleep")
+def test_shared_rate_limiter(sleep, tmp_path):
+    path = tmp_path / "ratelimit"
+    with patch("time.time", return_value=100):
+        limiter1 = tested.SharedRateLimiter(rate=1, burst=2, path=path)
+        limiter2 = tested.SharedRateLimiter(rate=1, burst=2, path=path)
+        assert limiter1.acquire() == 0
+        assert limiter2.acquire() == 0
+        # the tokens taken by the other limiter are not available
+        assert limiter1.acquire() == 1
+        assert limiter2.acquire() == 2
+
+    with patch("time.time", return_value=103):
+        assert limiter2.acquire() == 0
+        assert limiter1.acquire() == 1
+
+    # a limiter with another file is independent
+    with patch("time.time", return_value=103):
+        assert tested.SharedRateLimiter(rate=1, path=tmp_path / "other").acquire() == 0
+
+
+def test_get_rate_limiters(monkeypatch, tmp_path):
+    monkeypatch.delenv(tested.ENV_RATE_LIMIT, raising=False)
+    monkeypatch.delenv(tested.ENV_NODE_RATE_LIMIT, raising=False)
+    assert tested.get_rate_limiters() == ()
+
+    monkeypatch.setenv(tested.ENV_RATE_LIMIT, "5")
+    monkeypatch.setenv(tested.ENV_NODE_RATE_LIMIT, "50")
+    monkeypatch.setenv(tested.ENV_RATE_BURST, "10")
+    monkeypatch.setenv(tested.ENV_RATE_LIMIT_FILE, str(tmp_path / "ratelimit"))
+    limiter, shared = tested.get_rate_limiters()
+
+    assert type(limiter) is tested.RateLimiter
+    assert (limiter.rate, limiter.burst) == (5, 10)
+    assert isinstance(shared, tested.SharedRateLimiter)
+    assert (shared.rate, shared.burst) == (50, 10)
+    assert shared.path == tmp_path / "ratelimit"
+
+
+def test_rate_limited_adapter():
+    limiter = Mock()
+    adapter = tested.RateLimitedAdapter(rate_limiters=[limiter, limiter])
+    request = requests.Request("GET", "https://bbp.epfl.ch/nexus").prepare()
+
+    with patch.object(HTTPAdapter, "send", return_value=Mock(status_code=200)) as send:
+        adapter.send(request)
+
+    assert limiter.acquire.call_count == 2
+    send.assert_called_once()
+
+
+@patch("time.sleep")
+def test_rate_limited_adapter__retries(sleep):
+    limiter = Mock()
+    policy = RetryPolicy(retries=2, backoff_factor=1, jitter=False)
+    adapter = tested.RateLimitedAdapter(max_retries=policy.to_urllib3(), rate_limiters=[limiter])
+
+    # the retries of urllib3 take a token after their backoff
+    response = Mock(status=503, headers={}, get_redirect_location=Mock(return_value=False))
+    retry = adapter.max_retries.increment("GET", "/", response=response)
+    retry.sleep(response)
+    sleep.assert_called_once_with(1)
+    limiter.acquire.assert_called_once()
+
+
+def test_rate_limited_adapter__span():
+    recorder = Recorder()
+    previous = set_recorder(recorder)
+    try:
+        adapter = tested.RateLimitedAdapter(rate_limiters=[Mock()])
+        request = requests.Request("GET", "https://bbp.epfl.ch/nexus").prepare()
+        with patch.object(HTTPAdapter, "send", return_value=Mock(status_code=200)):
+            adapter.send(request)
+    finally:
+        set_recorder(previous)
+
+    assert set(recorder.stats()) == {"ratelimit.wait", "http.request"}
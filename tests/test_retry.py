@@ -0,0 +1,142 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ProtocolError
+
+from bluepyentity import retry as tested
+
+
+def test_retry_policy_backoff():
+    policy = tested.RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+    assert [policy.backoff(i) for i in range(1, 6)] == [1, 2, 4, 5, 5]
+
+    policy = tested.RetryPolicy(backoff_factor=1, max_backoff=5)
+    assert all(0 <= policy.backoff(3) <= 4 for _ in range(100))
+
+
+def test_retry_policy_from_environment(monkeypatch):
+    monkeypatch.setenv(tested.ENV_RETRIES, "1")
+    monkeypatch.setenv(tested.ENV_BACKOFF_FACTOR, "0.1")
+    monkeypatch.setenv(tested.ENV_MAX_BACKOFF, "2")
+
+    policy = tested.RetryPolicy.from_environment()
+    assert policy.retries == 1
+    assert policy.backoff_factor == 0.1
+    assert policy.max_backoff == 2
+
+
+@patch("time.sleep")
+def test_retry_policy_call(sleep):
+    policy = tested.RetryPolicy(retries=2, backoff_factor=1, jitter=False)
+    func = Mock(side_effect=[requests.ConnectionError(), requests.Timeout(), "ok"])
+
+    assert policy.call(func, 1, a=2) == "ok"
+    assert func.call_count == 3
+    func.assert_called_with(1, a=2)
+    assert [c.args for c in sleep.call_args_list] == [(1,), (2,)]
+
+    func = Mock(side_effect=requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        policy.call(func)
+    assert func.call_count == 3
+
+    func = Mock(side_effect=ValueError())
+    with pytest.raises(ValueError):
+        policy.call(func)
+    assert func.call_count == 1
+
+    func = Mock(side_effect=tested.CircuitOpenError())
+    with pytest.raises(tested.CircuitOpenError):
+        policy.call(func)
+    assert func.call_count == 1
+
+
+def test_policy_retry():
+    policy = tested.RetryPolicy(retries=3, backoff_factor=1, jitter=False)
+    retry = policy.to_urllib3()
+
+    assert retry.is_retry("GET", 502)
+    assert not retry.is_retry("GET", 500)
+    # the refused requests are retried whatever their method
+    assert retry.is_retry("POST", 503)
+    assert retry.is_retry("POST", 429)
+    assert not retry.is_retry("POST", 502)
+
+    assert retry.get_backoff_time() == 0
+    retry = retry.increment("GET", "/", error=ProtocolError())
+    assert retry.policy is policy
+    assert retry.get_backoff_time() == 1
+    retry = retry.increment("GET", "/", error=ProtocolError())
+    assert retry.get_backoff_time() == 2
+    assert retry.total == 1
+
+
+def test_policy_retry__non_idempotent():
+    retry = tested.RetryPolicy(retries=3).to_urllib3()
+    response = Mock(status=429)
+
+    # the queries sent with POST are retried
+    for url in ["https://nexus/v1/views/o/p/graph/sparql", "/v1/views/o/p/es/_search?a=b"]:
+        assert retry.increment("POST", url, response=response).total == 2
+
+    # the writes are not replayed
+    for method in ["POST", "PATCH"]:
+        with pytest.raises(MaxRetryError, match="refused with status 429"):
+            retry.increment(method, "https://nexus/v1/resources/o/p", response=response)
+    assert retry.increment("PUT", "/v1/resources/o/p/id", response=response).total == 2
+    # the other errors are retried as by urllib3
+    with pytest.raises(ProtocolError):
+        retry.increment("POST", "/v1/resources/o/p", error=ProtocolError())
+
+
+def test_circuit_breaker():
+    breaker = tested.CircuitBreaker(failures=2, reset_timeout=10)
+
+    with patch("time.monotonic", return_value=100):
+        breaker.record_failure("a")
+        assert not breaker.is_open("a")
+        breaker.record_success("a")
+        breaker.record_failure("a")
+        assert not breaker.is_open("a")
+        breaker.record_failure("a")
+        assert breaker.is_open("a")
+        assert not breaker.is_open("b")
+        with pytest.raises(tested.CircuitOpenError, match="a is considered down"):
+            breaker.check("a")
+
+    with patch("time.monotonic", return_value=110):
+        # the requests are sent again after the reset timeout
+        breaker.check("a")
+        breaker.record_failure("a")
+        assert breaker.is_open("a")
+
+    with patch("time.monotonic", return_value=120):
+        breaker.record_success("a")
+        assert not breaker.is_open("a")
+
+
+def test_circuit_breaker__disabled():
+    breaker = tested.CircuitBreaker(failures=0)
+    for _ in range(10):
+        breaker.record_failure("a")
+    assert not breaker.is_open("a")
+
+
+def test_circuit_breaker_adapter():
+    breaker = tested.CircuitBreaker(failures=2)
+    adapter = tested.CircuitBreakerAdapter(circuit_breaker=breaker)
+    request = requests.Request("GET", "https://bbp.epfl.ch/nexus").prepare()
+    responses = [Mock(status_code=503), requests.ConnectionError(), Mock(status_code=200)]
+
+    with patch.object(HTTPAdapter, "send", side_effect=responses) as send:
+        assert adapter.send(request).status_code == 503
+        with pytest.raises(requests.ConnectionError):
+            adapter.send(request)
+        with pytest.raises(tested.CircuitOpenError):
+            adapter.send(request)
+        assert send.call_count == 2
+
+        breaker.record_success("bbp.epfl.ch")
+        assert adapter.send(request).status_code == 200
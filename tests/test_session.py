@@ -0,0 +1,159 @@
+import asyncio
+import sys
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from bluepyentity import session as tested
+from bluepyentity.retry import ENV_RETRIES, CircuitBreaker, RetryPolicy
+
+
+@pytest.fixture
+def shared_session():
+    session = tested.create_session()
+    tested.set_session(session)
+    yield session
+    tested.set_session(None)
+
+
+def test_create_session():
+    policy = RetryPolicy(retries=2, backoff_factor=0.1)
+    breaker = CircuitBreaker()
+    session = tested.create_session(
+        pool_size=3, retry_policy=policy, circuit_breaker=breaker, keep_alive=False
+    )
+
+    adapter = session.get_adapter("https://bbp.epfl.ch")
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_retries.total == 2
+    assert adapter.max_retries.policy is policy
+    assert 503 in adapter.max_retries.status_forcelist
+    assert adapter.circuit_breaker is breaker
+    assert session.headers["Connection"] == "close"
+
+
+def test_create_session__environment(monkeypatch):
+    monkeypatch.setenv(tested.ENV_POOL_SIZE, "7")
+    monkeypatch.setenv(ENV_RETRIES, "0")
+
+    session = tested.create_session()
+
+    adapter = session.get_adapter("https://bbp.epfl.ch")
+    assert adapter._pool_maxsize == 7
+    assert adapter.max_retries.total == 0
+    assert session.headers.get("Connection") != "close"
+
+
+def test_get_session(shared_session):
+    assert tested.get_session() is shared_session
+    tested.set_session(None)
+    assert tested.get_session() is tested.get_session()
+
+
+def test_inject_session(shared_session):
+    module = types.ModuleType("fake_module")
+    module.requests = requests
+    with patch.dict(sys.modules, {"fake_module": module}):
+        tested.inject_session(["fake_module", "missing_module"])
+
+    assert module.requests is not requests
+    # the other attributes are the ones of requests
+    assert module.requests.HTTPError is requests.HTTPError
+
+    with patch.object(shared_session, "request") as request, tested.use_shared_session():
+        module.requests.get("https://example.com", headers={"a": "b"})
+        module.requests.post("https://example.com", json={})
+        module.requests.delete("https://example.com")
+
+    assert [c.args for c in request.call_args_list] == [
+        ("GET", "https://example.com"),
+        ("POST", "https://example.com"),
+        ("DELETE", "https://example.com"),
+    ]
+    assert request.call_args_list[0].kwargs["headers"] == {"a": "b"}
+
+    # outside of the scope, the requests are sent as if the module was not injected
+    with patch.object(shared_session, "request") as request, patch.object(requests, "get") as get:
+        module.requests.get("https://example.com", headers={"a": "b"})
+
+    request.assert_not_called()
+    get.assert_called_once_with("https://example.com", params=None, headers={"a": "b"})
+
+
+def test_inject_session__client_session(shared_session):
+    class ClientSession:
+        def __init__(self, headers=None):
+            self.headers = headers
+
+    module = types.ModuleType("fake_module")
+    module.ClientSession = ClientSession
+    with patch.dict(sys.modules, {"fake_module": module}):
+        tested.inject_session([], ["fake_module"])
+        injected = module.ClientSession
+        # injecting again doesn't wrap the replacement
+        tested.inject_session([], ["fake_module"])
+
+    assert module.ClientSession is injected
+    assert module.ClientSession is not ClientSession
+    # outside of the scope, the original class is used
+    assert isinstance(module.ClientSession(headers={"a": "b"}), ClientSession)
+
+    async def _batch():
+        async with module.ClientSession(headers={"a": "b"}) as client_session:
+            async with client_session.request(
+                "GET", "https://example.com", headers={"c": "d"}, params={"rev": 1}
+            ) as response:
+                return response.status, await response.json(), await response.text()
+
+    response = requests.Response()
+    response.status_code = 404
+    response._content = b'{"@type": "NotFound"}'
+    with patch.object(
+        shared_session, "request", return_value=response
+    ) as request, tested.use_shared_session():
+        assert asyncio.run(_batch()) == (404, {"@type": "NotFound"}, '{"@type": "NotFound"}')
+
+    request.assert_called_once_with(
+        "GET", "https://example.com", headers={"a": "b", "c": "d"}, params={"rev": 1}
+    )
+
+
+def test_use_shared_session(shared_session):
+    assert tested._get_requests() is requests
+    with tested.use_shared_session() as session:
+        assert session is shared_session
+        assert tested._get_requests() is shared_session
+        # the scope is the current thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(tested._get_requests).result() is requests
+    assert tested._get_requests() is requests
+
+
+def test_set_session(shared_session):
+    other = tested.create_session()
+    assert tested.set_session(other) is shared_session
+    assert tested.get_session() is other
+
+
+def test_use_cassette(shared_session, tmp_path):
+    path = tmp_path / "cassette.json"
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"a": 1}'
+
+    with tested.use_cassette(path, mode="record") as cassette:
+        adapter = tested.get_session().get_adapter("https://nexus")
+        assert adapter.cassette is cassette
+        with patch.object(adapter.adapter, "send", return_value=response):
+            assert tested.get_session().get("https://nexus/a").json() == {"a": 1}
+
+    assert tested.get_session() is shared_session
+    assert path.exists()
+
+    with tested.use_cassette(path) as cassette:
+        assert cassette.mode == "replay"
+        assert tested.get_session().get("https://nexus/a").json() == {"a": 1}
+    assert tested.get_session() is shared_session
@@ -0,0 +1,144 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import jwt
+import pytest
+
+from bluepyentity import token as tested
+
+SECRET = "a secret long enough for the HMAC SHA256 key"
+
+
+def _token(expires_in):
+    return jwt.encode({"exp": int(time.time() + expires_in)}, SECRET)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    tested.clear_token_cache()
+    yield
+    tested.clear_token_cache()
+
+
+def test_is_valid():
+    assert tested.is_valid(_token(100))
+    assert not tested.is_valid(_token(-100))
+    assert not tested.is_valid("not a token")
+    assert not tested.is_valid(None)
+    assert not tested.is_valid(jwt.encode({"sub": "user"}, SECRET))
+
+
+@patch(tested.__name__ + "._get_token_kerberos")
+@patch(tested.__name__ + "._get_token_environment")
+@patch(tested.__name__ + "._get_token_keyring")
+def test_get_token(keyring, environment, kerberos):
+    token = _token(3600)
+    keyring.return_value = None
+    environment.return_value = _token(-100)
+    kerberos.return_value = token
+
+    assert tested.get_token("prod", "user") == token
+    assert keyring.call_count == environment.call_count == kerberos.call_count == 1
+
+    # resolved once per environment and user
+    assert tested.get_token("prod", "user") == token
+    assert kerberos.call_count == 1
+    tested.get_token("staging", "user")
+    assert kerberos.call_count == 2
+
+    timings = tested.get_provider_timings()
+    assert timings["kerberos"][0] >= 2
+    assert timings["kerberos"][1] >= 0
+
+
+@patch(tested.__name__ + "._get_token_kerberos")
+@patch(tested.__name__ + "._get_token_environment")
+@patch(tested.__name__ + "._get_token_keyring")
+def test_get_token__expiring(keyring, environment, kerberos):
+    keyring.return_value = _token(tested.TOKEN_MARGIN / 2)
+
+    tested.get_token("prod", "user")
+    tested.get_token("prod", "user")
+
+    # the token is about to expire, it's resolved again
+    assert keyring.call_count == 2
+    environment.assert_not_called()
+    kerberos.assert_not_called()
+
+
+def test_has_kerberos_credentials(tmp_path, monkeypatch):
+    monkeypatch.setenv("KRB5CCNAME", f"FILE:{tmp_path / 'krb5cc'}")
+    assert not tested._has_kerberos_credentials()
+    (tmp_path / "krb5cc").touch()
+    assert tested._has_kerberos_credentials()
+
+    monkeypatch.setenv("KRB5CCNAME", str(tmp_path / "missing"))
+    assert not tested._has_kerberos_credentials()
+
+    monkeypatch.setenv("KRB5CCNAME", "KEYRING:persistent:1000")
+    with patch(tested.__name__ + ".shutil.which", return_value=None):
+        assert tested._has_kerberos_credentials()
+    with patch(tested.__name__ + ".shutil.which", return_value="klist"), patch(
+        tested.__name__ + ".subprocess.run"
+    ) as run:
+        run.return_value.returncode = 1
+        assert not tested._has_kerberos_credentials()
+        run.assert_called_once()
+
+
+def test_token_refresher():
+    token, new_token = _token(100), _token(3600)
+    refreshed = threading.Event()
+    callback = Mock(side_effect=lambda _: refreshed.set())
+
+    with patch(tested.__name__ + "._resolve_token") as resolve:
+        resolve.side_effect = [(None, None), (token, tested._get_expiry(token)), (new_token, 1e10)]
+        refresher = tested.TokenRefresher("prod", token, callback, margin=200, retry=0.01)
+        assert refreshed.wait(5)
+        refresher.stop()
+
+    callback.assert_called_once_with(new_token)
+    assert refresher.token == new_token
+
+
+@patch(tested.__name__ + "._get_token_kerberos")
+@patch(tested.__name__ + "._get_token_environment", return_value=None)
+@patch(tested.__name__ + "._get_token_keyring")
+def test_token_refresher__providers(keyring, _, kerberos):
+    token, new_token = _token(100), _token(3600)
+    keyring.return_value = token
+    kerberos.return_value = new_token
+    refreshed = threading.Event()
+    callback = Mock(side_effect=lambda _: refreshed.set())
+
+    # the current token is still in the keyring, the newer one is found with kerberos
+    refresher = tested.TokenRefresher("prod", token, callback, margin=200, retry=0.01)
+    assert refreshed.wait(5)
+    refresher.stop()
+
+    callback.assert_called_once_with(new_token)
+    assert refresher.token == new_token
+    kerberos.assert_called()
+
+
+def test_resolve_token__min_expiry():
+    token = _token(100)
+    expiry = tested._get_expiry(token)
+    with patch(tested.__name__ + "._get_token_keyring", return_value=token), patch(
+        tested.__name__ + "._get_token_environment", return_value=None
+    ), patch(tested.__name__ + "._get_token_kerberos", return_value=None):
+        assert tested._resolve_token("prod", "user") == (token, expiry)
+        assert tested._resolve_token("prod", "user", min_expiry=expiry) == (None, None)
+
+
+def test_token_refresher__stopped_by_callback():
+    with patch(tested.__name__ + "._resolve_token", return_value=(_token(3600), 1e10)):
+        refresher = tested.TokenRefresher("prod", _token(100), lambda _: False, margin=200)
+        refresher._thread.join(5)
+    assert not refresher._thread.is_alive()
+
+
+def test_token_refresher__no_expiry():
+    refresher = tested.TokenRefresher("prod", "fake_token", Mock())
+    assert not refresher._thread.is_alive()